@@ -32,6 +32,8 @@ from .dammit import UnicodeDammit
 from .element import (
     CData,
     Comment,
+    CompactNavigableString,
+    CompactTag,
     DEFAULT_OUTPUT_ENCODING,
     Declaration,
     Doctype,
@@ -41,6 +43,9 @@ from .element import (
     ResultSet,
     SoupStrainer,
     Tag,
+    indexed_documents,
+    weak_linked,
+    whitespace_re,
     )
 
 # The very first thing we do is give a useful error if someone is
@@ -81,10 +86,34 @@ class BeautifulSoup(Tag):
 
     def __init__(self, markup="", features=None, builder=None,
                  parse_only=None, from_encoding=None, exclude_encodings=None,
+                 build_index=False, compact=False, weak_links=False,
                  **kwargs):
         """The Soup object is initialized as the 'root tag', and the
         provided markup (which can be a string or a file-like object)
-        is fed into the underlying parser."""
+        is fed into the underlying parser.
+
+        If build_index is true, tags are indexed by name, class and id
+        as they are parsed, so find_all() and select() looking for a
+        single name, class or id don't have to visit every tag in the
+        document. The index is rebuilt when needed after tags are
+        inserted, extracted or have their class or id changed through
+        tag[key]. Changes made directly to a tag's name or attrs
+        aren't noticed.
+
+        If compact is true, the tree is built out of CompactTag and
+        CompactNavigableString objects, which keep their attributes in
+        slots instead of instance dictionaries. Large documents take
+        noticeably less memory and are quicker for the garbage
+        collector to scan.
+
+        If weak_links is true, each element only keeps weak references
+        to its parent and the elements before it (see weak_linked), so
+        the tree has no reference cycles and is freed as soon as the
+        BeautifulSoup object is dropped. Elements you add to the tree
+        should be made with new_tag() and new_string().
+
+        Alternatively, decompose() the BeautifulSoup object when
+        you've finished with it."""
 
         if 'convertEntities' in kwargs:
             warnings.warn(
@@ -170,6 +199,18 @@ class BeautifulSoup(Tag):
         self.builder.soup = self
 
         self.parse_only = parse_only
+        self.build_index = build_index
+        self.compact = compact
+        self.weak_links = weak_links
+        if compact:
+            self.tag_class = CompactTag
+            self.string_class = CompactNavigableString
+        else:
+            self.tag_class = Tag
+            self.string_class = NavigableString
+        if weak_links:
+            self.tag_class = weak_linked(self.tag_class)
+            self.string_class = weak_linked(self.string_class)
 
         if hasattr(markup, 'read'):        # It's a file-type object.
             markup = markup.read()
@@ -221,9 +262,15 @@ class BeautifulSoup(Tag):
         # reference to this object.
         self.markup = None
         self.builder.soup = None
+        if weak_links:
+            # The parser's stack of open tags starts with this object.
+            self.currentTag = None
+            self.tagStack = []
 
     def __copy__(self):
-        return type(self)(self.encode(), builder=self.builder)
+        return type(self)(self.encode(), builder=self.builder,
+                          build_index=self.build_index, compact=self.compact,
+                          weak_links=self.weak_links)
 
     def __getstate__(self):
         # Frequently a tree builder can't be pickled.
@@ -232,6 +279,11 @@ class BeautifulSoup(Tag):
             del d['builder']
         return d
 
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self._index is not None:
+            indexed_documents[id(self)] = self
+
     def _feed(self):
         # Convert the document to Unicode.
         self.builder.reset()
@@ -250,15 +302,62 @@ class BeautifulSoup(Tag):
         self.currentTag = None
         self.tagStack = []
         self.preserve_whitespace_tag_stack = []
+        if self.build_index:
+            self._index = {}
+            indexed_documents[id(self)] = self
+        else:
+            self._index = None
+        self._index_count = 0
+        self._tree_version = self._index_version = 0
         self.pushTag(self)
 
+    def _index_tag(self, tag):
+        """Add a tag to the index, after the tags already in it."""
+        tag._index_position = position = self._index_count
+        self._index_count += 1
+        keys = [('name', tag.name)]
+        class_ = tag.attrs.get('class')
+        if isinstance(class_, basestring):
+            class_ = whitespace_re.split(class_)
+        if class_:
+            keys.extend(('class', value) for value in class_)
+        id = tag.attrs.get('id')
+        if isinstance(id, basestring):
+            keys.append(('id', id))
+        for key in keys:
+            entry = self._index.get(key)
+            if entry is None:
+                entry = self._index[key] = ([], [])
+            # A tag may have the same class twice.
+            if not entry[0] or entry[0][-1] != position:
+                entry[0].append(position)
+                entry[1].append(tag)
+
+    def _rebuild_index(self):
+        """Index every tag in the document, in document order."""
+        self._index = {}
+        self._index_count = 0
+        for tag in self.descendants:
+            if isinstance(tag, Tag):
+                self._index_tag(tag)
+        self._index_version = self._tree_version
+
     def new_tag(self, name, namespace=None, nsprefix=None, **attrs):
         """Create a new tag associated with this soup."""
-        return Tag(None, self.builder, name, namespace, nsprefix, attrs)
+        return self.tag_class(
+            None, self.builder, name, namespace, nsprefix, attrs)
 
     def new_string(self, s, subclass=NavigableString):
         """Create a new NavigableString associated with this soup."""
-        return subclass(s)
+        return self.string_container(subclass)(s)
+
+    def string_container(self, base_class=NavigableString):
+        """Return the class this soup uses for strings of base_class."""
+        if base_class is NavigableString:
+            return self.string_class
+        if self.weak_links:
+            return weak_linked(base_class)
+        return base_class
 
     def insert_before(self, successor):
         raise NotImplementedError("BeautifulSoup objects don't support insert_before().")
@@ -279,6 +378,8 @@ class BeautifulSoup(Tag):
         #print "Push", tag.name
         if self.currentTag:
             self.currentTag.contents.append(tag)
+            if self._index is not None:
+                self._index_tag(tag)
         self.tagStack.append(tag)
         self.currentTag = self.tagStack[-1]
         if tag.name in self.builder.preserve_whitespace_tags:
@@ -311,7 +412,7 @@ class BeautifulSoup(Tag):
                     not self.parse_only.search(current_data)):
                 return
 
-            o = containerClass(current_data)
+            o = self.string_container(containerClass)(current_data)
             self.object_was_parsed(o)
 
     def object_was_parsed(self, o, parent=None, most_recent_element=None):
@@ -331,6 +432,11 @@ class BeautifulSoup(Tag):
 
         self._most_recent_element = o
         parent.contents.append(o)
+        if self._index is not None and isinstance(o, Tag):
+            # Tree builders like html5lib add tags anywhere in the
+            # tree, not just after the last one, so the index is
+            # rebuilt in document order when it's next used.
+            self._tree_version += 1
 
         if parent.next_sibling:
             # This node is being inserted into an element that has
@@ -400,8 +506,9 @@ class BeautifulSoup(Tag):
                  or not self.parse_only.search_tag(name, attrs))):
             return None
 
-        tag = Tag(self, self.builder, name, namespace, nsprefix, attrs,
-                  self.currentTag, self._most_recent_element)
+        tag = self.tag_class(
+            self, self.builder, name, namespace, nsprefix, attrs,
+            self.currentTag, self._most_recent_element)
         if tag is None:
             return tag
         if self._most_recent_element:
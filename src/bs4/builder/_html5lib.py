@@ -44,8 +44,6 @@ class HTML5TreeBuilder(HTMLTreeBuilder):
 
     # These methods are defined by Beautiful Soup.
     def feed(self, markup):
-        if self.soup.parse_only is not None:
-            warnings.warn("You provided a value for parse_only, but the html5lib tree builder doesn't support parse_only. The entire document will be parsed.")
         parser = html5lib.HTMLParser(tree=self.create_treebuilder)
         doc = parser.parse(markup, encoding=self.user_specified_encoding)
 
@@ -57,6 +55,11 @@ class HTML5TreeBuilder(HTMLTreeBuilder):
         else:
             doc.original_encoding = parser.tokenizer.stream.charEncoding[0]
 
+        # html5lib's parser is full of reference cycles. Don't let it
+        # keep the soup alive until the garbage collector runs.
+        self.underlying_builder.forget_tree()
+        self.underlying_builder = None
+
     def create_treebuilder(self, namespaceHTMLElements):
         self.underlying_builder = TreeBuilderForHtml5lib(
             self.soup, namespaceHTMLElements)
@@ -73,6 +76,13 @@ class TreeBuilderForHtml5lib(html5lib.treebuilders._base.TreeBuilder):
         self.soup = soup
         super(TreeBuilderForHtml5lib, self).__init__(namespaceHTMLElements)
 
+    def forget_tree(self):
+        """Drop all references to the soup, once it's been built."""
+        self.soup = self.document = None
+        self.headPointer = self.formPointer = None
+        self.openElements = []
+        self.activeFormattingElements = []
+
     def documentClass(self):
         self.soup.reset()
         return Element(self.soup, self.soup, None)
@@ -82,7 +92,12 @@ class TreeBuilderForHtml5lib(html5lib.treebuilders._base.TreeBuilder):
         publicId = token["publicId"]
         systemId = token["systemId"]
 
-        doctype = Doctype.for_name_and_ids(name, publicId, systemId)
+        doctype = self.soup.string_container(Doctype).for_name_and_ids(
+            name, publicId, systemId)
+        parse_only = self.soup.parse_only
+        if parse_only and (not parse_only.text
+                           or not parse_only.search(doctype)):
+            return
         self.soup.object_was_parsed(doctype)
 
     def elementClass(self, name, namespace):
@@ -90,7 +105,7 @@ class TreeBuilderForHtml5lib(html5lib.treebuilders._base.TreeBuilder):
         return Element(tag, self.soup, namespace)
 
     def commentClass(self, data):
-        return TextNode(Comment(data), self.soup)
+        return TextNode(self.soup.new_string(data, Comment), self.soup)
 
     def fragmentClass(self):
         self.soup = BeautifulSoup("")
@@ -135,13 +150,71 @@ class AttrList(object):
 
 
 class Element(html5lib.treebuilders._base.Node):
+
+    # True if the soup has a parse_only strainer and this element
+    # didn't match it, so its tag isn't part of the tree.
+    pruned = False
+
+    # True if children were added to a pruned element
+    has_pruned_content = False
+
     def __init__(self, element, soup, namespace):
         html5lib.treebuilders._base.Node.__init__(self, element.name)
         self.element = element
         self.soup = soup
         self.namespace = namespace
 
+    def outside_tree(self):
+        """Are children added to this element outside of the regions
+        matched by parse_only?"""
+        return (self.soup.parse_only is not None
+                and (self.pruned or self.element is self.soup))
+
+    def prune(self, node):
+        """Add a node to an element that's outside the regions matched by
+        parse_only.
+
+        As with the other tree builders, a tag is added to the top level
+        of the tree, along with everything that's later added to it, if
+        it matches parse_only. Otherwise it's left out, but its children
+        get the same treatment. Strings are only kept if parse_only
+        looks for text and they match it.
+        """
+        self.has_pruned_content = True
+        if isinstance(node, basestring):
+            if not isinstance(node, NavigableString):
+                node = self.soup.new_string(node)
+            node = TextNode(node, self.soup)
+        if isinstance(node, Tag):
+            child = node
+        else:
+            child = node.element
+
+        parse_only = self.soup.parse_only
+        if isinstance(child, Tag):
+            if child.parent is not None:
+                child.extract()
+            if (parse_only.text
+                or not parse_only.search_tag(child.name, child.attrs)):
+                if isinstance(node, Element):
+                    node.pruned = True
+                return
+            if isinstance(node, Element):
+                node.pruned = False
+        elif not parse_only.text or not parse_only.search(child):
+            return
+        Element(self.soup, self.soup, None).add_child(node)
+
     def appendChild(self, node):
+        if self.outside_tree():
+            self.prune(node)
+            return
+        if isinstance(node, Element):
+            node.pruned = False
+        self.add_child(node)
+
+    def add_child(self, node):
+        """Add a node to the end of this element's contents."""
         string_child = child = None
         if isinstance(node, basestring):
             # Some other piece of code decided to pass in a string
@@ -153,7 +226,7 @@ class Element(html5lib.treebuilders._base.Node):
             # instead of creating an Element object to contain the
             # Tag.
             child = node
-        elif node.element.__class__ == NavigableString:
+        elif node.element.__class__ is self.soup.string_class:
             string_child = child = node.element
         else:
             child = node.element
@@ -162,7 +235,7 @@ class Element(html5lib.treebuilders._base.Node):
             node.element.extract()
 
         if (string_child and self.element.contents
-            and self.element.contents[-1].__class__ == NavigableString):
+            and self.element.contents[-1].__class__ is self.soup.string_class):
             # We are appending a string onto another string.
             # TODO This has O(n^2) performance, for input like
             # "a</a>a</a>a</a>..."
@@ -228,9 +301,15 @@ class Element(html5lib.treebuilders._base.Node):
             self.appendChild(data)
 
     def insertBefore(self, node, refNode):
+        if self.outside_tree():
+            self.prune(node)
+            return
+        if isinstance(node, Element):
+            node.pruned = False
         index = self.element.index(refNode.element)
-        if (node.element.__class__ == NavigableString and self.element.contents
-            and self.element.contents[index-1].__class__ == NavigableString):
+        string_class = self.soup.string_class
+        if (node.element.__class__ is string_class and self.element.contents
+            and self.element.contents[index-1].__class__ is string_class):
             # (See comments in appendChild)
             old_node = self.element.contents[index-1]
             new_str = self.soup.new_string(old_node + node.element)
@@ -249,6 +328,10 @@ class Element(html5lib.treebuilders._base.Node):
         # print "TO", new_parent.element
         element = self.element
         new_parent_element = new_parent.element
+        if new_parent.outside_tree():
+            for child in list(element.contents):
+                new_parent.prune(child)
+            return
         # Determine what this tag's next_element will be once all the children
         # are removed.
         final_next_element = element.next_sibling
@@ -296,6 +379,8 @@ class Element(html5lib.treebuilders._base.Node):
         # Now that this element has no children, change its .next_element.
         element.contents = []
         element.next_element = final_next_element
+        if self.soup._index is not None:
+            self.soup._tree_version += 1
 
         # print "DONE WITH MOVE"
         # print "FROM", self.element
@@ -309,7 +394,7 @@ class Element(html5lib.treebuilders._base.Node):
         return node
 
     def hasContent(self):
-        return self.element.contents
+        return self.element.contents or self.has_pruned_content
 
     def getNameTuple(self):
         if self.namespace == None:
@@ -208,7 +208,8 @@ class LXMLTreeBuilderForXML(TreeBuilder):
 
     def doctype(self, name, pubid, system):
         self.soup.endData()
-        doctype = Doctype.for_name_and_ids(name, pubid, system)
+        doctype = self.soup.string_container(Doctype).for_name_and_ids(
+            name, pubid, system)
         self.soup.object_was_parsed(doctype)
 
     def comment(self, content):
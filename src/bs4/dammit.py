@@ -85,6 +85,9 @@ class EntitySubstitution(object):
 
     AMPERSAND_OR_BRACKET = re.compile("([<>&])")
 
+    # Anything that looks like a named entity or character reference
+    HTML_ENTITY_RE = re.compile("&#?\w+;")
+
     @classmethod
     def _substitute_html_entity(cls, matchobj):
         entity = cls.CHARACTER_TO_HTML_ENTITY.get(matchobj.group(0))
@@ -192,6 +195,37 @@ class EntitySubstitution(object):
         return cls.CHARACTER_TO_HTML_ENTITY_RE.sub(
             cls._substitute_html_entity, s)
 
+    @classmethod
+    def _decode_html_entity(cls, matchobj):
+        entity = matchobj.group(0)
+        try:
+            if entity[:3] == "&#x":
+                return unichr(int(entity[3:-1], 16))
+            elif entity[:2] == "&#":
+                return unichr(int(entity[2:-1]))
+            return cls.HTML_ENTITY_TO_CHARACTER[entity[1:-1]]
+        except (KeyError, ValueError):
+            # Not an entity, or not a character we can represent
+            return entity
+
+    @classmethod
+    def decode_html_entities(cls, s):
+        """Replace HTML entities and character references with the
+        characters they stand for.
+
+        If html5lib is installed, its entity tables are used, so
+        references are decoded the way an HTML5 parser decodes them in
+        text. Otherwise only the entities in HTML 4 are known, and
+        anything else that looks like an entity is left alone.
+        """
+        if '&' not in s:
+            return s
+        try:
+            from html5lib.entities import unescape
+        except ImportError:
+            return cls.HTML_ENTITY_RE.sub(cls._decode_html_entity, s)
+        return unescape(s)
+
 
 class EncodingDetector:
     """Suggests a number of possible encodings for a bytestring.
@@ -212,15 +246,30 @@ class EncodingDetector:
     4. UTF-8.
 
     5. Windows-1252.
+
+    Steps 2 and 3 only look at the first prescan_bytes bytes of the
+    document, and are only taken if nothing before them worked.
     """
+
+    # How much of a document to search for a declared encoding, and to
+    # give to chardet, by default.
+    PRESCAN_BYTES = 64 * 1024
+
     def __init__(self, markup, override_encodings=None, is_html=False,
-                 exclude_encodings=None):
+                 exclude_encodings=None, prescan_bytes=None):
         self.override_encodings = override_encodings or []
         exclude_encodings = exclude_encodings or []
         self.exclude_encodings = set([x.lower() for x in exclude_encodings])
         self.chardet_encoding = None
         self.is_html = is_html
         self.declared_encoding = None
+        if prescan_bytes is None:
+            prescan_bytes = self.PRESCAN_BYTES
+        self.prescan_bytes = prescan_bytes
+        # Whether the searches for declared_encoding and
+        # chardet_encoding have been made, even if they found nothing.
+        self._declared_searched = False
+        self._chardet_searched = False
 
         # First order of business: strip a byte-order mark.
         self.markup, self.sniffed_encoding = self.strip_byte_order_mark(markup)
@@ -250,16 +299,19 @@ class EncodingDetector:
 
         # Look within the document for an XML or HTML encoding
         # declaration.
-        if self.declared_encoding is None:
+        if not self._declared_searched:
             self.declared_encoding = self.find_declared_encoding(
-                self.markup, self.is_html)
+                self.markup, self.is_html, prescan_bytes=self.prescan_bytes)
+            self._declared_searched = True
         if self._usable(self.declared_encoding, tried):
             yield self.declared_encoding
 
         # Use third-party character set detection to guess at the
         # encoding.
-        if self.chardet_encoding is None:
-            self.chardet_encoding = chardet_dammit(self.markup)
+        if not self._chardet_searched:
+            self.chardet_encoding = chardet_dammit(
+                self.markup[:self.prescan_bytes])
+            self._chardet_searched = True
         if self._usable(self.chardet_encoding, tried):
             yield self.chardet_encoding
 
@@ -295,19 +347,25 @@ class EncodingDetector:
         return data, encoding
 
     @classmethod
-    def find_declared_encoding(cls, markup, is_html=False, search_entire_document=False):
+    def find_declared_encoding(cls, markup, is_html=False, search_entire_document=False,
+                               prescan_bytes=None):
         """Given a document, tries to find its declared encoding.
 
         An XML encoding is declared at the beginning of the document.
 
         An HTML encoding is declared in a <meta> tag, hopefully near the
-        beginning of the document.
+        beginning of the document. Unless search_entire_document is
+        True, no more than prescan_bytes bytes (PRESCAN_BYTES by
+        default) are searched.
         """
         if search_entire_document:
             xml_endpos = html_endpos = len(markup)
         else:
-            xml_endpos = 1024
-            html_endpos = max(2048, int(len(markup) * 0.05))
+            if prescan_bytes is None:
+                prescan_bytes = cls.PRESCAN_BYTES
+            xml_endpos = min(1024, prescan_bytes)
+            html_endpos = min(
+                max(2048, int(len(markup) * 0.05)), prescan_bytes)
             
         declared_encoding = None
         declared_encoding_match = xml_encoding_re.search(markup, endpos=xml_endpos)
@@ -339,15 +397,25 @@ class UnicodeDammit:
         "iso-8859-2",
         ]
 
+    # A strict trial decode of a long document starts with this many
+    # bytes, so a wrong guess usually fails before the whole document
+    # has been decoded.
+    TRIAL_CHUNK_BYTES = 64 * 1024
+
+    # Codecs found by find_codec(), by class and charset name
+    _found_codecs = {}
+
     def __init__(self, markup, override_encodings=[],
-                 smart_quotes_to=None, is_html=False, exclude_encodings=[]):
+                 smart_quotes_to=None, is_html=False, exclude_encodings=[],
+                 prescan_bytes=None):
         self.smart_quotes_to = smart_quotes_to
         self.tried_encodings = []
         self.contains_replacement_characters = False
         self.is_html = is_html
 
         self.detector = EncodingDetector(
-            markup, override_encodings, is_html, exclude_encodings)
+            markup, override_encodings, is_html, exclude_encodings,
+            prescan_bytes)
 
         # Short-circuit if the data is in Unicode to begin with.
         if isinstance(markup, unicode) or markup == '':
@@ -435,6 +503,12 @@ class UnicodeDammit:
     def _to_unicode(self, data, encoding, errors="strict"):
         '''Given a string and its encoding, decodes the string into Unicode.
         %encoding is a string recognized by encodings.aliases'''
+        if errors == "strict" and len(data) > self.TRIAL_CHUNK_BYTES:
+            # An incremental decoder copes with a character that is cut
+            # in half at the end of the chunk.
+            decoder = codecs.lookup(encoding).incrementaldecoder
+            if decoder is not None:
+                decoder(errors).decode(data[:self.TRIAL_CHUNK_BYTES])
         return unicode(data, encoding, errors)
 
     @property
@@ -444,6 +518,11 @@ class UnicodeDammit:
         return self.detector.declared_encoding
 
     def find_codec(self, charset):
+        key = (self.__class__, charset)
+        try:
+            return self._found_codecs[key]
+        except KeyError:
+            pass
         value = (self._codec(self.CHARSET_ALIASES.get(charset, charset))
                or (charset and self._codec(charset.replace("-", "")))
                or (charset and self._codec(charset.replace("-", "_")))
@@ -451,8 +530,12 @@ class UnicodeDammit:
                or charset
                 )
         if value:
-            return value.lower()
-        return None
+            value = value.lower()
+        else:
+            value = None
+        if len(self._found_codecs) < 1000:
+            self._found_codecs[key] = value
+        return value
 
     def _codec(self, charset):
         if not charset:
@@ -1,8 +1,10 @@
 from pdb import set_trace
+import bisect
 import collections
 import re
 import sys
 import warnings
+import weakref
 from bs4.dammit import EntitySubstitution
 
 DEFAULT_OUTPUT_ENCODING = "utf-8"
@@ -10,6 +12,69 @@ PY3K = (sys.version_info[0] > 2)
 
 whitespace_re = re.compile("\s+")
 
+# Attributes whose values are indexed, along with tag names, by
+# BeautifulSoup(build_index=True)
+INDEXED_ATTRIBUTES = ('class', 'id')
+
+# (positions, tags) of an index key no tag has
+EMPTY_INDEX_ENTRY = ((), ())
+
+# The BeautifulSoup objects that have an index, by id (equal documents
+# are still different documents). While there are none, changing a
+# tree doesn't need to look for the index to invalidate.
+indexed_documents = weakref.WeakValueDictionary()
+
+class _EmptyAttributes(dict):
+    """The attributes of every CompactTag that has none.
+
+    It can't be changed, so one instance can be shared by all those
+    tags. CompactTag.attrs hands out a _CopyOnWriteAttributes in its
+    place.
+    """
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("EMPTY_ATTRIBUTES is shared and can't be changed.")
+
+    __setitem__ = setdefault = update = _read_only
+
+    def __reduce__(self):
+        return 'EMPTY_ATTRIBUTES'
+
+EMPTY_ATTRIBUTES = _EmptyAttributes()
+
+class _CopyOnWriteAttributes(dict):
+    """The attributes of a CompactTag that has none (yet).
+
+    A new one is made each time the tag's attrs are looked up, so the
+    tag doesn't refer to it. The first time one is written to, it
+    becomes the tag's own attribute dictionary.
+    """
+
+    __slots__ = ('_tag',)
+
+    def __init__(self, tag):
+        self._tag = tag
+
+    def _adopt(self):
+        if self._tag is not None:
+            self._tag.attrs = self
+            self._tag = None
+
+    def __setitem__(self, key, value):
+        self._adopt()
+        dict.__setitem__(self, key, value)
+
+    def setdefault(self, key, default=None):
+        self._adopt()
+        return dict.setdefault(self, key, default)
+
+    def update(self, *args, **kwargs):
+        self._adopt()
+        dict.update(self, *args, **kwargs)
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
 def _alias(attr):
     """Alias one attribute name to another for backward compatibility"""
     @property
@@ -21,6 +86,16 @@ def _alias(attr):
         return setattr(self, attr)
     return alias
 
+def _slots_getstate(self):
+    """Pickle an object whose attributes are (mostly) in slots."""
+    state = dict((slot, getattr(self, slot)) for slot in self.__slots__)
+    state.update(self.__dict__)
+    return state
+
+def _slots_setstate(self, state):
+    for key, value in state.items():
+        setattr(self, key, value)
+
 
 class NamespacedAttribute(unicode):
 
@@ -215,6 +290,10 @@ class PageElement(object):
     nextSibling = _alias("next_sibling")  # BS3
     previousSibling = _alias("previous_sibling")  # BS3
 
+    def _destroy(self):
+        """Drop this element's references, as part of decompose()."""
+        self.__dict__.clear()
+
     def replace_with(self, replace_with):
         if not self.parent:
             raise ValueError(
@@ -252,6 +331,8 @@ class PageElement(object):
 
     def extract(self):
         """Destructively rips this element out of the tree."""
+        if isinstance(self, Tag):
+            self._tree_changed()
         if self.parent is not None:
             del self.parent.contents[self.parent.index(self)]
 
@@ -279,6 +360,20 @@ class PageElement(object):
         self.previous_sibling = self.next_sibling = None
         return self
 
+    def _tree_changed(self):
+        """Invalidate the index of the document this element is in.
+
+        Called when tags are added, removed or moved, or their class or
+        id changes.
+        """
+        if not indexed_documents:
+            return
+        root = self
+        while root.parent is not None:
+            root = root.parent
+        if root._index is not None:
+            root._tree_version += 1
+
     def _last_descendant(self, is_initialized=True, accept_self=True):
         "Finds the last element beneath this object to be parsed."
         if is_initialized and self.next_sibling:
@@ -300,6 +395,8 @@ class PageElement(object):
             and not isinstance(new_child, NavigableString)):
             new_child = NavigableString(new_child)
 
+        if isinstance(new_child, Tag):
+            self._tree_changed()
         position = min(position, len(self.contents))
         if hasattr(new_child, 'parent') and new_child.parent is not None:
             # We're 'inserting' an element that's already one
@@ -524,13 +621,10 @@ class PageElement(object):
                             and element.name == name)
                 return ResultSet(strainer, result)
         results = ResultSet(strainer)
-        while True:
-            try:
-                i = next(generator)
-            except StopIteration:
-                break
+        search = strainer._search_element
+        for i in generator:
             if i:
-                found = strainer.search(i)
+                found = search(i)
                 if found:
                     results.append(found)
                     if limit and len(results) >= limit:
@@ -609,7 +703,8 @@ class PageElement(object):
                 return tag.name == tag_name and function(tag)
             return _match
 
-    def _attribute_checker(self, operator, attribute, value=''):
+    @staticmethod
+    def _attribute_checker(operator, attribute, value=''):
         """Create a function that performs a CSS selector operation.
 
         Takes an operator, attribute and optional value. Returns a
@@ -766,16 +861,44 @@ class Doctype(PreformattedString):
         elif system_id is not None:
             value += ' SYSTEM "%s"' % system_id
 
-        return Doctype(value)
+        return cls(value)
 
     PREFIX = u'<!DOCTYPE '
     SUFFIX = u'>\n'
 
 
+class CompactNavigableString(NavigableString):
+    """A NavigableString that keeps its place in the tree in slots.
+
+    Used by BeautifulSoup(compact=True). It has no instance dictionary
+    unless it's given an attribute NavigableString doesn't define.
+    """
+
+    __slots__ = ('parent', 'previous_element', 'next_element',
+                 'previous_sibling', 'next_sibling')
+
+    __getstate__ = _slots_getstate
+    __setstate__ = _slots_setstate
+
+    def _destroy(self):
+        self.parent = self.previous_element = self.next_element = None
+        self.previous_sibling = self.next_sibling = None
+
+
+# The element classes compact and weak-linked classes stand in for
+_standard_classes = {CompactNavigableString: NavigableString}
+
+
 class Tag(PageElement):
 
     """Represents a found HTML tag with its attributes and contents."""
 
+    # Set on the BeautifulSoup object if it indexes its tags (see
+    # BeautifulSoup._index_tag). Defined here so looking them up on
+    # other tags doesn't go through __getattr__.
+    _index = None
+    _index_position = None
+
     def __init__(self, parser=None, builder=None, name=None, namespace=None,
                  prefix=None, attrs=None, parent=None, previous=None):
         "Basic constructor."
@@ -867,18 +990,30 @@ class Tag(PageElement):
         self.clear()
         self.append(string.__class__(string))
 
-    def _all_strings(self, strip=False, types=(NavigableString, CData)):
+    def _all_strings(self, strip=False, types=(NavigableString, CData),
+                     recursive=True):
         """Yield all strings of certain classes, possibly stripping them.
 
         By default, yields only NavigableString and CData objects. So
-        no comments, processing instructions, etc.
+        no comments, processing instructions, etc. Compact and
+        weak-linked strings count as the class they stand in for.
+
+        If recursive is False, only this tag's children are looked at,
+        and a child tag stands for its .string, if it has one.
         """
-        for descendant in self.descendants:
-            if (
-                (types is None and not isinstance(descendant, NavigableString))
-                or
-                (types is not None and type(descendant) not in types)):
-                continue
+        if recursive:
+            descendants = self.descendants
+        else:
+            descendants = self._child_strings()
+        for descendant in descendants:
+            if types is None:
+                if not isinstance(descendant, NavigableString):
+                    continue
+            else:
+                cls = type(descendant)
+                if (cls not in types
+                    and _standard_classes.get(cls, cls) not in types):
+                    continue
             if strip:
                 descendant = descendant.strip()
                 if len(descendant) == 0:
@@ -887,30 +1022,63 @@ class Tag(PageElement):
 
     strings = property(_all_strings)
 
+    def _child_strings(self):
+        for child in self.contents:
+            if isinstance(child, Tag):
+                child = child.string
+                if child is None:
+                    continue
+            yield child
+
     @property
     def stripped_strings(self):
         for string in self._all_strings(True):
             yield string
 
     def get_text(self, separator=u"", strip=False,
-                 types=(NavigableString, CData)):
+                 types=(NavigableString, CData), recursive=True,
+                 collapse_whitespace=False, decode_entities=False):
         """
         Get all child strings, concatenated using the given separator.
+
+        types=None gets strings of any class, comments included. See
+        _all_strings() for recursive.
+
+        If decode_entities is True, HTML entities that are still in the
+        text (because the markup escaped them twice, say) are decoded.
+        If collapse_whitespace is True, each run of ASCII whitespace
+        in the text becomes a single space, and once any entities are
+        decoded, whitespace is stripped from both ends of the text.
         """
-        return separator.join([s for s in self._all_strings(
-                    strip, types=types)])
+        text = separator.join(
+            self._all_strings(strip, types=types, recursive=recursive))
+        if collapse_whitespace:
+            text = whitespace_re.sub(u' ', text)
+        if decode_entities:
+            text = EntitySubstitution.decode_html_entities(text)
+        if collapse_whitespace:
+            text = text.strip()
+        return text
     getText = get_text
     text = property(get_text)
 
     def decompose(self):
-        """Recursively destroys the contents of this tree."""
+        """Recursively destroys the contents of this tree.
+
+        The elements in it no longer refer to each other afterwards,
+        so they're freed as soon as nothing else refers to them rather
+        than by the cyclic garbage collector. Decompose a
+        BeautifulSoup object to free a document you've finished with.
+        """
         self.extract()
-        i = self
-        while i is not None:
-            next = i.next_element
-            i.__dict__.clear()
-            i.contents = []
-            i = next
+        elements = [self]
+        elements.extend(self.descendants)
+        for element in elements:
+            element._destroy()
+
+    def _destroy(self):
+        self.__dict__.clear()
+        self.contents = []
 
     def clear(self, decompose=False):
         """
@@ -971,10 +1139,14 @@ class Tag(PageElement):
     def __setitem__(self, key, value):
         """Setting tag[key] sets the value of the 'key' attribute for the
         tag."""
+        if key in INDEXED_ATTRIBUTES:
+            self._tree_changed()
         self.attrs[key] = value
 
     def __delitem__(self, key):
         "Deleting tag[key] deletes all 'key' attributes for the tag."
+        if key in INDEXED_ATTRIBUTES:
+            self._tree_changed()
         self.attrs.pop(key, None)
 
     def __call__(self, *args, **kwargs):
@@ -1252,10 +1424,96 @@ class Tag(PageElement):
         generator = self.descendants
         if not recursive:
             generator = self.children
+        else:
+            candidates = self._indexed_candidates(name, attrs, text, kwargs)
+            if candidates is not None:
+                generator = iter(candidates)
         return self._find_all(name, attrs, text, limit, generator, **kwargs)
     findAll = find_all       # BS3
     findChildren = find_all  # BS2
 
+    def _indexed_candidates(self, name, attrs, text, kwargs):
+        """Use the document's index to narrow down a find_all() search.
+
+        :return: A list of descendants (in document order) that
+        includes every tag matching the search, or None if the search
+        can't use the index.
+        """
+        if self._index is None and self.parent is None:
+            # Not part of an indexed document.
+            return None
+        if text is not None or 'string' in kwargs:
+            return None
+        if isinstance(name, SoupStrainer):
+            return None
+        if isinstance(attrs, basestring):
+            class_ = attrs
+        elif isinstance(attrs, dict):
+            class_ = attrs.get('class')
+        else:
+            return None
+        class_ = kwargs.get('class_', class_)
+        id = kwargs.get('id', attrs.get('id') if isinstance(attrs, dict)
+                        else None)
+
+        # Only plain strings can be looked up. A name with a namespace
+        # prefix may match a tag with a different name.
+        if not isinstance(name, basestring) or ':' in name:
+            name = None
+        if not isinstance(class_, basestring) or whitespace_re.search(
+                class_):
+            class_ = None
+        if not isinstance(id, basestring):
+            id = None
+        return self._indexed_descendants(name, class_, id)
+
+    def _indexed_descendants(self, name=None, class_=None, id=None):
+        """Find descendants that may have the given name, class and id.
+
+        :return: A list of descendants in document order, looked up in
+        the index of the document this tag is part of, or None if
+        there is no index or no criteria were given.
+        """
+        if name is None and class_ is None and id is None:
+            return None
+        if not indexed_documents:
+            return None
+        root = self
+        while root.parent is not None:
+            root = root.parent
+        if root._index is None:
+            return None
+        if root._index_version != root._tree_version:
+            root._rebuild_index()
+
+        entries = []
+        for key in (('id', id), ('class', class_), ('name', name)):
+            if key[1] is not None:
+                entries.append(root._index.get(key, EMPTY_INDEX_ENTRY))
+        positions, tags = min(entries, key=lambda entry: len(entry[0]))
+        if self is root:
+            return tags
+
+        # A tag's descendants come between it and the next tag that
+        # isn't one of its descendants.
+        start = self._index_position
+        if start is None:
+            return None
+        end = None
+        element = self
+        while end is None and element is not None:
+            sibling = element.next_sibling
+            while sibling is not None:
+                if isinstance(sibling, Tag):
+                    end = sibling._index_position
+                    break
+                sibling = sibling.next_sibling
+            element = element.parent
+        low = bisect.bisect_right(positions, start)
+        if end is None:
+            return tags[low:]
+        return tags[low:bisect.bisect_left(positions, end)]
+
     #Generator methods
     @property
     def children(self):
@@ -1274,8 +1532,6 @@ class Tag(PageElement):
 
     # CSS selector code
 
-    _selector_combinators = ['>', '+', '~']
-    _select_debug = False
     def select_one(self, selector):
         """Perform a CSS selection operation on the current element."""
         value = self.select(selector, limit=1)
@@ -1284,221 +1540,13 @@ class Tag(PageElement):
         return None
 
     def select(self, selector, _candidate_generator=None, limit=None):
-        """Perform a CSS selection operation on the current element."""
-
-        # Remove whitespace directly after the grouping operator ','
-        # then split into tokens.
-        tokens = re.sub(',[\s]*',',', selector).split()
-        current_context = [self]
-
-        if tokens[-1] in self._selector_combinators:
-            raise ValueError(
-                'Final combinator "%s" is missing an argument.' % tokens[-1])
-
-        if self._select_debug:
-            print 'Running CSS selector "%s"' % selector
+        """Perform a CSS selection operation on the current element.
 
-        for index, token_group in enumerate(tokens):
-            new_context = []
-            new_context_ids = set([])
-
-            # Grouping selectors, ie: p,a
-            grouped_tokens = token_group.split(',')
-            if '' in grouped_tokens:
-                raise ValueError('Invalid group selection syntax: %s' % token_group)
-
-            if tokens[index-1] in self._selector_combinators:
-                # This token was consumed by the previous combinator. Skip it.
-                if self._select_debug:
-                    print '  Token was consumed by the previous combinator.'
-                continue
-
-            for token in grouped_tokens:
-                if self._select_debug:
-                    print ' Considering token "%s"' % token
-                recursive_candidate_generator = None
-                tag_name = None
-
-                # Each operation corresponds to a checker function, a rule
-                # for determining whether a candidate matches the
-                # selector. Candidates are generated by the active
-                # iterator.
-                checker = None
-
-                m = self.attribselect_re.match(token)
-                if m is not None:
-                    # Attribute selector
-                    tag_name, attribute, operator, value = m.groups()
-                    checker = self._attribute_checker(operator, attribute, value)
-
-                elif '#' in token:
-                    # ID selector
-                    tag_name, tag_id = token.split('#', 1)
-                    def id_matches(tag):
-                        return tag.get('id', None) == tag_id
-                    checker = id_matches
-
-                elif '.' in token:
-                    # Class selector
-                    tag_name, klass = token.split('.', 1)
-                    classes = set(klass.split('.'))
-                    def classes_match(candidate):
-                        return classes.issubset(candidate.get('class', []))
-                    checker = classes_match
-
-                elif ':' in token:
-                    # Pseudo-class
-                    tag_name, pseudo = token.split(':', 1)
-                    if tag_name == '':
-                        raise ValueError(
-                            "A pseudo-class must be prefixed with a tag name.")
-                    pseudo_attributes = re.match('([a-zA-Z\d-]+)\(([a-zA-Z\d]+)\)', pseudo)
-                    found = []
-                    if pseudo_attributes is None:
-                        pseudo_type = pseudo
-                        pseudo_value = None
-                    else:
-                        pseudo_type, pseudo_value = pseudo_attributes.groups()
-                    if pseudo_type == 'nth-of-type':
-                        try:
-                            pseudo_value = int(pseudo_value)
-                        except:
-                            raise NotImplementedError(
-                                'Only numeric values are currently supported for the nth-of-type pseudo-class.')
-                        if pseudo_value < 1:
-                            raise ValueError(
-                                'nth-of-type pseudo-class value must be at least 1.')
-                        class Counter(object):
-                            def __init__(self, destination):
-                                self.count = 0
-                                self.destination = destination
-
-                            def nth_child_of_type(self, tag):
-                                self.count += 1
-                                if self.count == self.destination:
-                                    return True
-                                if self.count > self.destination:
-                                    # Stop the generator that's sending us
-                                    # these things.
-                                    raise StopIteration()
-                                return False
-                        checker = Counter(pseudo_value).nth_child_of_type
-                    else:
-                        raise NotImplementedError(
-                            'Only the following pseudo-classes are implemented: nth-of-type.')
-
-                elif token == '*':
-                    # Star selector -- matches everything
-                    pass
-                elif token == '>':
-                    # Run the next token as a CSS selector against the
-                    # direct children of each tag in the current context.
-                    recursive_candidate_generator = lambda tag: tag.children
-                elif token == '~':
-                    # Run the next token as a CSS selector against the
-                    # siblings of each tag in the current context.
-                    recursive_candidate_generator = lambda tag: tag.next_siblings
-                elif token == '+':
-                    # For each tag in the current context, run the next
-                    # token as a CSS selector against the tag's next
-                    # sibling that's a tag.
-                    def next_tag_sibling(tag):
-                        yield tag.find_next_sibling(True)
-                    recursive_candidate_generator = next_tag_sibling
-
-                elif self.tag_name_re.match(token):
-                    # Just a tag name.
-                    tag_name = token
-                else:
-                    raise ValueError(
-                        'Unsupported or invalid CSS selector: "%s"' % token)
-                if recursive_candidate_generator:
-                    # This happens when the selector looks like  "> foo".
-                    #
-                    # The generator calls select() recursively on every
-                    # member of the current context, passing in a different
-                    # candidate generator and a different selector.
-                    #
-                    # In the case of "> foo", the candidate generator is
-                    # one that yields a tag's direct children (">"), and
-                    # the selector is "foo".
-                    next_token = tokens[index+1]
-                    def recursive_select(tag):
-                        if self._select_debug:
-                            print '    Calling select("%s") recursively on %s %s' % (next_token, tag.name, tag.attrs)
-                            print '-' * 40
-                        for i in tag.select(next_token, recursive_candidate_generator):
-                            if self._select_debug:
-                                print '(Recursive select picked up candidate %s %s)' % (i.name, i.attrs)
-                            yield i
-                        if self._select_debug:
-                            print '-' * 40
-                    _use_candidate_generator = recursive_select
-                elif _candidate_generator is None:
-                    # By default, a tag's candidates are all of its
-                    # children. If tag_name is defined, only yield tags
-                    # with that name.
-                    if self._select_debug:
-                        if tag_name:
-                            check = "[any]"
-                        else:
-                            check = tag_name
-                        print '   Default candidate generator, tag name="%s"' % check
-                    if self._select_debug:
-                        # This is redundant with later code, but it stops
-                        # a bunch of bogus tags from cluttering up the
-                        # debug log.
-                        def default_candidate_generator(tag):
-                            for child in tag.descendants:
-                                if not isinstance(child, Tag):
-                                    continue
-                                if tag_name and not child.name == tag_name:
-                                    continue
-                                yield child
-                        _use_candidate_generator = default_candidate_generator
-                    else:
-                        _use_candidate_generator = lambda tag: tag.descendants
-                else:
-                    _use_candidate_generator = _candidate_generator
-
-                count = 0
-                for tag in current_context:
-                    if self._select_debug:
-                        print "    Running candidate generator on %s %s" % (
-                            tag.name, repr(tag.attrs))
-                    for candidate in _use_candidate_generator(tag):
-                        if not isinstance(candidate, Tag):
-                            continue
-                        if tag_name and candidate.name != tag_name:
-                            continue
-                        if checker is not None:
-                            try:
-                                result = checker(candidate)
-                            except StopIteration:
-                                # The checker has decided we should no longer
-                                # run the generator.
-                                break
-                        if checker is None or result:
-                            if self._select_debug:
-                                print "     SUCCESS %s %s" % (candidate.name, repr(candidate.attrs))
-                            if id(candidate) not in new_context_ids:
-                                # If a tag matches a selector more than once,
-                                # don't include it in the context more than once.
-                                new_context.append(candidate)
-                                new_context_ids.add(id(candidate))
-                                if limit and len(new_context) >= limit:
-                                    break
-                        elif self._select_debug:
-                            print "     FAILURE %s %s" % (candidate.name, repr(candidate.attrs))
-
-
-            current_context = new_context
-
-        if self._select_debug:
-            print "Final verdict:"
-            for i in current_context:
-                print " %s %s" % (i.name, i.attrs)
-        return current_context
+        The selector is compiled the first time it's used (see
+        CSSSelector). Matching tags are returned in document order.
+        """
+        return CSSSelector.compile(selector).select(
+            self, limit, _candidate_generator)
 
     # Old names for backwards compatibility
     def childGenerator(self):
@@ -1515,10 +1563,473 @@ class Tag(PageElement):
                 key))
         return self.has_attr(key)
 
+
+class CompactTag(Tag):
+    """A Tag that keeps its name, attributes, contents and place in the
+    tree in slots.
+
+    Used by BeautifulSoup(compact=True). It has no instance dictionary
+    unless it's given an attribute Tag doesn't define, and all compact
+    tags without attributes share EMPTY_ATTRIBUTES. A tag gets its own
+    dictionary the first time its attrs are changed.
+    """
+
+    __slots__ = CompactNavigableString.__slots__ + (
+        'parser_class', 'name', 'namespace', 'prefix', '_attrs', 'contents',
+        'hidden', 'can_be_empty_element', '_index_position')
+
+    __getstate__ = _slots_getstate
+    __setstate__ = _slots_setstate
+
+    def __init__(self, *args, **kwargs):
+        self._index_position = None
+        super(CompactTag, self).__init__(*args, **kwargs)
+        if not self._attrs:
+            self._attrs = EMPTY_ATTRIBUTES
+
+    @property
+    def attrs(self):
+        attrs = self._attrs
+        if attrs is EMPTY_ATTRIBUTES:
+            return _CopyOnWriteAttributes(self)
+        return attrs
+
+    @attrs.setter
+    def attrs(self, attrs):
+        self._attrs = attrs
+
+    def _destroy(self):
+        self.parent = self.previous_element = self.next_element = None
+        self.previous_sibling = self.next_sibling = None
+        self.contents = []
+
+
+# Links to the elements before a weak-linked element in the tree
+WEAK_LINKS = ('parent', 'previous_element', 'previous_sibling')
+
+_weak_linked_classes = {}
+
+_member_descriptor = type(CompactTag.parent)
+
+def _weak_link(name, slot=None):
+    """A property that keeps a weak reference to the element it's set to.
+
+    The reference is kept in member descriptor ``slot``, or in the
+    instance dictionary if there's no slot.
+    """
+    if slot is None:
+        def get_ref(self):
+            return self.__dict__.get(name)
+
+        def set_ref(self, ref):
+            self.__dict__[name] = ref
+    else:
+        get_ref = slot.__get__
+        set_ref = slot.__set__
+
+    def get(self):
+        ref = get_ref(self)
+        if ref is None:
+            return None
+        return ref()
+
+    def set(self, value):
+        if value is not None:
+            value = weakref.ref(value)
+        set_ref(self, value)
+    return property(get, set)
+
+def _weak_links_getstate(self):
+    state = dict(self.__dict__)
+    for slot in getattr(self, '__slots__', ()):
+        state[slot] = getattr(self, slot)
+    for name in WEAK_LINKS:
+        state[name] = getattr(self, name)
+    return state
+
+def weak_linked(cls):
+    """Return a subclass of element class ``cls`` whose WEAK_LINKS are
+    weak references.
+
+    A tree made of weak-linked elements has no reference cycles, so
+    it's freed as soon as nothing refers to its root, without waiting
+    for the garbage collector. An element's parent and previous
+    elements disappear (become None) if nothing else keeps them alive,
+    though: hold on to the BeautifulSoup object while you use the tree.
+    """
+    weak_cls = _weak_linked_classes.get(cls)
+    if weak_cls is None:
+        namespace = dict(__module__=__name__,
+                         __getstate__=_weak_links_getstate,
+                         __setstate__=_slots_setstate)
+        for name in WEAK_LINKS:
+            slot = getattr(cls, name, None)
+            if type(slot) is not _member_descriptor:
+                slot = None
+            namespace[name] = _weak_link(name, slot)
+        weak_cls = type('WeakLinked' + cls.__name__, (cls,), namespace)
+        _weak_linked_classes[cls] = weak_cls
+        _weak_linked_classes[weak_cls] = weak_cls
+        _standard_classes[weak_cls] = _standard_classes.get(cls, cls)
+        # Make the class picklable
+        globals()[weak_cls.__name__] = weak_cls
+    return weak_cls
+
+for _cls in (Tag, CompactTag, NavigableString, CompactNavigableString, CData,
+             ProcessingInstruction, Comment, Declaration, Doctype):
+    weak_linked(_cls)
+del _cls
+
 # Next, a couple classes to represent queries and their results.
+class CSSSelector(object):
+    """A CSS selector, parsed into a plan for matching tags.
+
+    Tags are matched right to left. Each candidate is checked against
+    the last compound selector (like "div.card"), then its ancestors
+    or siblings are checked against the ones before it. The tree is
+    only walked once, whatever the number of combinators.
+
+    A comma separates alternatives for one compound selector, so
+    "x, y > z" selects the z tags that are children of an x or a y.
+    """
+
+    combinators = ('>', '+', '~')
+
+    # The MAX_CACHE most recently used compiled selectors, by selector
+    # string, least recently used first
+    _cache = collections.OrderedDict()
+    MAX_CACHE = 100
+
+    tag_name_re = re.compile(r'\*|[a-zA-Z0-9][-a-zA-Z0-9_]*')
+
+    # An ID, class, attribute or pseudo-class selector
+    simple_selector_re = re.compile(
+        r'\#(?P<id>[-\w]+)'
+        r'|\.(?P<class>[-\w]+)'
+        r'|\[(?P<attribute>[\w-]+)(?P<operator>[=~\|\^\$\*]?)'
+        r'=?"?(?P<value>[^\]"]*)"?\]'
+        r'|:(?P<pseudo>[-a-zA-Z]+)(?:\((?P<argument>[^)]*)\))?',
+        re.UNICODE)
+
+    # The argument to nth-child() and friends: an+b
+    nth_re = re.compile(r'^([-+]?\d*)n([-+]\d+)?$')
+
+    pseudo_classes = (
+        'nth-child', 'nth-last-child', 'nth-of-type', 'nth-last-of-type',
+        'first-child', 'last-child', 'first-of-type', 'last-of-type',
+        'only-child', 'only-of-type', 'empty')
+
+    @classmethod
+    def compile(cls, selector):
+        """Return the compiled selector for a selector string."""
+        compiled = cls._cache.pop(selector, None)
+        if compiled is None:
+            compiled = cls(selector)
+            if len(cls._cache) >= cls.MAX_CACHE:
+                cls._cache.popitem(last=False)
+        cls._cache[selector] = compiled
+        return compiled
+
+    def __init__(self, selector):
+        self.selector = selector
+
+        # Remove whitespace directly after the grouping operator ','
+        # then split into tokens.
+        tokens = re.sub(',[\s]*', ',', selector).split()
+        if not tokens:
+            raise ValueError('Empty CSS selector.')
+        if tokens[-1] in self.combinators:
+            raise ValueError(
+                'Final combinator "%s" is missing an argument.' % tokens[-1])
+
+        # (combinator, match function) for each compound selector,
+        # from left to right. The first combinator relates the first
+        # compound selector to the tag select() was called on.
+        self.steps = []
+        # (name, class, id) to look up candidates in the index
+        self.index_key = (None, None, None)
+        combinator = ' '
+        for token in tokens:
+            if token in self.combinators:
+                if combinator != ' ':
+                    raise ValueError(
+                        'Unsupported or invalid CSS selector: "%s"'
+                        % selector)
+                combinator = token
+                continue
+
+            # Grouping selectors, ie: p,a
+            grouped_tokens = token.split(',')
+            if '' in grouped_tokens:
+                raise ValueError(
+                    'Invalid group selection syntax: %s' % token)
+            compounds = [self._compile_compound(group)
+                         for group in grouped_tokens]
+            if len(compounds) == 1:
+                match, self.index_key = compounds[0]
+            else:
+                match = self._any(m for m, key in compounds)
+                self.index_key = (None, None, None)
+            self.steps.append((combinator, match))
+            combinator = ' '
+
+    def __repr__(self):
+        return '<CSSSelector %r>' % self.selector
+
+    def _any(self, matches):
+        matches = list(matches)
+        def match(tag):
+            for m in matches:
+                if m(tag):
+                    return True
+            return False
+        return match
+
+    def _compile_compound(self, token):
+        """Compile a compound selector like "a.link[href]".
+
+        :return: The match function and the selector's (name, class,
+            id) index key.
+        """
+        tag_name = id = None
+        classes = []
+        checks = []
+        pos = 0
+        m = self.tag_name_re.match(token)
+        if m is not None:
+            pos = m.end()
+            if m.group() != '*':
+                tag_name = m.group()
+
+        while pos < len(token):
+            m = self.simple_selector_re.match(token, pos)
+            if m is None:
+                raise ValueError(
+                    'Unsupported or invalid CSS selector: "%s"' % token)
+            pos = m.end()
+            if m.group('id') is not None:
+                checks.append(self._id_checker(m.group('id')))
+                id = m.group('id')
+            elif m.group('class') is not None:
+                classes.append(m.group('class'))
+            elif m.group('attribute') is not None:
+                checks.append(PageElement._attribute_checker(
+                    m.group('operator'), m.group('attribute'),
+                    m.group('value')))
+            else:
+                checks.append(self._pseudo_checker(
+                    m.group('pseudo'), m.group('argument')))
+
+        if classes:
+            checks.insert(0, self._classes_checker(set(classes)))
+
+        def match(tag):
+            if tag_name is not None and tag.name != tag_name:
+                return False
+            for check in checks:
+                if not check(tag):
+                    return False
+            return True
+        return match, (tag_name, classes and classes[0] or None, id)
+
+    def _id_checker(self, tag_id):
+        def id_matches(tag):
+            return tag.get('id', None) == tag_id
+        return id_matches
+
+    def _classes_checker(self, classes):
+        def classes_match(candidate):
+            return classes.issubset(candidate.get('class', []))
+        return classes_match
+
+    def _pseudo_checker(self, pseudo, argument):
+        """Create a function that checks a pseudo-class."""
+        if pseudo not in self.pseudo_classes:
+            raise NotImplementedError(
+                'Only the following pseudo-classes are implemented: %s.'
+                % ', '.join(self.pseudo_classes))
+        if pseudo.startswith('nth-'):
+            a, b = self._parse_nth(pseudo, argument)
+        elif argument is not None:
+            raise ValueError(
+                'The %s pseudo-class takes no argument.' % pseudo)
+        elif pseudo == 'empty':
+            def is_empty(tag):
+                for child in tag.contents:
+                    if isinstance(child, Tag) or (
+                        child and not isinstance(child, PreformattedString)):
+                        return False
+                return True
+            return is_empty
+        elif pseudo.startswith('only-'):
+            first = self._pseudo_checker(
+                pseudo.replace('only-', 'first-'), None)
+            last = self._pseudo_checker(
+                pseudo.replace('only-', 'last-'), None)
+            return lambda tag: first(tag) and last(tag)
+        else:
+            a, b = 0, 1
+
+        of_type = pseudo.endswith('-of-type')
+        if pseudo.startswith('last-') or pseudo.startswith('nth-last-'):
+            step = 'next_sibling'
+        else:
+            step = 'previous_sibling'
+
+        def nth(tag):
+            # Position of the tag among its siblings, starting at 1
+            position = 1
+            sibling = getattr(tag, step)
+            while sibling is not None:
+                if isinstance(sibling, Tag) and (
+                    not of_type or sibling.name == tag.name):
+                    position += 1
+                sibling = getattr(sibling, step)
+            # Is there an n >= 0 such that a*n + b == position?
+            if a == 0:
+                return position == b
+            return (position - b) % a == 0 and (position - b) // a >= 0
+        return nth
+
+    def _parse_nth(self, pseudo, argument):
+        """Parse the argument of nth-child() and friends into (a, b)."""
+        argument = (argument or '').strip().lower()
+        if argument == 'odd':
+            return 2, 1
+        if argument == 'even':
+            return 2, 0
+        if argument.isdigit():
+            if int(argument) < 1:
+                raise ValueError(
+                    '%s pseudo-class value must be at least 1.' % pseudo)
+            return 0, int(argument)
+        m = self.nth_re.match(argument)
+        if m is None:
+            raise NotImplementedError(
+                'Only numbers, an+b, odd and even are supported as '
+                'arguments to the %s pseudo-class.' % pseudo)
+        a, b = m.groups()
+        if a in ('', '+'):
+            a = 1
+        elif a == '-':
+            a = -1
+        return int(a), int(b or 0)
+
+    def select(self, scope, limit=None, candidates=None):
+        """Find the tags that match below (or beside) a tag.
+
+        :param scope: The tag select() was called on.
+        :param limit: Stop after finding this many tags.
+        :param candidates: A function that returns the elements to
+            check, given the scope. Defaults to the elements the first
+            combinator can reach.
+        :return: A list of matching tags, in document order.
+        """
+        combinator = self.steps[0][0]
+        if combinator in ('~', '+'):
+            # The first compound selector matches siblings of scope,
+            # which may have descendants that match.
+            stop = scope.parent
+        else:
+            stop = scope
+        if candidates is not None:
+            candidates = candidates(scope)
+        else:
+            candidates = self._candidates(scope, combinator)
+
+        last = len(self.steps) - 1
+        match = self.steps[last][1]
+        results = []
+        for tag in candidates:
+            if (isinstance(tag, Tag) and match(tag)
+                and self._match_before(tag, last, scope, stop)):
+                results.append(tag)
+                if limit and len(results) >= limit:
+                    break
+        return results
+
+    def _candidates(self, scope, combinator):
+        if combinator in ('~', '+'):
+            return self._following(scope)
+        if len(self.steps) == 1 and combinator == '>':
+            return scope.children
+        candidates = scope._indexed_descendants(*self.index_key)
+        if candidates is None:
+            return scope.descendants
+        return candidates
+
+    def _following(self, tag):
+        """Yield the siblings that follow a tag, and their descendants."""
+        for sibling in tag.next_siblings:
+            yield sibling
+            if isinstance(sibling, Tag):
+                for descendant in sibling.descendants:
+                    yield descendant
+
+    def _previous_tag(self, tag):
+        sibling = tag.previous_sibling
+        while sibling is not None and not isinstance(sibling, Tag):
+            sibling = sibling.previous_sibling
+        return sibling
+
+    def _match_before(self, tag, i, scope, stop):
+        """Check the compound selectors before step i.
+
+        :param tag: A tag that matches step i.
+        :return: True if the combinator of step i relates the tag to
+            a tag that matches (and recursively, to the scope).
+        """
+        combinator = self.steps[i][0]
+        if i == 0:
+            # Relate the tag to the scope
+            if combinator == ' ':
+                return True
+            if combinator == '>':
+                return tag.parent is scope
+            if combinator == '+':
+                return self._previous_tag(tag) is scope
+            sibling = tag.previous_sibling
+            while sibling is not None:
+                if sibling is scope:
+                    return True
+                sibling = sibling.previous_sibling
+            return False
+
+        match = self.steps[i - 1][1]
+        if combinator == ' ':
+            ancestor = tag.parent
+            while ancestor is not None and ancestor is not stop:
+                if match(ancestor) and self._match_before(
+                        ancestor, i - 1, scope, stop):
+                    return True
+                ancestor = ancestor.parent
+            return False
+        if combinator == '>':
+            parent = tag.parent
+            return (parent is not None and parent is not stop
+                    and match(parent)
+                    and self._match_before(parent, i - 1, scope, stop))
+        if combinator == '+':
+            sibling = self._previous_tag(tag)
+            return (sibling is not None and match(sibling)
+                    and self._match_before(sibling, i - 1, scope, stop))
+        sibling = self._previous_tag(tag)
+        while sibling is not None:
+            if match(sibling) and self._match_before(
+                    sibling, i - 1, scope, stop):
+                return True
+            sibling = self._previous_tag(sibling)
+        return False
+
+
 class SoupStrainer(object):
     """Encapsulates a number of ways of matching a markup element (tag or
-    text)."""
+    text).
+
+    The criteria are compiled into matching functions when the
+    strainer is created, so changing name, attrs or text afterwards
+    has no effect.
+    """
 
     def __init__(self, name=None, attrs={}, text=None, **kwargs):
         self.name = self._normalize_search_value(name)
@@ -1546,6 +2057,168 @@ class SoupStrainer(object):
 
         self.attrs = normalized_attrs
         self.text = self._normalize_search_value(text)
+        self._compile()
+
+    def _compile(self):
+        """Turn the search criteria into functions that check them.
+
+        The type of each search value is looked at once, here, rather
+        than every time an element is checked.
+        """
+        if self.name:
+            self._name_matches = self._matcher(self.name)
+        else:
+            self._name_matches = None
+        self._attr_matches = [
+            (attr, self._matcher(match_against))
+            for attr, match_against in self.attrs.items()]
+        self._text_matches = self._matcher(self.text)
+
+        name_matches = self._name_matches
+        attr_matches = self._attr_matches
+        text_matches = self.text and self._text_matches
+
+        def match_tag(tag):
+            if name_matches is not None and not name_matches(tag):
+                return None
+            if attr_matches:
+                attrs = tag.attrs
+                for attr, matches in attr_matches:
+                    if not matches(attrs.get(attr)):
+                        return None
+            if text_matches and not text_matches(tag.string):
+                return None
+            return tag
+
+        if self.text and not self.name and not self.attrs:
+            # Don't bother with Tags if we're searching for text.
+            def search_element(element):
+                if isinstance(element, Tag):
+                    return None
+                if self._text_matches(element):
+                    return element
+                return None
+        elif self.name or self.attrs:
+            def search_element(element):
+                if isinstance(element, Tag):
+                    return match_tag(element)
+                return None
+        else:
+            def search_element(element):
+                if isinstance(element, Tag):
+                    return match_tag(element)
+                if self._text_matches(element):
+                    return element
+                return None
+        self._match_tag = match_tag
+        # Does what search() does for a single Tag or NavigableString
+        self._search_element = search_element
+
+    def _matcher(self, match_against):
+        """Compile a normalized search value into a function.
+
+        The function takes an attribute value, tag or string and
+        returns what _matches() would return for it and match_against.
+        """
+        match_one = self._scalar_matcher(match_against)
+
+        if isinstance(match_against, unicode) and ' ' in match_against:
+            # If they try to match "foo bar" on a multivalue
+            # attribute's value, only accept the literal value "foo bar"
+            words = whitespace_re.split(match_against)
+            def matches(markup):
+                if isinstance(markup, (list, tuple)):
+                    return words == markup
+                return match_one(markup)
+            return matches
+
+        # Values in a multi-valued attribute like 'class' match if any
+        # of them matches.
+        targets = self._target_set(match_against)
+        if targets is not None:
+            def matches(markup):
+                if isinstance(markup, (list, tuple)):
+                    for item in markup:
+                        if isinstance(item, unicode):
+                            if item in targets:
+                                return True
+                        elif matches(item):
+                            return True
+                    return False
+                return match_one(markup)
+        else:
+            def matches(markup):
+                if isinstance(markup, (list, tuple)):
+                    for item in markup:
+                        if matches(item):
+                            return True
+                    return False
+                return match_one(markup)
+        return matches
+
+    def _target_set(self, match_against):
+        """A frozenset of the strings a search value matches exactly, or
+        None if it doesn't match strings that way."""
+        if isinstance(match_against, unicode):
+            return frozenset([match_against])
+        if (isinstance(match_against, list)
+            and all(isinstance(v, unicode) for v in match_against)):
+            return frozenset(match_against)
+        return None
+
+    def _scalar_matcher(self, match_against):
+        """Compile what _matches() does for markup that isn't a list."""
+        if match_against is True:
+            # True matches any non-None value.
+            return lambda markup: markup is not None
+
+        if isinstance(match_against, collections.Callable):
+            return match_against
+
+        normalize = self._normalize_search_value
+        targets = self._target_set(match_against)
+        if isinstance(match_against, unicode):
+            # Exact string match
+            def matches(markup):
+                if not isinstance(markup, unicode):
+                    if isinstance(markup, Tag):
+                        markup = markup.name
+                    markup = normalize(markup)
+                    if markup is None:
+                        return not match_against
+                return markup == match_against
+        elif hasattr(match_against, 'match'):
+            # Regexp match
+            search = match_against.search
+            def matches(markup):
+                if not isinstance(markup, unicode):
+                    if isinstance(markup, Tag):
+                        markup = markup.name
+                    markup = normalize(markup)
+                    if markup is None:
+                        return False
+                return search(markup)
+        elif hasattr(match_against, '__iter__'):
+            # The markup must be an exact match against something
+            # in the iterable.
+            def matches(markup):
+                if isinstance(markup, unicode) and targets is not None:
+                    return markup in targets
+                if isinstance(markup, Tag):
+                    markup = markup.name
+                markup = normalize(markup)
+                if markup is None:
+                    return not match_against
+                return markup in match_against
+        else:
+            # Only None matches a value like None or False.
+            def matches(markup):
+                if isinstance(markup, Tag):
+                    markup = markup.name
+                if normalize(markup) is None:
+                    return not match_against
+                return None
+        return matches
 
     def _normalize_search_value(self, value):
         # Leave it alone if it's a Unicode string, a callable, a
@@ -1593,16 +2266,19 @@ class SoupStrainer(object):
             isinstance(self.name, collections.Callable)
             and not isinstance(markup_name, Tag))
 
+        if markup is not None:
+            return self._match_tag(markup)
+
         if ((not self.name)
             or call_function_with_tag_data
-            or (markup and self._matches(markup, self.name))
-            or (not markup and self._matches(markup_name, self.name))):
+            or (markup and self._name_matches(markup))
+            or (not markup and self._name_matches(markup_name))):
             if call_function_with_tag_data:
                 match = self.name(markup_name, markup_attrs)
             else:
                 match = True
                 markup_attr_map = None
-                for attr, match_against in list(self.attrs.items()):
+                for attr, matches in self._attr_matches:
                     if not markup_attr_map:
                         if hasattr(markup_attrs, 'get'):
                             markup_attr_map = markup_attrs
@@ -1611,7 +2287,7 @@ class SoupStrainer(object):
                             for k, v in markup_attrs:
                                 markup_attr_map[k] = v
                     attr_value = markup_attr_map.get(attr)
-                    if not self._matches(attr_value, match_against):
+                    if not matches(attr_value):
                         match = False
                         break
             if match:
@@ -1619,7 +2295,7 @@ class SoupStrainer(object):
                     found = markup
                 else:
                     found = markup_name
-        if found and self.text and not self._matches(found.string, self.text):
+        if found and self.text and not self._text_matches(found.string):
             found = None
         return found
     searchTag = search_tag
@@ -1639,11 +2315,11 @@ class SoupStrainer(object):
         # Don't bother with Tags if we're searching for text.
         elif isinstance(markup, Tag):
             if not self.text or self.name or self.attrs:
-                found = self.search_tag(markup)
+                found = self._match_tag(markup)
         # If it's text, make sure the text matches.
         elif isinstance(markup, NavigableString) or \
                  isinstance(markup, basestring):
-            if not self.name and not self.attrs and self._matches(markup, self.text):
+            if not self.name and not self.attrs and self._text_matches(markup):
                 found = markup
         else:
             raise Exception(
@@ -1,6 +1,8 @@
 """Tests to ensure that the html5lib tree builder generates good trees."""
 
+import gc
 import warnings
+import weakref
 
 try:
     from bs4.builder import HTML5TreeBuilder
@@ -25,17 +27,29 @@ class HTML5LibBuilderSmokeTest(SoupTest, HTML5TreeBuilderSmokeTest):
         return HTML5TreeBuilder()
 
     def test_soupstrainer(self):
-        # The html5lib tree builder does not support SoupStrainers.
         strainer = SoupStrainer("b")
-        markup = "<p>A <b>bold</b> statement.</p>"
+        markup = "<p>A <b>bold</b> statement.</p><b>Another</b>"
         with warnings.catch_warnings(record=True) as w:
             soup = self.soup(markup, parse_only=strainer)
+        self.assertEqual(soup.decode(), "<b>bold</b><b>Another</b>")
+        self.assertEqual(w, [])
+
+    def test_soupstrainer_keeps_whole_region(self):
+        strainer = SoupStrainer("div", "card")
+        markup = ('<div class="card"><b>1<p>2</b>3</p><!--c--></div>'
+                  '<p>Out<div class="card">In</div></p>')
+        soup = self.soup(markup, parse_only=strainer)
         self.assertEqual(
-            soup.decode(), self.document_for(markup))
+            soup.decode(),
+            '<div class="card"><b>1</b><p><b>2</b>3</p><!--c--></div>'
+            '<div class="card">In</div>')
 
-        self.assertTrue(
-            "the html5lib tree builder doesn't support parse_only" in
-            str(w[0].message))
+    def test_soupstrainer_text(self):
+        strainer = SoupStrainer(text=True)
+        markup = "<!DOCTYPE html><p>A <b>bold</b><!--c--> statement.</p>"
+        soup = self.soup(markup, parse_only=strainer)
+        self.assertEqual(
+            soup.decode(), "<!DOCTYPE html>\nA bold<!--c--> statement.")
 
     def test_correctly_nested_tables(self):
         """html5lib inserts <tbody> tags where other parsers don't."""
@@ -89,3 +103,44 @@ class HTML5LibBuilderSmokeTest(SoupTest, HTML5TreeBuilderSmokeTest):
         markup = b"""<?PITarget PIContent?>"""
         soup = self.soup(markup)
         assert str(soup).startswith("<!--?PITarget PIContent?-->")
+
+    def test_search_index(self):
+        """The index follows tags html5lib moves around."""
+        markup = ('<p class="a"><em>foo</p>\n<p>bar<a></a></em></p>'
+                  '<table><p class="a">fostered</p><tr><td class="a">'
+                  '</td></tr></table>')
+        soup = self.soup(markup, build_index=True)
+        plain = self.soup(markup)
+        for args, kwargs in [(['p'], {}), (['em'], {}), ([], {'class_': 'a'})]:
+            self.assertEqual(soup.find_all(*args, **kwargs),
+                             plain.find_all(*args, **kwargs))
+            self.assertEqual(soup.body.find_all(*args, **kwargs),
+                             plain.body.find_all(*args, **kwargs))
+        self.assertEqual(soup.select('.a'), plain.select('.a'))
+
+    def test_compact_tree(self):
+        """Strings html5lib moves around are merged in compact trees."""
+        markup = '<table>a<tr>b</tr>c</table>d'
+        soup = self.soup(markup, compact=True)
+        self.assertEqual(soup.decode(), self.soup(markup).decode())
+        self.assertEqual(list(soup.strings), [u'abcd'])
+
+    def test_weak_links_tree_freed(self):
+        """html5lib's parser doesn't keep a weak-linked tree alive."""
+        soup = self.soup('<p>a<b>b</b></p>', weak_links=True)
+        refs = [weakref.ref(soup), weakref.ref(soup.b)]
+        gc.disable()
+        try:
+            del soup
+            self.assertEqual([ref() for ref in refs], [None, None])
+        finally:
+            gc.enable()
+
+    def test_decode_entities_like_the_tokenizer(self):
+        """get_text decodes leftover entities with html5lib's tables."""
+        markup = ('<p>&amp;notit; &amp;amp &amp;#128; &amp;#xD800; '
+                  '&amp;bogus;</p>')
+        text = self.soup(markup).p.get_text(decode_entities=True)
+        self.assertEqual(text, u'\xacit; & \u20ac \ufffd &bogus;')
+        self.assertEqual(
+            text, self.soup(self.soup(markup).p.get_text()).get_text())
@@ -205,6 +205,15 @@ class TestEntitySubstitution(unittest.TestCase):
         text = 'Bob\'s "bar"'
         self.assertEqual(self.sub.substitute_html(text), text)
 
+    def test_decode_html_entities(self):
+        self.assertEqual(
+            self.sub.decode_html_entities(u"&lt;AT&amp;T&#33;&#x2603;&gt;"),
+            u"<AT&T!\N{SNOWMAN}>")
+
+    def test_decode_html_entities_leaves_unknown_entities_alone(self):
+        text = u"AT&T &bogus; &#xzz;"
+        self.assertEqual(self.sub.decode_html_entities(text), text)
+
 
 class TestEncodingConversion(SoupTest):
     # Test Beautiful Soup's ability to decode and encode from various
@@ -358,6 +367,41 @@ class TestUnicodeDammit(unittest.TestCase):
             self.assertEqual(
                 "euc-jp", dammit.original_encoding)
 
+    def test_declared_encoding_only_searched_in_prescan(self):
+        data = b'<html>' + b' ' * 1500 + b'<meta charset="euc-jp"></html>'
+        detector = EncodingDetector(data, is_html=True, prescan_bytes=1024)
+        list(detector.encodings)
+        self.assertEqual(None, detector.declared_encoding)
+
+        detector = EncodingDetector(data, is_html=True)
+        list(detector.encodings)
+        self.assertEqual("euc-jp", detector.declared_encoding)
+
+    def test_chardet_only_sees_prescan(self):
+        seen = []
+        chardet = bs4.dammit.chardet_dammit
+        try:
+            bs4.dammit.chardet_dammit = seen.append
+            data = b'<p>' + b'x' * 100
+            detector = EncodingDetector(data, prescan_bytes=10)
+            list(detector.encodings)
+            list(detector.encodings)
+        finally:
+            bs4.dammit.chardet_dammit = chardet
+        self.assertEqual([data[:10]], seen)
+
+    def test_trial_decode_in_chunks(self):
+        # A character split across the end of the first chunk is fine,
+        # a bad byte anywhere is not.
+        data = u"aa\N{SNOWMAN}aa".encode("utf-8")
+        dammit = UnicodeDammit(data)
+        dammit.TRIAL_CHUNK_BYTES = 3
+        self.assertEqual(u"aa\N{SNOWMAN}aa", dammit._to_unicode(data, "utf-8"))
+        self.assertRaises(
+            UnicodeDecodeError, dammit._to_unicode, b"aa\xff", "utf-8")
+        self.assertRaises(
+            UnicodeDecodeError, dammit._to_unicode, b"aaaa\xff", "utf-8")
+
     def test_last_ditch_entity_replacement(self):
         # This is a UTF-8 document that contains bytestrings
         # completely incompatible with UTF-8 (ie. encoded with some other
@@ -11,9 +11,11 @@ methods tested here.
 
 from pdb import set_trace
 import copy
+import gc
 import pickle
 import re
 import warnings
+import weakref
 from bs4 import BeautifulSoup
 from bs4.builder import (
     builder_registry,
@@ -22,11 +24,17 @@ from bs4.builder import (
 from bs4.element import (
     PY3K,
     CData,
+    CSSSelector,
     Comment,
+    CompactNavigableString,
+    CompactTag,
+    EMPTY_ATTRIBUTES,
     Doctype,
     NavigableString,
     SoupStrainer,
     Tag,
+    indexed_documents,
+    weak_linked,
 )
 from bs4.testing import (
     SoupTest,
@@ -423,6 +431,262 @@ class TestIndex(TreeTest):
         self.assertRaises(ValueError, tree.index, 1)
 
 
+class TestSearchIndex(TreeTest):
+    """Test searches of a BeautifulSoup object with build_index=True"""
+
+    markup = """<div id="main" class="page wide">
+                 <p class="intro">Intro</p>
+                 <section id="first">
+                  <p class="body">One <b class="body">bold</b></p>
+                  <p class="body intro" id="second">Two</p>
+                 </section>
+                 <ns:p>Prefixed</ns:p>
+                </div>
+                <p class="body">Three</p>"""
+
+    queries = [
+        (['p'], {}),
+        (['b'], {}),
+        (['ns:p'], {}),
+        ([], {'class_': 'body'}),
+        ([], {'class_': 'body intro'}),
+        ([], {'class_': 'missing'}),
+        (['p', 'intro'], {}),
+        (['p'], {'attrs': {'class': 'body', 'id': 'second'}}),
+        ([], {'id': 'first'}),
+        (['p'], {'id': 'first'}),
+        ([], {'text': 'Two'}),
+        (['p'], {'limit': 2}),
+        ([['p', 'b']], {}),
+    ]
+
+    def assertSameResults(self, indexed, plain):
+        pairs = [(indexed, plain)]
+        for name in ('div', 'section', 'b'):
+            if indexed.find(name) is not None:
+                pairs.append((indexed.find(name), plain.find(name)))
+        for tag, other in pairs:
+            for args, kwargs in self.queries:
+                self.assertEqual(tag.find_all(*args, **kwargs),
+                                 other.find_all(*args, **kwargs))
+            for selector in ('p', '.body', '#second', 'p.intro', 'div p',
+                             'section > .body', 'b.missing'):
+                self.assertEqual(tag.select(selector),
+                                 other.select(selector))
+
+    def test_same_results(self):
+        indexed = self.soup(self.markup, build_index=True)
+        self.assertNotEqual(indexed._index, None)
+        self.assertSameResults(indexed, self.soup(self.markup))
+
+    def test_results_in_document_order(self):
+        soup = self.soup(self.markup, build_index=True)
+        self.assertEqual([p.string for p in soup.find_all(class_='body')],
+                         [None, 'bold', 'Two', 'Three'])
+
+    def test_index_follows_modification(self):
+        soups = [self.soup(self.markup, build_index=True),
+                 self.soup(self.markup)]
+        for soup in soups:
+            soup.find(id='second')['id'] = 'first'
+            soup.b.extract()
+            new_tag = soup.new_tag('p')
+            new_tag['class'] = 'body'
+            soup.div.insert(0, new_tag)
+            del soup.div['id']
+        self.assertSameResults(*soups)
+
+    def test_no_index(self):
+        soup = self.soup(self.markup)
+        self.assertEqual(soup._index, None)
+        self.assertEqual(soup._indexed_descendants('p'), None)
+
+    def test_indexed_documents(self):
+        soup = self.soup(self.markup, build_index=True)
+        self.assertTrue(indexed_documents[id(soup)] is soup)
+        # Equal documents are told apart.
+        other = self.soup(self.markup, build_index=True)
+        self.assertTrue(indexed_documents[id(other)] is other)
+        self.assertFalse(id(self.soup(self.markup)) in indexed_documents)
+
+        # An unpickled copy is still kept up to date.
+        copy = pickle.loads(pickle.dumps(soup, 2))
+        self.assertTrue(indexed_documents[id(copy)] is copy)
+        del soup, other
+        gc.collect()
+        self.assertEqual(indexed_documents.keys(), [id(copy)])
+        copy.b['class'] = 'other'
+        self.assertEqual(copy.find_all(class_='other'), [copy.b])
+
+    def test_unindexed_tree_changes(self):
+        # Without indexed documents, changes don't look for an index.
+        gc.collect()
+        self.assertEqual(len(indexed_documents), 0)
+        soup = self.soup(self.markup)
+        soup._tree_version = 0
+        soup.b.extract()
+        soup.p['id'] = 'new'
+        self.assertEqual(soup._tree_version, 0)
+
+
+class TestCompactTree(TreeTest):
+    """Test a BeautifulSoup object built with compact=True"""
+
+    markup = ('<div id="main"><p class="a b">One <b>bold</b></p>'
+              '<!--note--><p>Two<br/></p></div>')
+
+    def test_same_tree(self):
+        soup = self.soup(self.markup, compact=True)
+        plain = self.soup(self.markup)
+        self.assertEqual(soup.decode(), plain.decode())
+        self.assertEqual(soup.get_text(), plain.get_text())
+        self.assertEqual(list(soup.strings), list(plain.strings))
+        self.assertEqual(soup.find_all('p', 'b'), plain.find_all('p', 'b'))
+        self.assertEqual(soup.select('div > p b'), plain.select('div > p b'))
+
+    def test_node_classes(self):
+        soup = self.soup(self.markup, compact=True)
+        self.assertTrue(isinstance(soup.p, CompactTag))
+        self.assertTrue(isinstance(soup.b.string, CompactNavigableString))
+        self.assertEqual(soup.find(text='note').__class__, Comment)
+        self.assertTrue(isinstance(soup.new_tag('a'), CompactTag))
+        self.assertTrue(
+            isinstance(soup.new_string('x'), CompactNavigableString))
+        self.assertEqual(soup.new_string('x', Comment).__class__, Comment)
+
+    def test_shared_empty_attributes(self):
+        soup = self.soup(self.markup, compact=True)
+        b, br = soup.b, soup.br
+        self.assertTrue(b._attrs is EMPTY_ATTRIBUTES)
+        self.assertTrue(br._attrs is EMPTY_ATTRIBUTES)
+        self.assertEqual(b.attrs, {})
+        self.assertRaises(TypeError, EMPTY_ATTRIBUTES.__setitem__, 'id', 'x')
+
+        b['id'] = 'x'
+        self.assertEqual(b.attrs, {'id': 'x'})
+        self.assertEqual(EMPTY_ATTRIBUTES, {})
+        self.assertTrue(br._attrs is EMPTY_ATTRIBUTES)
+        self.assertEqual(soup.find(id='x'), b)
+
+    def test_assign_to_empty_attributes(self):
+        for kwargs in ({}, {'weak_links': True}):
+            soup = self.soup(self.markup, compact=True, **kwargs)
+            tags = [soup.b, soup.new_tag('a')]
+            for tag in tags:
+                tag.attrs['href'] = 'x'
+                self.assertEqual(tag['href'], 'x')
+                attrs = tag.attrs
+                attrs.update(id='y')
+                self.assertEqual(attrs.setdefault('rel', 'z'), 'z')
+                self.assertTrue(tag.attrs is attrs)
+                self.assertEqual(
+                    tag.attrs, {'href': 'x', 'id': 'y', 'rel': 'z'})
+            self.assertTrue(soup.br._attrs is EMPTY_ATTRIBUTES)
+            self.assertEqual(EMPTY_ATTRIBUTES, {})
+            self.assertEqual(soup.find(href='x'), soup.b)
+            loaded = pickle.loads(pickle.dumps(soup.b, 2))
+            self.assertEqual(loaded.attrs, soup.b.attrs)
+
+    def test_no_instance_dictionaries(self):
+        soup = self.soup(self.markup, compact=True)
+        for node in soup.descendants:
+            if isinstance(node, (CompactTag, CompactNavigableString)):
+                self.assertEqual(node.__dict__, {})
+        # Other attributes can still be set
+        soup.b.custom = 1
+        self.assertEqual(soup.b.custom, 1)
+
+    def test_copy_and_pickle(self):
+        soup = self.soup(self.markup, compact=True)
+        for protocol in (0, 2):
+            loaded = pickle.loads(pickle.dumps(soup, protocol))
+            self.assertEqual(loaded.decode(), soup.decode())
+            self.assertTrue(isinstance(loaded.b, CompactTag))
+            self.assertTrue(loaded.b._attrs is EMPTY_ATTRIBUTES)
+        copied = copy.copy(soup.p)
+        self.assertEqual(copied, soup.p)
+        self.assertTrue(isinstance(copied.b, CompactTag))
+
+    def test_decompose(self):
+        soup = self.soup(self.markup, compact=True)
+        b = soup.b
+        string = b.string
+        b.decompose()
+        self.assertEqual(soup.decode(), self.soup(
+            '<div id="main"><p class="a b">One </p>'
+            '<!--note--><p>Two<br/></p></div>').decode())
+        self.assertEqual(string.parent, None)
+        self.assertEqual(b.contents, [])
+
+
+class TestTeardown(TreeTest):
+    """Test freeing trees without the garbage collector"""
+
+    markup = ('<div id="main"><p class="a b">One <b>bold</b></p>'
+              '<!--note--><p>Two<br/></p></div>')
+
+    def setUp(self):
+        super(TestTeardown, self).setUp()
+        gc.disable()
+
+    def tearDown(self):
+        gc.enable()
+
+    def element_refs(self, soup):
+        return [weakref.ref(soup)] + [
+            weakref.ref(element) for element in soup.descendants]
+
+    def assertFreed(self, refs):
+        self.assertEqual([ref() for ref in refs if ref() is not None], [])
+
+    def test_decompose_soup(self):
+        for kwargs in ({}, {'compact': True}):
+            soup = self.soup(self.markup, **kwargs)
+            refs = self.element_refs(soup)
+            self.assertEqual(len(refs), 10)
+            soup.decompose()
+            del soup
+            self.assertFreed(refs)
+
+    def test_weak_links(self):
+        for kwargs in ({'weak_links': True},
+                       {'weak_links': True, 'compact': True}):
+            soup = self.soup(self.markup, **kwargs)
+            plain = self.soup(self.markup)
+            self.assertEqual(soup.decode(), plain.decode())
+            self.assertEqual(soup.get_text(), plain.get_text())
+            b = soup.b
+            self.assertEqual(b.parent.name, 'p')
+            self.assertEqual(b.previous_element, 'One ')
+            self.assertEqual(b.previous_sibling, 'One ')
+            self.assertEqual(list(soup.br.parents)[-1], soup)
+
+            self.assertTrue(isinstance(soup.find(text='note'), Comment))
+            self.assertTrue(type(soup.new_tag('a')) in (
+                weak_linked(Tag), weak_linked(CompactTag)))
+            loaded = pickle.loads(pickle.dumps(soup, 2))
+            self.assertEqual(loaded.decode(), soup.decode())
+            self.assertEqual(loaded.b.parent, loaded.p)
+
+            refs = self.element_refs(soup)
+            del soup, loaded, b
+            self.assertFreed(refs)
+
+    def test_weak_links_keep_nothing_alive(self):
+        soup = self.soup(self.markup, weak_links=True)
+        b = soup.b
+        del soup
+        self.assertEqual(b.parent, None)
+        self.assertEqual(b.previous_element, None)
+        self.assertEqual(b.string, 'bold')
+
+    def test_weak_linked(self):
+        cls = weak_linked(Tag)
+        self.assertEqual(cls.__name__, 'WeakLinkedTag')
+        self.assertTrue(issubclass(cls, Tag))
+        self.assertTrue(weak_linked(cls) is cls)
+
+
 class TestParentOperations(TreeTest):
     """Test navigation and searching through an element's parents."""
 
@@ -1223,6 +1487,27 @@ class TestElementObjects(SoupTest):
         self.assertEqual(
             soup.get_text(types=None), "fooIGNOREbar")
 
+    def test_get_text_non_recursive(self):
+        soup = self.soup("<a>a<b>r</b><i><b>t</b> x</i><!--c--></a>")
+        self.assertEqual(soup.a.get_text(recursive=False), "ar")
+        self.assertEqual(
+            soup.a.get_text(types=None, recursive=False), "arc")
+
+    def test_get_text_collapse_whitespace(self):
+        soup = self.soup("<a> \n a <b>r\t\t</b>  t\n</a>")
+        self.assertEqual(
+            soup.a.get_text(collapse_whitespace=True), "a r t")
+        self.assertEqual(
+            soup.a.get_text(",", collapse_whitespace=True), "a ,r , t")
+
+    def test_get_text_decode_entities(self):
+        # The markup escapes the entity twice, so it survives parsing.
+        soup = self.soup("<a>Tom &amp;amp; Jerry &amp;#x2603; </a>")
+        self.assertEqual(soup.a.get_text(), u"Tom &amp; Jerry &#x2603; ")
+        self.assertEqual(
+            soup.a.get_text(decode_entities=True, collapse_whitespace=True),
+            u"Tom & Jerry \N{SNOWMAN}")
+
     def test_all_strings_ignores_comments(self):
         soup = self.soup("foo<!--IGNORE-->bar")
         self.assertEqual(['foo', 'bar'], list(soup.strings))
@@ -1975,5 +2260,74 @@ class TestSoupSelector(TreeTest):
     def test_multiple_select_nested(self):
         self.assertSelects('body > div > x, y > z', ['zida', 'zidb', 'zidab', 'zidac'])
 
+    def test_results_in_document_order(self):
+        self.assertEqual(
+            [el['id'] for el in self.soup.select('p ~ a, p')],
+            ['p1', 'pmulti', 'bob', 'me', 'lang-en-gb', 'lang-en-us',
+             'lang-fr'])
+
+    def test_compound_selector(self):
+        self.assertSelects('div#main.fancy', ['main'])
+        self.assertSelects('p.class1#pmulti[class~="class2"]', ['pmulti'])
+        self.assertSelects('div#inner.fancy', [])
+
+    def test_leading_combinator(self):
+        inner = self.soup.find(id='inner')
+        self.assertSelectsIDs(inner.select('> h2'), ['header2', 'header3'])
+        self.assertSelectsIDs(
+            inner.select('~ y > z'), ['zidb'])
+        self.assertSelectsIDs(inner.select('+ x'), ['xid'])
+
+    def test_child_pseudoclasses(self):
+        self.assertSelectMultiple(
+            ('x > z:first-child', ['zida']),
+            ('z:last-child', ['zidac', 'zidb']),
+            ('z:only-child', ['zidb']),
+            ('x z:nth-child(2)', ['zidab']),
+            ('x z:nth-child(odd)', ['zida', 'zidac']),
+            ('x z:nth-child(2n)', ['zidab']),
+            ('x z:nth-last-child(1)', ['zidac']),
+            ('x z:nth-child(-n+2)', ['zida', 'zidab']),
+        )
+
+    def test_type_pseudoclasses(self):
+        self.assertSelectMultiple(
+            ('#inner > h2:first-of-type', ['header2']),
+            ('#inner > a:last-of-type', ['me']),
+            ('#inner > h1:only-of-type', ['header1']),
+            ('#inner > p:nth-last-of-type(1)', ['pmulti']),
+        )
+
+    def test_empty_pseudoclass(self):
+        els = self.soup.select('span:empty')
+        self.assertEqual(len(els), 1)
+        self.assertEqual(els[0]['class'], ['span3'])
+        self.assertSelects('x:empty', [])
+
+    def test_pseudoclass_without_tag_name(self):
+        self.assertSelects('#xid > :nth-child(3)', ['zidac'])
+
+    def test_invalid_pseudoclass_argument(self):
+        self.assertRaises(
+            ValueError, self.soup.select, 'p:first-child(1)')
+
+    def test_compiled_selector_is_cached(self):
+        selector = CSSSelector.compile('div > p.onep')
+        self.assertTrue(CSSSelector.compile('div > p.onep') is selector)
+        self.assertRaises(ValueError, CSSSelector.compile, 'div >')
+
+    def test_selector_cache_keeps_recently_used(self):
+        first = CSSSelector.compile('p.first')
+        second = CSSSelector.compile('p.second')
+        for i in range(CSSSelector.MAX_CACHE - 2):
+            CSSSelector.compile('p.filler%d' % i)
+        # The cache is full. Using 'p.first' makes 'p.second' the
+        # least recently used selector, so it goes first.
+        self.assertTrue(CSSSelector.compile('p.first') is first)
+        CSSSelector.compile('p.new')
+        self.assertEqual(len(CSSSelector._cache), CSSSelector.MAX_CACHE)
+        self.assertTrue(CSSSelector.compile('p.first') is first)
+        self.assertFalse(CSSSelector.compile('p.second') is second)
+
 
 
@@ -10,7 +10,7 @@ import sys
 import re
 
 
-__all__ = ['docopt']
+__all__ = ['docopt', 'compile_doc']
 __version__ = '0.6.2'
 
 
@@ -490,7 +490,8 @@ class Dict(dict):
         return '{%s}' % ',\n '.join('%r: %r' % i for i in sorted(self.items()))
 
 
-def docopt(doc, argv=None, help=True, version=None, options_first=False):
+def docopt(doc, argv=None, help=True, version=None, options_first=False,
+           cache_dir=None):
     """Parse `argv` based on command-line interface described in `doc`.
 
     `docopt` creates your command-line interface based on its
@@ -514,6 +515,8 @@ def docopt(doc, argv=None, help=True, version=None, options_first=False):
     options_first : bool (default: False)
         Set to True to require options preceed positional arguments,
         i.e. to forbid options and positional arguments intermix.
+    cache_dir : str, optional
+        Directory to cache the compiled `doc` in (see `compile_doc`).
 
     Returns
     -------
@@ -555,25 +558,157 @@ def docopt(doc, argv=None, help=True, version=None, options_first=False):
     """
     if argv is None:
         argv = sys.argv[1:]
-    DocoptExit.usage = printable_usage(doc)
-    options = parse_defaults(doc)
-    pattern = parse_pattern(formal_usage(DocoptExit.usage), options)
-    # [default] syntax for argument is disabled
-    #for a in pattern.flat(Argument):
-    #    same_name = [d for d in arguments if d.name == a.name]
-    #    if same_name:
-    #        a.value = same_name[0].value
-    argv = parse_argv(TokenStream(argv, DocoptExit), list(options),
-                      options_first)
-    pattern_options = set(pattern.flat(Option))
-    for ao in pattern.flat(AnyOptions):
-        doc_options = parse_defaults(doc)
-        ao.children = list(set(doc_options) - pattern_options)
-        #if any_options:
-        #    ao.children += [Option(o.short, o.long, o.argcount)
-        #                    for o in argv if type(o) is Option]
-    extras(help, version, argv, doc)
-    matched, left, collected = pattern.fix().match(argv)
-    if matched and left == []:  # better error message if left?
-        return Dict((a.name, a.value) for a in (pattern.flat() + collected))
-    raise DocoptExit()
+    grammar = compile_doc(doc, cache_dir)
+    return grammar.match(argv, help, version, options_first)
+
+
+class Grammar(object):
+
+    """Usage `doc` compiled once, to be matched against any `argv`.
+
+    Instances can be pickled. If the usage only consists of commands
+    followed by positional arguments (like `prog add <name> [<n>]`),
+    `argv`s without options are matched without the generic
+    backtracking matcher.
+
+    """
+
+    def __init__(self, doc):
+        self.doc = doc
+        self.usage = printable_usage(doc)
+        self.options = parse_defaults(doc)
+        pattern = parse_pattern(formal_usage(self.usage), self.options)
+        # [default] syntax for argument is disabled
+        #for a in pattern.flat(Argument):
+        #    same_name = [d for d in arguments if d.name == a.name]
+        #    if same_name:
+        #        a.value = same_name[0].value
+        pattern_options = set(pattern.flat(Option))
+        for ao in pattern.flat(AnyOptions):
+            doc_options = parse_defaults(doc)
+            ao.children = list(set(doc_options) - pattern_options)
+            #if any_options:
+            #    ao.children += [Option(o.short, o.long, o.argcount)
+            #                    for o in argv if type(o) is Option]
+        self.pattern = pattern.fix()
+        self.commands = flat_commands(self.pattern)
+
+    def match(self, argv, help=True, version=None, options_first=False):
+        """Return arguments parsed from `argv` (see `docopt`)."""
+        DocoptExit.usage = self.usage
+        if self.commands is not None:
+            args = self.match_flat(argv)
+            if args is not None:
+                return args
+        argv = parse_argv(TokenStream(argv, DocoptExit), list(self.options),
+                          options_first)
+        extras(help, version, argv, self.doc)
+        matched, left, collected = self.pattern.match(argv)
+        if matched and left == []:  # better error message if left?
+            return result(self.pattern.flat() + collected)
+        raise DocoptExit()
+
+    def match_flat(self, argv):
+        """Match `argv` against flat grammar or return None."""
+        if not argv or [a for a in argv if a.startswith('-')]:
+            return None
+        command, argv = argv[0], argv[1:]
+        for required, optional in self.commands.get(command, ()):
+            if len(required) <= len(argv) <= len(required) + len(optional):
+                args = result(self.pattern.flat())
+                args[command] = True
+                args.update(zip(required + optional, argv))
+                return args
+        return None
+
+
+def result(leaves):
+    """Return `Dict` of names and (copied) values of pattern `leaves`."""
+    return Dict((a.name, list(a.value) if type(a.value) is list else a.value)
+                for a in leaves)
+
+
+def flat_commands(pattern):
+    """Return commands of flat usage `pattern` or None if it isn't flat.
+
+    Flat usage lines are a command followed by required, then optional,
+    positional arguments. Lines only containing options are ignored.
+    The return value maps each command to a list of `(required,
+    optional)` argument names, one for each of its usage lines.
+
+    """
+    lines = pattern.children
+    if len(lines) == 1 and type(lines[0]) is Either:
+        lines = lines[0].children
+    commands = {}
+    for line in lines:
+        if not line.flat(Command, Argument):
+            continue  # only reachable with options
+        seq = [line]
+        while [p for p in seq if type(p) is Required]:
+            seq = sum([p.children if type(p) is Required else [p]
+                       for p in seq], [])
+        if type(seq[0]) is not Command:
+            return None
+        required, optional = [], []
+        for p in seq[1:]:
+            if type(p) is Argument and not optional:
+                required.append(p.name)
+            elif (type(p) is Optional and
+                  not [c for c in p.children if type(c) is not Argument]):
+                optional.extend(c.name for c in p.children)
+            else:
+                return None
+        if len(set(required + optional)) < len(required + optional):
+            return None  # repeating argument
+        commands.setdefault(seq[0].name, []).append((required, optional))
+    return commands
+
+
+# Grammars compiled by this process
+_grammars = {}
+
+
+def compile_doc(doc, cache_dir=None):
+    """Return `Grammar` for usage `doc`.
+
+    Grammars are cached in memory and, if `cache_dir` is given, pickled
+    to a file there named after the CRC32 of `doc`, so the usage isn't
+    parsed again on the next run.
+
+    """
+    if doc in _grammars:
+        return _grammars[doc]
+    if cache_dir is None:
+        grammar = _grammars[doc] = Grammar(doc)
+        return grammar
+
+    # Not hashlib: it takes longer to import than parsing most docs
+    import binascii
+    import os
+    try:
+        import cPickle as pickle
+    except ImportError:  # Python 3
+        import pickle
+    data = doc if isinstance(doc, bytes) else doc.encode('utf-8')
+    path = os.path.join(cache_dir, 'docopt-%s-%08x.pickle' % (
+        __version__, binascii.crc32(data) & 0xffffffff))
+    try:
+        with open(path, 'rb') as fp:
+            grammar = pickle.load(fp)
+        if grammar.doc != doc:  # CRC collision
+            raise ValueError(path)
+    except Exception:  # missing, corrupt or different doc
+        grammar = Grammar(doc)
+        temp_path = '%s.%d' % (path, os.getpid())
+        try:
+            with open(temp_path, 'wb') as fp:
+                pickle.dump(grammar, fp, protocol=-1)
+            os.rename(temp_path, path)
+        except (IOError, OSError):  # unwritable cache is just slower
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+    _grammars[doc] = grammar
+    return grammar
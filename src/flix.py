@@ -29,18 +29,18 @@ Options:
 
 from __future__ import print_function, unicode_literals, absolute_import
 
-import hashlib
-import htmlentitydefs
+import json
+import os
 import re
-import subprocess
 import sys
 import time
-import urllib
 
-from bs4 import BeautifulSoup as BS
-from bs4 import Tag
+# Most runs only show cached results or settings, so slow-loading
+# modules (bs4, html5lib, `workflow.web`, `subprocess` etc.) are
+# imported where they're needed, not here
 from docopt import docopt
-from workflow import Workflow, web
+from workflow import Workflow
+from workflow.workflow import AcquisitionError, LockFile, atomic_writer
 
 # USER_AGENT = ('Mozilla/5.0 (Windows NT 6.1) AppleWebKit/537.36 '
 #               '(KHTML, like Gecko) Chrome/41.0.2228.0 Safari/537.36')
@@ -98,35 +98,13 @@ UPDATE_SETTINGS = {
     'github_slug': 'deanishe/alfred-flixsearch'
 }
 
-log = None
-
-
-def unescape(text):
-    """Replace HTML entities with Unicode characters.
+# How long to cache search results for (in seconds)
+CACHE_MAX_AGE = 3600
+# How long to wait for another process that is fetching the same
+# search results before fetching them ourselves (in seconds)
+FETCH_WAIT = 10
 
-    From: http://effbot.org/zone/re-sub.htm#unescape-html
-    """
-
-    def fixup(m):
-        text = m.group(0)
-        if text[:2] == "&#":
-            # character reference
-            try:
-                if text[:3] == "&#x":
-                    return unichr(int(text[3:-1], 16))
-                else:
-                    return unichr(int(text[2:-1]))
-            except ValueError:
-                pass
-        else:
-            # named entity
-            try:
-                text = unichr(htmlentitydefs.name2codepoint[text[1:-1]])
-            except KeyError:
-                pass
-        return text  # leave as is
-
-    return re.sub("&#?\w+;", fixup, text)
+log = None
 
 
 def title_from_url(url):
@@ -145,40 +123,14 @@ def title_from_url(url):
     return s
 
 
-def flatten(elem, recursive=False):
-    """Return the string contents of partial BS elem tree.
-
-    :param elem: BeautifulSoup ``Tag`` or ``NavigableString``
-    :param recursive: Whether to flatten children or entire subtree
-    :returns: Flattened Unicode text contained in subtree
-
-    """
-
-    content = []
-
-    if recursive:
-        elems = elem.descendants
-    else:
-        elems = elem.contents
-
-    for e in elems:
-        # If processing recursively, a NavigableString for the
-        # tag text will also be encountered
-        if isinstance(e, Tag) and recursive:
-            continue
-        if hasattr(e, 'string') and e.string is not None:
-            # log.debug('[%s] : %s', e.__class__.__name__, e.string)
-            content.append(e.string)
-
-    return unescape(re.sub(r'\s+', ' ', ''.join(content))).strip()
-
-
 def retrieve_flixsearch_url(query):
     """Get HTML response from flixsearch.io.
 
     Returns Unicode HTML.
 
     """
+    import urllib
+    from workflow import web
 
     start = time.time()
     url = 'https://flixsearch.io/search/{0}'.format(
@@ -201,11 +153,14 @@ def retrieve_flixsearch_url(query):
 
 def parse_flixsearch_html(html):
     """Parse HTML and return search results."""
+    from bs4 import BeautifulSoup as BS, SoupStrainer
 
     start = time.time()
     results = []
 
-    soup = BS(html, b'html5lib')
+    # Only build the result cards
+    soup = BS(html, b'html5lib', parse_only=SoupStrainer('div', 'card'),
+              build_index=True, compact=True)
     elems = soup.find_all('div', 'card')
     log.debug('%d `card` elems found', len(elems))
 
@@ -237,7 +192,9 @@ def parse_flixsearch_html(html):
         # Film/show title
         title_elem = img_box.find('span', 'card-title')
         if title_elem:
-            title = flatten(title_elem)
+            title = title_elem.get_text(types=None, recursive=False,
+                                        collapse_whitespace=True,
+                                        decode_entities=True)
         else:
             # Try to extract from URL
             title = title_from_url(url)
@@ -296,17 +253,31 @@ def parse_flixsearch_html(html):
                             # genres=genres,
                             countries=countries))
 
+    # Free the tree now instead of leaving its reference cycles to the
+    # garbage collector
+    soup.decompose()
+
     duration = time.time() - start
     log.debug('HTML parsed in %0.3f seconds', duration)
 
     return results
 
 
+def results_cache_key(query):
+    """Return name of cache search results for ``query`` are stored in."""
+    import hashlib
+    return 'results-' + hashlib.md5(query.encode('utf-8')).hexdigest()
+
+
 def flixsearch(query):
     """Retrieve results from flixsearch.io.
 
     Cache results for an hour.
 
+    Alfred may run several instances of the workflow for the same
+    query at once. Only one of them fetches the results: the others
+    wait for it to finish and then read the results from the cache.
+
     """
 
     def _wrapper():
@@ -315,8 +286,23 @@ def flixsearch(query):
         results = parse_flixsearch_html(html)
         return results
 
-    cache_key = 'results-' + hashlib.md5(query.encode('utf-8')).hexdigest()
-    results = wf.cached_data(cache_key, _wrapper, max_age=3600)
+    cache_key = results_cache_key(query)
+
+    if wf.cached_data_fresh(cache_key, CACHE_MAX_AGE):
+        return wf.cached_data(cache_key, max_age=0)
+
+    lock = LockFile(wf.cachefile(cache_key), timeout=FETCH_WAIT)
+    try:
+        lock.acquire()
+    except AcquisitionError:
+        log.warning('Timed out waiting for other search for `%s`', query)
+        return wf.cached_data(cache_key, _wrapper, max_age=CACHE_MAX_AGE)
+
+    try:
+        # Cache may have been updated while we were waiting for the lock
+        results = wf.cached_data(cache_key, _wrapper, max_age=CACHE_MAX_AGE)
+    finally:
+        lock.release()
 
     return results
 
@@ -333,7 +319,7 @@ class FlixSearch(object):
         """Run workflow. Call appropriate method based on CLI args."""
 
         self.wf = wf
-        args = docopt(__doc__, argv=wf.args)
+        args = docopt(__doc__, argv=wf.args, cache_dir=wf.cachedir)
         # log.debug('args : %r', args)
 
         if args.get('search'):
@@ -362,6 +348,18 @@ class FlixSearch(object):
             self.wf.send_feedback()
             return 0
 
+        # Alfred runs the search on every keystroke, so re-send the
+        # feedback for the same query if nothing has changed
+        cache_key = results_cache_key(query)
+        feedback_key = self._feedback_key(cache_key)
+        if feedback_key:
+            feedback = self._cached_feedback(cache_key, feedback_key)
+            if feedback is not None:
+                log.debug('Using cached feedback for `%s`', query)
+                sys.stdout.write(feedback)
+                sys.stdout.flush()
+                return 0
+
         log.debug('Searching flixsearch.io for `%s` ...', query)
         results = flixsearch(query)
         log.debug('%d total results for `%s`', len(results), query)
@@ -373,8 +371,6 @@ class FlixSearch(object):
             self.wf.add_item('No results for "{0}"'.format(query),
                              'Try a different query',
                              icon=ICON_WARNING)
-            self.wf.send_feedback()
-            return 0
 
         for r in results:
             subtitles = {
@@ -392,6 +388,11 @@ class FlixSearch(object):
                              uid=r['title'])
 
         self.wf.send_feedback()
+
+        feedback_key = self._feedback_key(cache_key)
+        if feedback_key:
+            self._cache_feedback(cache_key, feedback_key,
+                                 self.wf.render_feedback())
         return 0
 
     def do_config(self, query):
@@ -548,6 +549,55 @@ class FlixSearch(object):
 
         return self._call_external_trigger('countries')
 
+    def _feedback_key(self, cache_key):
+        """Return key for feedback rendered from results in ``cache_key``.
+
+        The key changes when the cached results or the settings do.
+        Returns ``None`` if the cached results are missing or stale.
+
+        """
+
+        path = self.wf.cachefile('{0}.{1}'.format(cache_key,
+                                                  self.wf.cache_serializer))
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return None
+
+        if time.time() - mtime > CACHE_MAX_AGE:
+            return None
+
+        import hashlib
+        settings = json.dumps(self.wf.settings, sort_keys=True)
+        return hashlib.md5('{0}:{1!r}:{2}'.format(
+            cache_key, mtime, settings).encode('utf-8')).hexdigest()
+
+    def _feedback_path(self, cache_key):
+        """Return path of file feedback for ``cache_key`` is cached in."""
+        return self.wf.cachefile('feedback-{0}'.format(cache_key))
+
+    def _cached_feedback(self, cache_key, feedback_key):
+        """Return feedback cached for ``cache_key`` or ``None``.
+
+        The feedback file starts with the key it was cached under. If
+        that isn't ``feedback_key``, the cached feedback is outdated.
+
+        """
+
+        try:
+            with open(self._feedback_path(cache_key), 'rb') as file_obj:
+                if file_obj.readline().rstrip() != feedback_key:
+                    return None
+                return file_obj.read()
+        except IOError:
+            return None
+
+    def _cache_feedback(self, cache_key, feedback_key, feedback):
+        """Cache ``feedback`` for ``cache_key`` under ``feedback_key``."""
+        with atomic_writer(self._feedback_path(cache_key), 'wb') as file_obj:
+            file_obj.write(feedback_key.encode('utf-8') + b'\n')
+            file_obj.write(feedback)
+
     def _filter_for_countries(self, results):
         """Remove results that don't match user's configured countries."""
 
@@ -566,6 +616,7 @@ class FlixSearch(object):
         Call external trigger via AppleScript.
 
         """
+        import subprocess
 
         script = ('tell application "Alfred 2" to run trigger "{0}" '
                   'in workflow '
@@ -0,0 +1,120 @@
+"""Shared tables for decoding HTML character references.
+
+The tokenizer matches named entities one character at a time as it reads
+the input stream, while :func:`unescape` decodes every reference in a
+string that has already been read.  Both use the same precomputed tables,
+so they agree on which entity a name stands for.
+"""
+from __future__ import absolute_import, division, unicode_literals
+
+try:
+    chr = unichr # flake8: noqa
+except NameError:
+    pass
+
+import re
+
+from .constants import entities, replacementCharacters
+from .trie import Trie
+
+entitiesTrie = Trie(entities)
+
+
+def _buildPrefixTable():
+    """Map every prefix of every entity name to the longest entity name
+    that is itself a prefix of it (or None).
+
+    This is what the tokenizer's ``has_keys_with_prefix`` and
+    ``longest_prefix`` trie lookups return, computed once up front.
+    Each name's prefixes are added shortest first, so a prefix's parent
+    is always in the table by the time it's reached.
+    """
+    table = {"": None}
+    for name in entities:
+        for i in range(1, len(name) + 1):
+            prefix = name[:i]
+            if prefix in table:
+                continue
+            longest = table[name[:i - 1]]
+            if prefix in entities:
+                longest = prefix
+            table[prefix] = longest
+    return table
+
+
+entityPrefixes = _buildPrefixTable()
+
+# Complete references, "&amp;" and "&amp" alike, to their characters
+namedReferences = dict(("&" + name, value) for name, value in entities.items())
+
+# References decoded so far, starting with the named ones. Numeric and
+# partial references are added as they're seen, until there are too
+# many and they're forgotten.
+_decoded = dict(namedReferences)
+_decodedLimit = len(_decoded) + 10000
+
+# Anything that starts like a character reference. Named references are
+# matched greedily and trimmed back to the longest entity they start with.
+referenceRE = re.compile("(&(?:#[xX][0-9a-fA-F]+;?|#[0-9]+;?|"
+                         "[a-zA-Z][a-zA-Z0-9]*;?))")
+
+
+def codepointToCharacter(charAsInt):
+    """Return the character a numeric reference to ``charAsInt`` stands for.
+
+    This makes the same replacements as the tokenizer, without reporting
+    parse errors.
+    """
+    if charAsInt in replacementCharacters:
+        return replacementCharacters[charAsInt]
+    if (0xD800 <= charAsInt <= 0xDFFF) or charAsInt > 0x10FFFF:
+        return "\uFFFD"
+    try:
+        return chr(charAsInt)
+    except ValueError:
+        # UCS-2 builds can only make characters in the BMP
+        v = charAsInt - 0x10000
+        return chr(0xD800 | (v >> 10)) + chr(0xDC00 | (v & 0x3FF))
+
+
+def _decodeReference(reference):
+    """Decode a reference that isn't a complete named reference."""
+    if reference[1] == "#":
+        digits = reference[2:].rstrip(";")
+        if digits[0] in "xX":
+            return codepointToCharacter(int(digits[1:], 16))
+        return codepointToCharacter(int(digits))
+
+    try:
+        name = entitiesTrie.longest_prefix(reference[1:])
+    except KeyError:
+        return reference
+    return entities[name] + reference[len(name) + 1:]
+
+
+def unescape(text):
+    """Replace the character references in ``text`` with the characters
+    they stand for, as the tokenizer does in text content.
+
+    Named entities without a semicolon are decoded when they are the
+    longest match, so "&notit;" becomes "\\xacit;".
+    """
+    if "&" not in text:
+        return text
+    parts = referenceRE.split(text)
+    if len(parts) == 1:
+        return text
+    # References are at the odd indices. Decode the ones that haven't
+    # been seen before, then look them all up at once.
+    global _decoded
+    decoded = _decoded
+    references = parts[1::2]
+    missing = set(references).difference(decoded)
+    if missing:
+        if len(decoded) + len(missing) > _decodedLimit:
+            decoded = _decoded = dict(namedReferences)
+            missing = set(references).difference(decoded)
+        for reference in missing:
+            decoded[reference] = _decodeReference(reference)
+    parts[1::2] = map(decoded.get, references)
+    return "".join(parts)
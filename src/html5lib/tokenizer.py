@@ -9,6 +9,7 @@ from collections import deque
 
 from .constants import spaceCharacters
 from .constants import entities
+from .entities import entityPrefixes
 from .constants import asciiLetters, asciiUpper2Lower
 from .constants import digits, hexDigits, EOF
 from .constants import tokenTypes, tagTokenTypes
@@ -16,10 +17,6 @@ from .constants import replacementCharacters
 
 from .inputstream import HTMLInputStream
 
-from .trie import Trie
-
-entitiesTrie = Trie(entities)
-
 
 class HTMLTokenizer(object):
     """ This class takes care of tokenizing HTML.
@@ -178,20 +175,20 @@ class HTMLTokenizer(object):
             #
             # Consume characters and compare to these to a substring of the
             # entity names in the list until the substring no longer matches.
-            while (charStack[-1] is not EOF):
-                if not entitiesTrie.has_keys_with_prefix("".join(charStack)):
-                    break
-                charStack.append(self.stream.char())
+            prefix = ""
+            char = charStack[0]
+            while char is not EOF and prefix + char in entityPrefixes:
+                prefix += char
+                char = self.stream.char()
+                charStack.append(char)
 
             # At this point we have a string that starts with some characters
             # that may match an entity
-            # Try to find the longest entity the string will match to take care
+            # Find the longest entity the string will match to take care
             # of &noti for instance.
-            try:
-                entityName = entitiesTrie.longest_prefix("".join(charStack[:-1]))
+            entityName = entityPrefixes[prefix]
+            if entityName is not None:
                 entityLength = len(entityName)
-            except KeyError:
-                entityName = None
 
             if entityName is not None:
                 if entityName[-1] != ";":
@@ -14,14 +14,47 @@ Run background tasks
 
 from __future__ import print_function, unicode_literals
 
+from contextlib import contextmanager
+import errno
+import fcntl
 import sys
 import os
+import select
+import socket
 import subprocess
 import pickle
-
-from workflow import Workflow
-
-__all__ = ['is_running', 'run_in_background']
+import time
+
+from workflow import Workflow, LockFile, atomic_writer
+
+__all__ = ['is_running', 'running_tasks', 'run_in_background',
+           'run_in_worker',
+           'worker_running', 'queue_job', 'job_status', 'job_result',
+           'PRIORITY_HIGH', 'PRIORITY_NORMAL', 'PRIORITY_LOW']
+
+#: Seconds a worker waits for new jobs before exiting
+WORKER_IDLE_TIMEOUT = 300
+#: Seconds to wait for a newly-started worker to start listening
+WORKER_START_TIMEOUT = 2
+#: Maximum number of queued jobs the worker runs at the same time
+WORKER_MAX_JOBS = 2
+#: Seconds to wait for :func:`is_running` probes to let go of a task's
+#: PID file before deciding the task is running
+SLOT_WAIT = 0.5
+
+#: Job priorities for :func:`queue_job`. Jobs with a lower number
+#: are run first.
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 10
+PRIORITY_LOW = 20
+
+# Name of worker's socket in cache directory
+_WORKER_SOCKET = 'worker.sock'
+# Name of file containing worker's PID in cache directory
+_WORKER_PID = 'worker.pid'
+
+# Interpreter to run this script with
+_PYTHON = sys.executable or '/usr/bin/python'
 
 _wf = None
 
@@ -59,18 +92,87 @@ def _pid_file(name):
     return wf().cachefile('{0}.pid'.format(name))
 
 
-def _process_exists(pid):
-    """Check if a process with PID ``pid`` exists
+def _queue_dir():
+    """Return path to job queue directory.
+
+    For each job ``name``, the directory contains some of:
+
+    - ``name.job``: the pending job
+    - ``name.running``: the running job
+    - ``name.output``: STDOUT of the running/last job
+    - ``name.result``: completion record of the last job
+
+    :returns: Path to queue directory
+    :rtype: ``unicode`` filepath
+
+    """
+
+    dirpath = wf().cachefile('jobs')
+    if not os.path.exists(dirpath):
+        try:
+            os.makedirs(dirpath)
+        except OSError as err:  # pragma: no cover
+            if err.errno != errno.EEXIST:
+                raise
+    return dirpath
+
+
+def _job_file(name, ext):
+    """Return path to queue file for job ``name`` with extension ``ext``"""
+
+    return os.path.join(_queue_dir(), '{0}.{1}'.format(name, ext))
+
+
+def _load(path):
+    """Load pickled data from ``path`` or return ``None``."""
+
+    try:
+        with open(path, 'rb') as file_obj:
+            return pickle.load(file_obj)
+    except (IOError, OSError, EOFError, pickle.UnpicklingError):
+        return None
+
+
+def _acquire_slot(name):
+    """Lock the PID file of task ``name`` if it isn't running.
+
+    The exclusive lock is held for the lifetime of the task: the
+    returned file is inherited by the task's processes, and the kernel
+    releases the lock when the last of them exits. Unlike a PID, the
+    lock can't be mistaken for another process's.
+
+    :func:`is_running` probes take a shared lock for an instant. If the
+    exclusive lock is refused but a shared one isn't, only probes are
+    in the way, so try again for up to :data:`SLOT_WAIT` seconds.
+
+    :param name: name of task
+    :type name: ``unicode``
+    :returns: open PID file or ``None`` if task is already running
+    :rtype: ``file`` or ``None``
 
-    :param pid: PID to check
-    :type pid: ``int``
-    :returns: ``True`` if process exists, else ``False``
-    :rtype: ``Boolean``
     """
 
+    slot = open(_pid_file(name), 'a')
+    deadline = time.time() + SLOT_WAIT
+    while True:
+        if _try_lock(slot, fcntl.LOCK_EX):
+            return slot
+        if not _try_lock(slot, fcntl.LOCK_SH) or time.time() > deadline:
+            # Task is running (or probes never let go)
+            slot.close()
+            return None
+        fcntl.flock(slot, fcntl.LOCK_UN)
+        time.sleep(0.001)
+
+
+def _try_lock(file_obj, operation):
+    """Lock ``file_obj`` without blocking. Return ``True`` on success."""
+
     try:
-        os.kill(pid, 0)
-    except OSError:  # not running
+        fcntl.flock(file_obj, operation | fcntl.LOCK_NB)
+    except IOError as err:
+        if err.errno not in (errno.EAGAIN, errno.EACCES):  # pragma: no cover
+            raise
         return False
     return True
 
@@ -85,20 +187,32 @@ def is_running(name):
     :rtype: ``Boolean``
 
     """
-    pidfile = _pid_file(name)
-    if not os.path.exists(pidfile):
+
+    if not os.path.exists(_pid_file(name)):
         return False
 
-    with open(pidfile, 'rb') as file_obj:
-        pid = int(file_obj.read().strip())
+    # A shared lock is only refused while the task holds its exclusive
+    # lock, so concurrent probes don't mistake each other for the task
+    with open(_pid_file(name), 'a') as file_obj:
+        return not _try_lock(file_obj, fcntl.LOCK_SH)
 
-    if _process_exists(pid):
-        return True
 
-    elif os.path.exists(pidfile):
-        os.unlink(pidfile)
+def running_tasks(names):
+    """Return the names of running tasks.
 
-    return False
+    .. versionadded:: 1.14
+
+    :param names: names of tasks to check
+    :type names: iterable of ``unicode``
+    :returns: names of tasks in ``names`` that are running
+    :rtype: ``set``
+
+    """
+
+    # Only look for PID files that exist
+    existing = set(os.listdir(wf().cachedir))
+    return set([name for name in names
+                if '{0}.pid'.format(name) in existing and is_running(name)])
 
 
 def _background(stdin='/dev/null', stdout='/dev/null',
@@ -149,6 +263,535 @@ def _background(stdin='/dev/null', stdout='/dev/null',
         os.dup2(se.fileno(), sys.stderr.fileno())
 
 
+@contextmanager
+def _in_cachedir():
+    """Change working directory to cache directory for duration.
+
+    Unix socket paths are limited to ~100 bytes, which the full path
+    to the cache directory can easily exceed, so the worker's socket
+    is always addressed relative to the cache directory.
+
+    """
+
+    cwd = os.getcwd()
+    os.chdir(wf().cachedir)
+    try:
+        yield
+    finally:
+        os.chdir(cwd)
+
+
+def _connect_worker():
+    """Return socket connected to worker or ``None``."""
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        with _in_cachedir():
+            sock.connect(_WORKER_SOCKET)
+    except socket.error:
+        sock.close()
+        return None
+    return sock
+
+
+def worker_running():
+    """Test whether the background worker is running.
+
+    .. versionadded:: 1.14
+
+    :returns: ``True`` if worker is accepting jobs, else ``False``
+    :rtype: ``Boolean``
+
+    """
+
+    sock = _connect_worker()
+    if sock is None:
+        return False
+    sock.close()
+    return True
+
+
+def _start_worker():
+    """Start worker and wait for it to start listening.
+
+    :returns: socket connected to worker or ``None``
+
+    """
+
+    cmd = [_PYTHON, __file__, '--worker']
+    wf().logger.debug('Starting worker ...')
+    # The worker lives for minutes. Don't let it keep the caller's
+    # files (and any locks on them) open all that time.
+    with open(os.devnull, 'r+b') as devnull:
+        retcode = subprocess.call(cmd, close_fds=True, stdin=devnull,
+                                  stdout=devnull, stderr=devnull)
+    if retcode:  # pragma: no cover
+        wf().logger.error('Failed to start worker')
+        return None
+
+    start = time.time()
+    while time.time() - start < WORKER_START_TIMEOUT:
+        sock = _connect_worker()
+        if sock is not None:
+            return sock
+        time.sleep(0.01)
+
+    wf().logger.error('Worker did not start')
+    return None
+
+
+def _send_job(sock, name, args, kwargs):
+    """Send job to worker over ``sock``. Return worker's reply."""
+
+    reply = []
+    try:
+        sock.sendall(pickle.dumps({'name': name, 'args': args,
+                                   'kwargs': kwargs}, protocol=-1))
+        sock.shutdown(socket.SHUT_WR)
+        while True:
+            data = sock.recv(1024)
+            if not data:
+                break
+            reply.append(data)
+    except socket.error as err:  # e.g. worker exited after connecting
+        wf().logger.debug('Error sending job to worker : {0}'.format(err))
+    finally:
+        sock.close()
+
+    return b''.join(reply)
+
+
+def run_in_worker(name, args, **kwargs):
+    """Run command in the background worker, starting it if necessary.
+
+    .. versionadded:: 1.14
+
+    Arguments are the same as for :func:`run_in_background`.
+
+    The worker is a long-lived process listening on a Unix socket in
+    the workflow's cache directory. Once it is running, starting a
+    task only costs a socket write instead of two Python interpreter
+    launches. The worker exits after :data:`WORKER_IDLE_TIMEOUT`
+    seconds without jobs.
+
+    While a worker is running, :func:`run_in_background` also sends
+    its tasks to the worker.
+
+    If the worker cannot be started, the task is run as by
+    :func:`run_in_background` instead.
+
+    :returns: exit code of ``background.py`` (i.e. 0) if the task was
+        started, ``None`` if a task is already running under ``name``
+    :rtype: ``int`` or ``None``
+
+    """
+
+    return _run_task(name, args, kwargs, start_worker=True)
+
+
+def _start_process(name, args, kwargs):
+    """Start task in a subprocess if it isn't already running.
+
+    :returns: ``(Popen, slot)`` tuple or ``None`` if task is running.
+        ``slot`` must be closed when the process has finished.
+    :rtype: ``tuple`` or ``None``
+
+    """
+
+    slot = _acquire_slot(name)
+    if slot is None:
+        return None
+
+    wf().logger.debug('Task `{0}` running'.format(name))
+    wf().logger.debug('cmd : {0!r}'.format(args))
+
+    # Don't let tasks inherit the worker's (or other tasks') locks, but
+    # do let them inherit their own, so they still count as running if
+    # the worker dies before they finish
+    kwargs = dict(kwargs)
+    if kwargs.get('close_fds', True):
+        kwargs['close_fds'] = False
+        kwargs['preexec_fn'] = _keep_fd(slot.fileno(),
+                                        kwargs.get('preexec_fn'))
+
+    try:
+        proc = subprocess.Popen(args, **kwargs)
+    except Exception:
+        slot.close()
+        raise
+
+    _write_pid(slot, proc.pid)
+    return proc, slot
+
+
+def _keep_fd(keep, preexec_fn=None):
+    """Return function that closes all inherited files but ``keep``.
+
+    The function is run in the child process before it calls ``exec``,
+    like ``close_fds``, which can't spare a file on Python 2. Files
+    marked close-on-exec (e.g. :class:`subprocess.Popen`'s own pipe)
+    are left for ``exec`` to close.
+
+    :param keep: file descriptor to leave open
+    :type keep: ``int``
+    :param preexec_fn: function to call afterwards
+
+    """
+
+    def close_fds():
+        try:
+            fds = [int(fd) for fd in os.listdir('/dev/fd')]
+        except OSError:  # pragma: no cover
+            fds = range(subprocess.MAXFD)
+        for fd in fds:
+            if fd < 3 or fd == keep:
+                continue
+            try:
+                if not fcntl.fcntl(fd, fcntl.F_GETFD) & fcntl.FD_CLOEXEC:
+                    os.close(fd)
+            except (IOError, OSError):  # Closed already
+                pass
+        if preexec_fn is not None:
+            preexec_fn()
+
+    return close_fds
+
+
+def _write_pid(slot, pid):
+    """Write ``pid`` to PID file ``slot`` for the benefit of humans."""
+
+    slot.truncate(0)
+    slot.write('{0}'.format(pid))
+    slot.flush()
+
+
+def _pending_jobs():
+    """Return pending jobs, highest priority first.
+
+    :returns: ``list`` of job :class:`dict`
+
+    """
+
+    jobs = []
+    for filename in os.listdir(_queue_dir()):
+        if filename.endswith('.job'):
+            job = _load(os.path.join(_queue_dir(), filename))
+            if job is not None:
+                jobs.append(job)
+
+    jobs.sort(key=lambda job: (job['priority'], job['queued']))
+    return jobs
+
+
+def _start_queued_jobs(running):
+    """Start pending jobs until `WORKER_MAX_JOBS` jobs are running.
+
+    :param running: worker's running tasks. Updated in place.
+    :type running: ``dict``
+
+    """
+
+    for job in _pending_jobs():
+        if len(running) >= WORKER_MAX_JOBS:
+            return
+
+        name = job['name']
+        if name in running or is_running(name):
+            # Leave job in queue. It will run when current one finishes
+            continue
+
+        # Claim job, so it can be re-queued while it's running
+        job_path = _job_file(name, 'job')
+        running_path = _job_file(name, 'running')
+        os.rename(job_path, running_path)
+        job = _load(running_path)
+        job['started'] = time.time()
+
+        kwargs = dict(job['kwargs'])
+        output = open(_job_file(name, 'output'), 'wb')
+        kwargs['stdout'] = output
+        try:
+            started = _start_process(name, job['args'], kwargs)
+        except Exception as err:
+            wf().logger.error('Could not start job `{0}` : {1}'.format(
+                              name, err))
+            started = None
+        finally:
+            output.close()
+
+        if started is None:  # Failed or started by another process
+            _unclaim_job(name)
+            continue
+
+        proc, slot = started
+        running[name] = (proc, slot, job)
+
+
+def _unclaim_job(name):
+    """Return claimed job ``name`` to the queue.
+
+    If the job was queued again in the meantime, the new job is kept.
+
+    """
+
+    running_path = _job_file(name, 'running')
+    try:
+        # Unlike `os.rename`, fails if the path exists
+        os.link(running_path, _job_file(name, 'job'))
+    except OSError as err:
+        if err.errno != errno.EEXIST:  # pragma: no cover
+            raise
+        wf().logger.debug('Job `{0}` was re-queued'.format(name))
+    os.unlink(running_path)
+
+
+def _finish_job(name, job, retcode):
+    """Write completion record for queued ``job``."""
+
+    with open(_job_file(name, 'output'), 'rb') as file_obj:
+        output = file_obj.read()
+
+    job.update({'retcode': retcode, 'output': output,
+                'finished': time.time()})
+    with atomic_writer(_job_file(name, 'result'), 'wb') as file_obj:
+        pickle.dump(job, file_obj, protocol=-1)
+
+    os.unlink(_job_file(name, 'running'))
+
+
+def _requeue_jobs():
+    """Put jobs left running by a crashed worker back in the queue."""
+
+    for filename in os.listdir(_queue_dir()):
+        if not filename.endswith('.running'):
+            continue
+
+        name = filename[:-len('.running')]
+        wf().logger.debug('Re-queueing job `{0}`'.format(name))
+        _unclaim_job(name)
+
+
+def _worker_loop(server):
+    """Accept and run jobs until idle for `WORKER_IDLE_TIMEOUT` seconds.
+
+    :param server: listening socket
+
+    """
+
+    log = wf().logger
+    # Running tasks: {name: (Popen, slot, job)}. `job` is `None` for
+    # tasks that were sent directly (not queued)
+    running = {}
+    last_active = time.time()
+
+    _requeue_jobs()
+
+    while True:
+        for name, (proc, slot, job) in running.items():
+            retcode = proc.poll()
+            if retcode is None:
+                continue
+            del running[name]
+            slot.close()
+            if job is not None:
+                _finish_job(name, job, retcode)
+            last_active = time.time()
+            if retcode:
+                log.error('Task `{0}` failed with [{1}]'.format(name, retcode))
+            else:
+                log.debug('Task `{0}` finished'.format(name))
+
+        _start_queued_jobs(running)
+
+        if not running and time.time() - last_active > WORKER_IDLE_TIMEOUT:
+            if _pending_jobs():  # Blocked by tasks run by other processes
+                last_active = time.time()
+            else:
+                log.debug('Worker idle. Exiting.')
+                return
+
+        # Check running tasks more often, so queued jobs start promptly
+        timeout = 0.1 if running else 1
+        try:
+            readable = select.select([server], [], [], timeout)[0]
+        except select.error as err:
+            if err.args[0] == errno.EINTR:
+                continue
+            raise
+
+        if not readable:
+            continue
+
+        conn = server.accept()[0]
+        try:
+            data = []
+            while True:
+                chunk = conn.recv(4096)
+                if not chunk:
+                    break
+                data.append(chunk)
+
+            last_active = time.time()
+
+            # Empty connection is a liveness check or a notification
+            # that a job was queued
+            if not data:
+                continue
+
+            job = pickle.loads(b''.join(data))
+            name = job['name']
+
+            started = None
+            if name not in running:
+                started = _start_process(name, job['args'], job['kwargs'])
+
+            if started is None:
+                log.info('Task `{0}` is already running'.format(name))
+                conn.sendall(b'running')
+                continue
+
+            proc, slot = started
+            running[name] = (proc, slot, None)
+            conn.sendall(b'started')
+
+        except Exception as err:
+            log.exception(err)
+        finally:
+            conn.close()
+
+
+def _worker_main():  # pragma: no cover
+    """Fork into background and run worker until it idles out."""
+
+    _background()
+    os.chdir(wf().cachedir)
+
+    # Only one worker may run at a time
+    lock = LockFile(wf().cachefile(_WORKER_SOCKET))
+    if not lock.acquire(blocking=False):
+        wf().logger.debug('Worker already running')
+        return
+
+    if os.path.exists(_WORKER_SOCKET):  # left by a crashed worker
+        os.unlink(_WORKER_SOCKET)
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(_WORKER_SOCKET)
+    server.listen(16)
+    with open(_WORKER_PID, 'w') as file_obj:
+        _write_pid(file_obj, os.getpid())
+    wf().logger.debug('Worker listening (PID {0})'.format(os.getpid()))
+
+    try:
+        _worker_loop(server)
+    finally:
+        # Stop accepting connections before anyone else can start
+        # a new worker
+        os.unlink(_WORKER_SOCKET)
+        os.unlink(_WORKER_PID)
+        server.close()
+        lock.release()
+
+
+def queue_job(name, args, priority=PRIORITY_NORMAL, **kwargs):
+    """Add a job to the background worker's queue.
+
+    .. versionadded:: 1.14
+
+    :param name: name of job
+    :type name: ``unicode``
+    :param args: arguments passed as first argument to
+        :class:`subprocess.Popen`
+    :param priority: one of :data:`PRIORITY_HIGH`,
+        :data:`PRIORITY_NORMAL` or :data:`PRIORITY_LOW`
+    :type priority: ``int``
+    :param \**kwargs: keyword arguments to :class:`subprocess.Popen`
+    :returns: ``True`` if job was queued, ``False`` if an identical job
+        is already pending
+    :rtype: ``Boolean``
+
+    The worker (see :func:`run_in_worker`) is started if necessary. It
+    runs queued jobs highest priority first, at most
+    :data:`WORKER_MAX_JOBS` at a time and only one job per ``name``.
+
+    A pending job replaces any pending job with the same name, unless
+    they are identical, in which case the pending job is kept
+    (at the higher of the two priorities).
+
+    When a job completes, its exit code and output (STDOUT) can be
+    retrieved with :func:`job_result`.
+
+    """
+
+    job_path = _job_file(name, 'job')
+    pending = _load(job_path)
+    if (pending is not None and pending['args'] == args and
+            pending['kwargs'] == kwargs):
+        if priority >= pending['priority']:
+            wf().logger.debug('Job `{0}` is already queued'.format(name))
+            return False
+        pending['priority'] = priority
+        job = pending
+    else:
+        job = {'name': name, 'args': args, 'kwargs': kwargs,
+               'priority': priority, 'queued': time.time()}
+
+    with atomic_writer(job_path, 'wb') as file_obj:
+        pickle.dump(job, file_obj, protocol=-1)
+
+    wf().logger.debug('Job `{0}` queued'.format(name))
+
+    # Notify worker
+    sock = _connect_worker() or _start_worker()
+    if sock is None:
+        wf().logger.error('Worker not running. Job `{0}` will run when '
+                          'it is started.'.format(name))
+    else:
+        sock.close()
+
+    return True
+
+
+def job_status(name):
+    """Return status of queued job ``name``.
+
+    .. versionadded:: 1.14
+
+    :param name: name of job
+    :type name: ``unicode``
+    :returns: ``'pending'``, ``'running'``, ``'done'`` or ``None``
+        if there is no such job
+    :rtype: ``unicode`` or ``None``
+
+    """
+
+    if os.path.exists(_job_file(name, 'job')):
+        return 'pending'
+    if os.path.exists(_job_file(name, 'running')):
+        return 'running'
+    if os.path.exists(_job_file(name, 'result')):
+        return 'done'
+    return None
+
+
+def job_result(name):
+    """Return completion record of the last run of queued job ``name``.
+
+    .. versionadded:: 1.14
+
+    :param name: name of job
+    :type name: ``unicode``
+    :returns: ``None`` if the job has never completed, otherwise a
+        :class:`dict` with the keys ``name``, ``args``, ``kwargs``,
+        ``priority``, ``queued``, ``started``, ``finished`` (timestamps),
+        ``retcode`` and ``output`` (the job's STDOUT)
+    :rtype: :class:`dict` or ``None``
+
+    """
+
+    return _load(_job_file(name, 'result'))
+
+
 def run_in_background(name, args, **kwargs):
     """Pickle arguments to cache file, then call this script again via
     :func:`subprocess.call`.
@@ -174,12 +817,61 @@ def run_in_background(name, args, **kwargs):
     If a process is already running under the same name, this function will
     return immediately and will not run the specified command.
 
+    .. versionchanged:: 1.14
+       If the background worker is running (see :func:`run_in_worker`),
+       the task is sent to it instead and 0 is returned.
+
+    """
+
+    return _run_task(name, args, kwargs)
+
+
+def _run_task(name, args, kwargs, start_worker=False):
+    """Send task to worker or run it in a new process.
+
+    :param start_worker: start the worker if it isn't running
+    :type start_worker: ``Boolean``
+    :returns: 0 if task was started, ``None`` if it's already running
+        or exit code of ``background.py``
+
     """
 
     if is_running(name):
         wf().logger.info('Task `{0}` is already running'.format(name))
         return
 
+    sock = _connect_worker()
+    if sock is None and start_worker:
+        sock = _start_worker()
+
+    if sock is not None:
+        reply = _send_job(sock, name, args, kwargs)
+        if reply == b'started':
+            wf().logger.debug('Task `{0}` sent to worker'.format(name))
+            return 0
+        elif reply == b'running':
+            wf().logger.info('Task `{0}` is already running'.format(name))
+            return
+        # Otherwise, the worker went away. Run task the old-fashioned way
+
+    return _spawn_task(name, args, kwargs)
+
+
+def _spawn_task(name, args, kwargs):
+    """Run task via ``background.py`` in a new process.
+
+    Arguments as for :func:`run_in_background`.
+
+    """
+
+    # Claim the task's slot before starting it, so concurrent callers
+    # can't both start the task. The lock is inherited by the
+    # background process and held till the task finishes.
+    slot = _acquire_slot(name)
+    if slot is None:
+        wf().logger.info('Task `{0}` is already running'.format(name))
+        return
+
     argcache = _arg_cache(name)
 
     # Cache arguments
@@ -188,9 +880,13 @@ def run_in_background(name, args, **kwargs):
         wf().logger.debug('Command arguments cached to `{0}`'.format(argcache))
 
     # Call this script
-    cmd = ['/usr/bin/python', __file__, name]
+    cmd = [_PYTHON, __file__, name]
     wf().logger.debug('Calling {0!r} ...'.format(cmd))
-    retcode = subprocess.call(cmd)
+    try:
+        retcode = subprocess.call(cmd)
+    finally:
+        # Close (but don't unlock) our copy of the lock
+        slot.close()
     if retcode:  # pragma: no cover
         wf().logger.error('Failed to call task in background')
     else:
@@ -206,6 +902,9 @@ def main(wf):  # pragma: no cover
     """
 
     name = wf.args[0]
+    if name == '--worker':
+        return _worker_main()
+
     argcache = _arg_cache(name)
     if not os.path.exists(argcache):
         wf.logger.critical('No arg cache found : {0!r}'.format(argcache))
@@ -222,14 +921,13 @@ def main(wf):  # pragma: no cover
     # Delete argument cache file
     os.unlink(argcache)
 
-    pidfile = _pid_file(name)
-
-    # Fork to background
+    # Fork to background. The lock on the PID file acquired by
+    # `run_in_background()` is inherited and held till this
+    # process exits.
     _background()
 
-    # Write PID to file
-    with open(pidfile, 'wb') as file_obj:
-        file_obj.write('{0}'.format(os.getpid()))
+    with open(_pid_file(name), 'r+') as file_obj:
+        _write_pid(file_obj, os.getpid())
 
     # Run the command
     try:
@@ -243,8 +941,6 @@ def main(wf):  # pragma: no cover
                             retcode, args))
 
     finally:
-        if os.path.exists(pidfile):
-            os.unlink(pidfile)
         wf.logger.debug('Task `{0}` finished'.format(name))
 
 
@@ -25,18 +25,25 @@ Self-updating from GitHub
 from __future__ import print_function, unicode_literals
 
 import os
-import tempfile
 import re
-import subprocess
 
 import workflow
-import web
+
+# `web`, `hashlib` and `subprocess` are imported where they're used:
+# `Workflow` imports this module for `Version` on every run
 
 # __all__ = []
 
 
 RELEASES_BASE = 'https://api.github.com/repos/{0}/releases'
 
+# Number of releases to fetch. Only the newest valid release is
+# of interest, so there's no need to fetch every release ever.
+RELEASES_PER_PAGE = 10
+
+# Size of chunks to download updates in (in bytes)
+DOWNLOAD_CHUNK_SIZE = 65536
+
 
 _wf = None
 
@@ -167,13 +174,39 @@ class Version(object):
         return "Version('{0}')".format(str(self))
 
 
-def download_workflow(url):
-    """Download workflow at ``url`` to a local temporary file
+def download_workflow(url, size=None, digest=None, progress=None):
+    """Download workflow at ``url`` to a local file
+
+    .. versionchanged:: 1.14
+       Stream to disk, resume interrupted downloads and verify file.
+
+    The file is streamed to a ``.part`` file in the workflow's cache
+    directory, named after ``url``. If a previous download of the same
+    URL was interrupted, only the missing data are requested (via an
+    HTTP ``Range`` header). The server's ``ETag`` or ``Last-Modified``
+    header is saved with the partial file and sent as ``If-Range``, so
+    a file that has changed on the server is downloaded again in full.
+    Partial downloads without either header aren't resumed.
+
+    The completed file is checked against ``size`` and ``digest`` (if
+    given) before being moved into place. If the check fails, the
+    file is deleted and a :class:`ValueError` is raised.
 
     :param url: URL to .alfredworkflow file in GitHub repo
+    :param size: expected size of file in bytes
+    :type size: ``int``
+    :param digest: expected checksum of file in the form
+        ``algorithm:hexdigest``, e.g. ``sha256:e3b0c4...``
+    :type digest: ``unicode``
+    :param progress: callable called with the number of bytes
+        downloaded so far and the total size (or ``None``) after
+        each chunk is written
+    :type progress: ``callable``
     :returns: path to downloaded file
 
     """
+    import hashlib
+    import web
 
     filename = url.split("/")[-1]
 
@@ -181,20 +214,96 @@ def download_workflow(url):
             not filename.endswith('.alfredworkflow')):
         raise ValueError('Attachment `{}` not a workflow'.format(filename))
 
-    local_path = os.path.join(tempfile.gettempdir(), filename)
+    local_path = wf().cachefile(filename)
+    # The filename is the same for every release
+    part_path = wf().cachefile('{0}.{1}.part'.format(
+        filename, hashlib.sha1(url.encode('utf-8')).hexdigest()))
+    validator_path = part_path + '.validator'
+
+    if digest:
+        algorithm, expected = digest.split(':', 1)
+        hasher = hashlib.new(algorithm)
+    else:
+        hasher = None
+
+    headers = {}
+    offset = 0
+    if os.path.exists(part_path) and os.path.exists(validator_path):
+        with open(validator_path, 'rb') as fileobj:
+            validator = fileobj.read()
+        offset = os.path.getsize(part_path)
+        headers['Range'] = 'bytes={0}-'.format(offset)
+        headers['If-Range'] = validator
 
     wf().logger.debug(
         'Downloading updated workflow from `{0}` to `{1}` ...'.format(
             url, local_path))
 
-    response = web.get(url)
-
-    with open(local_path, 'wb') as output:
-        output.write(response.content)
+    response = web.get(url, headers=headers)
+
+    if offset and response.status_code == 416:  # Already complete
+        wf().logger.debug('Download already complete')
+        response = None
+
+    elif offset and response.status_code == 206:
+        wf().logger.debug('Resuming download at {0} bytes'.format(offset))
+
+    else:
+        response.raise_for_status()
+        if offset:
+            wf().logger.debug('File changed. Restarting download')
+            offset = 0
+        _remove(part_path, validator_path)
+        validator = (response.headers.get('etag') or
+                     response.headers.get('last-modified'))
+        if validator:
+            with open(validator_path, 'wb') as fileobj:
+                fileobj.write(validator)
+
+    if hasher and offset:  # Hash data downloaded previously
+        with open(part_path, 'rb') as fileobj:
+            for chunk in iter(lambda: fileobj.read(DOWNLOAD_CHUNK_SIZE), b''):
+                hasher.update(chunk)
+
+    if response is not None:
+        mode = 'ab' if offset else 'wb'
+        downloaded = offset
+        with open(part_path, mode) as fileobj:
+            for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                fileobj.write(chunk)
+                if hasher:
+                    hasher.update(chunk)
+                downloaded += len(chunk)
+                if progress:
+                    progress(downloaded, size)
+
+    # Verify download
+    error = None
+    actual_size = os.path.getsize(part_path)
+    if size is not None and actual_size != size:
+        error = 'Size mismatch : expected {0} bytes, got {1}'.format(
+            size, actual_size)
+    elif hasher and hasher.hexdigest() != expected.lower():
+        error = 'Checksum mismatch : expected {0}, got {1}'.format(
+            expected, hasher.hexdigest())
+
+    if error:
+        _remove(part_path, validator_path)
+        raise ValueError('Invalid download `{0}` : {1}'.format(filename, error))
+
+    os.rename(part_path, local_path)
+    _remove(validator_path)
 
     return local_path
 
 
+def _remove(*paths):
+    """Delete files at ``paths`` that exist."""
+    for path in paths:
+        if os.path.exists(path):
+            os.unlink(path)
+
+
 def build_api_url(slug):
     """Generate releases URL from GitHub slug
 
@@ -209,12 +318,54 @@ def build_api_url(slug):
     return RELEASES_BASE.format(slug)
 
 
+def _validate_release(release):
+    """Return compact form of GitHub ``release`` or ``None`` if invalid.
+
+    :param release: release :class:`dict` from GitHub API
+    :returns: :class:`dict` with keys ``version``, ``download_url``,
+        ``size`` and ``digest`` (of the workflow file) or ``None``
+
+    """
+
+    version = release['tag_name']
+    assets = []
+    for asset in release.get('assets', []):
+        url = asset.get('browser_download_url')
+        if not url or not url.endswith('.alfredworkflow'):
+            continue
+        assets.append(asset)
+
+    # Validate release
+    if release['prerelease']:
+        wf().logger.warning(
+            'Invalid release {0} : pre-release detected'.format(version))
+        return None
+    if not assets:
+        wf().logger.warning(
+            'Invalid release {0} : No workflow file'.format(version))
+        return None
+    if len(assets) > 1:
+        wf().logger.warning(
+            'Invalid release {0} : multiple workflow files'.format(version))
+        return None
+
+    asset = assets[0]
+    wf().logger.debug('Release `{0}` : {1}'.format(
+                      version, asset['browser_download_url']))
+    return {'version': version,
+            'download_url': asset['browser_download_url'],
+            'size': asset.get('size'),
+            'digest': asset.get('digest')}
+
+
 def get_valid_releases(github_slug):
     """Return list of all valid releases
 
     :param github_slug: ``username/repo`` for workflow's GitHub repo
     :returns: list of dicts. Each :class:`dict` has the form
-        ``{'version': '1.1', 'download_url': 'http://github.com/...'}``
+        ``{'version': '1.1', 'download_url': 'http://github.com/...',
+        'size': 1234, 'digest': 'sha256:...'}``. ``size`` and ``digest``
+        are ``None`` if GitHub doesn't provide them.
 
 
     A valid release is one that contains one ``.alfredworkflow`` file.
@@ -222,46 +373,48 @@ def get_valid_releases(github_slug):
     If the GitHub version (i.e. tag) is of the form ``v1.1``, the leading
     ``v`` will be stripped.
 
+    Only the newest :data:`RELEASES_PER_PAGE` releases are retrieved.
+    The valid releases are cached along with the response's ETag, which
+    is sent with the next request. If the releases haven't changed,
+    GitHub replies with an empty ``304 Not Modified`` and the cached
+    releases are used.
+
     """
+    import web
 
     api_url = build_api_url(github_slug)
-    releases = []
+    slug = github_slug.replace('/', '-')
+    cache_key = 'gh-releases-{0}'.format(slug)
 
-    wf().logger.debug('Retrieving releases list from `{0}` ...'.format(
-                       api_url))
+    # Caches written by older versions contain the raw API response
+    cached = wf().cached_data(cache_key, max_age=0)
+    if not isinstance(cached, dict):
+        cached = None
 
-    def retrieve_releases():
-        wf().logger.info(
-            'Retrieving releases for `{0}` ...'.format(github_slug))
-        return web.get(api_url).json()
+    headers = {}
+    if cached and cached.get('etag'):
+        headers['If-None-Match'] = cached['etag']
 
-    slug = github_slug.replace('/', '-')
-    for release in wf().cached_data('gh-releases-{0}'.format(slug),
-                                     retrieve_releases):
-        version = release['tag_name']
-        download_urls = []
-        for asset in release.get('assets', []):
-            url = asset.get('browser_download_url')
-            if not url or not url.endswith('.alfredworkflow'):
-                continue
-            download_urls.append(url)
-
-        # Validate release
-        if release['prerelease']:
-            wf().logger.warning(
-                'Invalid release {0} : pre-release detected'.format(version))
-            continue
-        if not download_urls:
-            wf().logger.warning(
-                'Invalid release {0} : No workflow file'.format(version))
-            continue
-        if len(download_urls) > 1:
-            wf().logger.warning(
-                'Invalid release {0} : multiple workflow files'.format(version))
-            continue
+    wf().logger.info('Retrieving releases for `{0}` from `{1}` ...'.format(
+                     github_slug, api_url))
+
+    r = web.get(api_url, params={'per_page': RELEASES_PER_PAGE},
+                headers=headers)
+
+    if r.status_code == 304 and cached:
+        wf().logger.debug('Releases unchanged')
+        return cached['releases']
+
+    r.raise_for_status()
+
+    releases = []
+    for release in r.json():
+        release = _validate_release(release)
+        if release:
+            releases.append(release)
 
-        wf().logger.debug('Release `{0}` : {1}'.format(version, url))
-        releases.append({'version': version, 'download_url': download_urls[0]})
+    wf().cache_data(cache_key, {'etag': r.headers.get('etag'),
+                                'releases': releases})
 
     return releases
 
@@ -300,14 +453,18 @@ def check_update(github_slug, current_version):
         wf().cache_data('__workflow_update_status', {
             'version': latest_release['version'],
             'download_url': latest_release['download_url'],
+            'size': latest_release.get('size'),
+            'digest': latest_release.get('digest'),
             'available': True
         })
+        wf()._write_update_stamp(available=True)
 
         return True
 
     wf().cache_data('__workflow_update_status', {
         'available': False
     })
+    wf()._write_update_stamp(available=False)
     return False
 
 
@@ -325,6 +482,7 @@ def install_update(github_slug, current_version):
 
     """
     # TODO: `github_slug` and `current_version` are both unusued.
+    import subprocess
 
     update_data = wf().cached_data('__workflow_update_status', max_age=0)
 
@@ -332,13 +490,16 @@ def install_update(github_slug, current_version):
         wf().logger.info('No update available')
         return False
 
-    local_file = download_workflow(update_data['download_url'])
+    local_file = download_workflow(update_data['download_url'],
+                                   update_data.get('size'),
+                                   update_data.get('digest'))
 
     wf().logger.info('Installing updated workflow ...')
     subprocess.call(['open', local_file])
 
     update_data['available'] = False
     wf().cache_data('__workflow_update_status', update_data)
+    wf()._write_update_stamp(available=False)
     return True
 
 
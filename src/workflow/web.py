@@ -14,22 +14,53 @@ A lightweight HTTP library with a requests-like interface.
 from __future__ import print_function
 
 import codecs
+import hashlib
 import json
+import mimetools
 import mimetypes
 import os
 import random
 import re
 import socket
 import string
+import time
 import unicodedata
 import urllib
 import urllib2
 import urlparse
 import zlib
 
+from cStringIO import StringIO
+
 
 USER_AGENT = u'Alfred-Workflow/1.11 (http://www.deanishe.net)'
 
+# Number of bytes at the start of a document searched for an encoding
+# declaration. The HTML spec's prescan algorithm only looks at the first
+# 1024 bytes, but real-world pages sometimes stuff a lot into <head>
+# before the <meta> tag.
+ENCODING_PRESCAN_BYTES = 4096
+
+# Sentinel for `Response._encoding` (``None`` is a valid result)
+_UNSET = object()
+
+#: Transport used to execute requests. If ``None`` (the default),
+#: requests are sent with :func:`urllib2.urlopen`. Set to a
+#: :class:`RecordReplayTransport` instance to record or replay
+#: responses.
+transport = None
+
+# Network profiles for `RecordReplayTransport`.
+# Name: (latency in seconds, bandwidth in bytes/second). A bandwidth
+# of 0 means unlimited.
+PROFILES = {
+    'none': (0, 0),
+    'lan': (0.002, 10 * 1024 * 1024),
+    'dsl': (0.04, 1024 * 1024),
+    '3g': (0.3, 96 * 1024),
+    'edge': (0.8, 24 * 1024),
+}
+
 # Valid characters for multipart form data boundaries
 BOUNDARY_CHARS = string.digits + string.ascii_letters
 
@@ -199,7 +230,7 @@ class Response(object):
         self.request = request
         self.url = None
         self.raw = None
-        self._encoding = None
+        self._encoding = _UNSET
         self.error = None
         self.status_code = None
         self.reason = None
@@ -209,7 +240,7 @@ class Response(object):
 
         # Execute query
         try:
-            self.raw = urllib2.urlopen(request)
+            self.raw = _urlopen(request)
         except urllib2.HTTPError as err:
             self.error = err
             try:
@@ -260,7 +291,7 @@ class Response(object):
 
         """
 
-        if not self._encoding:
+        if self._encoding is _UNSET:
             self._encoding = self._get_encoding()
 
         return self._encoding
@@ -399,18 +430,20 @@ class Response(object):
                 encoding = param[8:]
                 break
 
-        # Encoding declared in document should override HTTP headers
+        # Encoding declared in document should override HTTP headers.
+        # Only the start of the document is searched: a declaration
+        # is only valid near the top of the document anyway.
         if self.mimetype == 'text/html':  # sniff HTML headers
-            m = re.search("""<meta.+charset=["']{0,1}(.+?)["'].*>""",
-                          self.content)
-            if m:
-                encoding = m.group(1)
+            declared = sniff_html_encoding(
+                self.content[:ENCODING_PRESCAN_BYTES])
+            if declared:
+                encoding = declared
 
         elif ((self.mimetype.startswith('application/') or
                self.mimetype.startswith('text/')) and
               'xml' in self.mimetype):
-            m = re.search("""<?xml.+encoding=["'](.+?)["'][^>]*\?>""",
-                          self.content)
+            m = re.search(r"""<\?xml[^>]+?encoding=["']([^"']+)["'][^>]*\?>""",
+                          self.content[:ENCODING_PRESCAN_BYTES])
             if m:
                 encoding = m.group(1)
 
@@ -429,6 +462,204 @@ class Response(object):
         return encoding
 
 
+def _urlopen(request):
+    """Open ``request`` with the configured :data:`transport`."""
+    if transport is not None:
+        return transport.open(request)
+    return urllib2.urlopen(request)
+
+
+class _ThrottledReader(object):
+    """File-like wrapper that limits read speed to ``bandwidth``."""
+
+    def __init__(self, fileobj, bandwidth):
+        self._fileobj = fileobj
+        self._bandwidth = bandwidth
+
+    def read(self, size=-1):
+        data = self._fileobj.read(size)
+        if data and self._bandwidth:
+            time.sleep(float(len(data)) / self._bandwidth)
+        return data
+
+    def readline(self, size=-1):
+        return self._fileobj.readline(size)
+
+    def close(self):
+        self._fileobj.close()
+
+
+class RecordReplayTransport(object):
+    """Record HTTP responses to disk and replay them without network.
+
+    .. versionadded:: 1.14
+
+    Install an instance as :data:`workflow.web.transport` to use it::
+
+        web.transport = web.RecordReplayTransport('fixtures', 'replay',
+                                                  profile='3g')
+
+    In ``record`` mode, requests are sent to the server and the responses
+    (status, headers and raw, possibly compressed, body) are saved in
+    ``dirpath``. In ``replay`` mode, saved responses are returned and
+    :class:`urllib2.URLError` is raised for unknown requests. ``auto``
+    mode replays responses if they exist and records them otherwise.
+
+    Fixtures are keyed by request method, URL and body.
+
+    :param dirpath: directory to save fixtures in
+    :type dirpath: ``unicode``
+    :param mode: ``record``, ``replay`` or ``auto``
+    :type mode: ``unicode``
+    :param latency: seconds to wait before returning a replayed response
+    :type latency: ``float``
+    :param bandwidth: maximum bytes per second to read replayed
+        response bodies at. 0 means unlimited
+    :type bandwidth: ``int``
+    :param profile: name of network profile in :data:`PROFILES`.
+        Overrides ``latency`` and ``bandwidth``
+    :type profile: ``unicode``
+
+    """
+
+    def __init__(self, dirpath, mode='replay', latency=0, bandwidth=0,
+                 profile=None):
+
+        if mode not in ('record', 'replay', 'auto'):
+            raise ValueError('Invalid mode : {0!r}'.format(mode))
+
+        if profile is not None:
+            if profile not in PROFILES:
+                raise ValueError('Unknown profile : {0!r}'.format(profile))
+            latency, bandwidth = PROFILES[profile]
+
+        self.dirpath = dirpath
+        self.mode = mode
+        self.latency = latency
+        self.bandwidth = bandwidth
+
+    def fixture_path(self, request):
+        """Return path to fixture for ``request`` minus extension.
+
+        :param request: :class:`urllib2.Request` instance
+        :returns: path to fixture (without file extension)
+        :rtype: ``unicode``
+
+        """
+
+        h = hashlib.sha1(request.get_method())
+        h.update(request.get_full_url())
+        if request.has_data():
+            h.update(request.get_data())
+        return os.path.join(self.dirpath, h.hexdigest())
+
+    def open(self, request):
+        """Return response for ``request``.
+
+        Same interface as :func:`urllib2.urlopen`.
+
+        :param request: :class:`urllib2.Request` instance
+
+        """
+
+        path = self.fixture_path(request)
+        exists = os.path.exists(path + '.json')
+
+        if self.mode == 'record' or (self.mode == 'auto' and not exists):
+            self.record(request, path)
+
+        elif not exists:
+            raise urllib2.URLError('No fixture for {0} {1}'.format(
+                                   request.get_method(),
+                                   request.get_full_url()))
+
+        return self.replay(path)
+
+    def record(self, request, path):
+        """Send ``request`` and save response to ``path``."""
+
+        try:
+            raw = urllib2.urlopen(request)
+        except urllib2.HTTPError as err:
+            raw = err
+
+        # Header lines are bytes in no particular encoding. Latin-1
+        # maps every byte to a character, so any header survives JSON.
+        meta = {
+            'method': request.get_method(),
+            'url': raw.geturl() or request.get_full_url(),
+            'status': raw.getcode(),
+            'headers': [line.decode('latin-1')
+                        for line in raw.info().headers],
+        }
+        body = raw.read() if raw.fp is not None else b''
+
+        if not os.path.exists(self.dirpath):
+            os.makedirs(self.dirpath)
+
+        with open(path + '.body', 'wb') as fileobj:
+            fileobj.write(body)
+
+        with open(path + '.json', 'wb') as fileobj:
+            json.dump(meta, fileobj, indent=2)
+
+    def replay(self, path):
+        """Return response saved at ``path``.
+
+        Raises :class:`urllib2.HTTPError` if the saved response was
+        an error.
+
+        """
+
+        with open(path + '.json', 'rb') as fileobj:
+            meta = json.load(fileobj)
+
+        headers = mimetools.Message(StringIO(
+            ''.join(meta['headers']).encode('latin-1')))
+        fileobj = open(path + '.body', 'rb')
+        if self.bandwidth:
+            fileobj = _ThrottledReader(fileobj, self.bandwidth)
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        url = meta['url'].encode('utf-8')
+        status = meta['status']
+        if status >= 400:
+            raise urllib2.HTTPError(url, status, RESPONSES.get(status),
+                                    headers, fileobj)
+
+        return urllib.addinfourl(fileobj, headers, url, status)
+
+
+def sniff_html_encoding(data):
+    """Return encoding declared in HTML ``data`` or ``None``.
+
+    .. versionadded:: 1.14
+
+    Uses the HTML5 spec's prescan algorithm (as implemented by
+    :class:`html5lib.inputstream.EncodingParser`) if :mod:`html5lib`
+    is available, otherwise a non-backtracking regular expression.
+
+    :param data: start of an HTML document
+    :type data: :class:`str`
+    :returns: encoding or ``None``
+    :rtype: :class:`str` or ``None``
+
+    """
+
+    try:
+        from html5lib.inputstream import EncodingParser
+    except ImportError:  # pragma: no cover
+        m = re.search(r"""<meta[^>]+?charset=["']?([^"'\s/>;]+)""", data,
+                      re.IGNORECASE)
+        if m:
+            return m.group(1)
+        return None
+
+    return EncodingParser(data).getEncoding()
+
+
 def request(method, url, params=None, data=None, headers=None, cookies=None,
             files=None, auth=None, timeout=60, allow_redirects=False):
     """Initiate an HTTP(S) request. Returns :class:`Response` object.
@@ -21,26 +21,18 @@ import binascii
 from contextlib import contextmanager
 import cPickle
 import errno
+import fcntl
 import json
 import logging
 import logging.handlers
 import os
-import pickle
-import plistlib
 import re
-import shutil
 import signal
 import string
-import subprocess
 import sys
 import time
 import unicodedata
 
-try:
-    import xml.etree.cElementTree as ET
-except ImportError:  # pragma: no cover
-    import xml.etree.ElementTree as ET
-
 
 #: Sentinel for properties that haven't been set yet (that might
 #: correctly have the value ``None``)
@@ -435,6 +427,9 @@ MATCH_ALL = 127
 # Number of days to wait between checking for updates to the workflow
 DEFAULT_UPDATE_FREQUENCY = 1
 
+# Next-check time for the update stamp when auto-updating is turned off
+UPDATE_NEVER = 2 ** 31 - 1
+
 
 ####################################################################
 # Lockfile and Keychain access errors
@@ -678,6 +673,7 @@ class PickleSerializer(object):
 
         """
 
+        import pickle
         return pickle.load(file_obj)
 
     @classmethod
@@ -693,6 +689,7 @@ class PickleSerializer(object):
 
         """
 
+        import pickle
         return pickle.dump(obj, file_obj, protocol=-1)
 
 
@@ -703,6 +700,14 @@ manager.register('pickle', PickleSerializer)
 manager.register('json', JSONSerializer)
 
 
+# XML templates for :class:`Item`, keyed by the item's "shape" (which
+# optional elements and attributes it has). Built by `_item_template`.
+_ITEM_TEMPLATES = {}
+
+# Modifier keys in the order their subtitles are output
+_ITEM_MODIFIERS = ('cmd', 'ctrl', 'alt', 'shift', 'fn')
+
+
 class Item(object):
     """Represents a feedback item for Alfred. Generates Alfred-compliant
     XML for a single item.
@@ -711,8 +716,16 @@ class Item(object):
     :meth:`Workflow.add_item`. See :meth:`~Workflow.add_item`
     for details of arguments.
 
+    .. versionchanged:: 1.14
+        Uses ``__slots__`` and caches its serialised output
+        (:attr:`xml` and :attr:`json`).
+
     """
 
+    __slots__ = ('title', 'subtitle', 'modifier_subtitles', 'arg',
+                 'autocomplete', 'valid', 'uid', 'icon', 'icontype', 'type',
+                 'largetext', 'copytext', '_xml', '_json')
+
     def __init__(self, title, subtitle='', modifier_subtitles=None,
                  arg=None, autocomplete=None, valid=False, uid=None,
                  icon=None, icontype=None, type=None, largetext=None,
@@ -733,6 +746,8 @@ class Item(object):
         self.type = type
         self.largetext = largetext
         self.copytext = copytext
+        # (fields, output) of last serialisation
+        self._xml = self._json = None
 
     @property
     def elem(self):
@@ -743,6 +758,12 @@ class Item(object):
 
         """
 
+        # Only needed here, so don't load it on startup
+        try:
+            import xml.etree.cElementTree as ET
+        except ImportError:  # pragma: no cover
+            import xml.etree.ElementTree as ET
+
         # Attributes on <item> element
         attr = {}
         if self.valid:
@@ -794,14 +815,219 @@ class Item(object):
 
         return root
 
+    @property
+    def xml(self):
+        """Serialise item to Alfred's XML format.
+
+        .. versionadded:: 1.14
+
+        Unlike :attr:`elem`, no :class:`~xml.etree.ElementTree.Element`
+        is created. The output is cached until the item is changed.
+
+        :returns: UTF-8-encoded ``<item>`` element
+        :rtype: ``str``
+
+        """
+
+        fields = self._fields()
+        if self._xml is not None and self._xml[0] == fields:
+            return self._xml[1]
+
+        (title, subtitle, mods, arg, autocomplete, valid, uid, icon,
+         icontype, type_, largetext, copytext) = fields
+
+        # Values for the placeholders in the item's template
+        values = []
+        if autocomplete is not None:
+            values.append(_xml_attr(autocomplete))
+        if type_:
+            values.append(_xml_attr(type_))
+        if uid:
+            values.append(_xml_attr(uid))
+        values.append('yes' if valid else 'no')
+        values.append(_xml_escape(title or ''))
+        values.append(_xml_escape(subtitle or ''))
+        values.extend([_xml_escape(sub or '') for _, sub in mods])
+        if arg:
+            values.append(_xml_escape(arg))
+        if icon:
+            if icontype:
+                values.append(_xml_attr(icontype))
+            values.append(_xml_escape(icon))
+        if largetext:
+            values.append(_xml_escape(largetext))
+        if copytext:
+            values.append(_xml_escape(copytext))
+
+        shape = (autocomplete is not None, bool(type_), bool(uid),
+                 tuple([mod for mod, _ in mods]), bool(arg), bool(icon),
+                 bool(icon and icontype), bool(largetext), bool(copytext))
+
+        template = _ITEM_TEMPLATES.get(shape)
+        if template is None:
+            template = _ITEM_TEMPLATES[shape] = _item_template(*shape)
+
+        output = template.format(*values).encode('utf-8')
+        self._xml = (fields, output)
+        return output
+
+    @property
+    def json(self):
+        """Serialise item to Alfred 3's JSON format.
+
+        .. versionadded:: 1.14
+
+        The output is cached until the item is changed.
+
+        :returns: item as an (ASCII) JSON object
+        :rtype: ``str``
+
+        """
+
+        fields = self._fields()
+        if self._json is not None and self._json[0] == fields:
+            return self._json[1]
+
+        obj = {'title': self.title, 'subtitle': self.subtitle,
+               'valid': bool(self.valid)}
+
+        if self.autocomplete is not None:
+            obj['autocomplete'] = self.autocomplete
+
+        for name in ('uid', 'type', 'arg'):
+            value = getattr(self, name, None)
+            if value:
+                obj[name] = value
+
+        if self.modifier_subtitles:
+            obj['mods'] = dict((mod, {'subtitle': subtitle})
+                               for mod, subtitle
+                               in self.modifier_subtitles.items())
+
+        if self.icon:
+            obj['icon'] = {'path': self.icon}
+            if self.icontype:
+                obj['icon']['type'] = self.icontype
+
+        text = {}
+        if self.largetext:
+            text['largetype'] = self.largetext
+        if self.copytext:
+            text['copy'] = self.copytext
+        if text:
+            obj['text'] = text
+
+        output = json.dumps(obj, sort_keys=True, separators=(',', ':'))
+        self._json = (fields, output)
+        return output
+
+    def _fields(self):
+        """Return values that determine item's output.
+
+        Used to check whether cached output is still valid.
+        ``modifier_subtitles`` is converted to a tuple, so changes
+        to the :class:`dict` are also noticed.
+
+        """
+
+        mods = self.modifier_subtitles
+        if mods:
+            mods = tuple([(mod, mods[mod]) for mod in _ITEM_MODIFIERS
+                          if mod in mods])
+        else:
+            mods = ()
+
+        return (self.title, self.subtitle, mods, self.arg, self.autocomplete,
+                self.valid, self.uid, self.icon, self.icontype, self.type,
+                self.largetext, self.copytext)
+
+
+def _item_template(autocomplete, type_, uid, mods, arg, icon, icontype,
+                   largetext, copytext):
+    """Return :meth:`str.format` template for an XML ``<item>``.
+
+    Arguments specify which optional attributes and elements the
+    item has. Placeholders are in document order.
+
+    """
+
+    # Attributes on <item> element (sorted, as by ElementTree)
+    parts = ['<item']
+    if autocomplete:
+        parts.append(' autocomplete="{}"')
+    if type_:
+        parts.append(' type="{}"')
+    if uid:
+        parts.append(' uid="{}"')
+    parts.append(' valid="{}">')
+
+    parts.append('<title>{}</title><subtitle>{}</subtitle>')
+    for mod in mods:
+        parts.append('<subtitle mod="{0}">{{}}</subtitle>'.format(mod))
+
+    if arg:
+        parts.append('<arg>{}</arg>')
+
+    if icontype:
+        parts.append('<icon type="{}">{}</icon>')
+    elif icon:
+        parts.append('<icon>{}</icon>')
+
+    if largetext:
+        parts.append('<text type="largetype">{}</text>')
+
+    if copytext:
+        parts.append('<text type="copy">{}</text>')
+
+    parts.append('</item>')
+    return ''.join(parts)
+
+
+def _xml_escape(text):
+    """Escape ``text`` for use in XML element."""
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def _xml_attr(value):
+    """Escape ``value`` for use in an XML attribute."""
+    return (_xml_escape(value).replace('"', '&quot;')
+            .replace('\n', '&#10;'))
+
 
 class LockFile(object):
-    """Context manager to create lock files"""
+    """Context manager to protect filepaths with lockfiles.
+
+    .. versionchanged:: 1.14
+       Use :func:`fcntl.flock` and add shared locks.
+
+    Locks are acquired with :func:`fcntl.flock` on the file
+    ``protected_path + '.lock'``, so a waiting process blocks in
+    the kernel instead of polling, and the lock is released
+    automatically if its holder dies.
+
+    If ``shared`` is ``True``, a shared (read) lock is acquired.
+    Any number of processes may hold a shared lock at the same time,
+    but not while another process holds an exclusive (write) lock.
+
+    :param protected_path: path of file to lock
+    :type protected_path: ``unicode``
+    :param timeout: seconds to wait for the lock before raising an
+        :class:`AcquisitionError`. 0 means wait forever
+    :type timeout: ``float``
+    :param delay: seconds between attempts to acquire the lock if it
+        can't be waited for with a timer (i.e. outside the main thread)
+    :type delay: ``float``
+    :param shared: acquire a shared lock instead of an exclusive one
+    :type shared: ``Boolean``
+
+    """
 
-    def __init__(self, protected_path, timeout=0, delay=0.05):
+    def __init__(self, protected_path, timeout=0, delay=0.05, shared=False):
         self.lockfile = protected_path + '.lock'
         self.timeout = timeout
         self.delay = delay
+        self.shared = shared
+        self._lock = None
         self._locked = False
 
     @property
@@ -815,33 +1041,91 @@ class LockFile(object):
         If the lock is in use and ``blocking`` is ``False``, return
         ``False``.
 
-        Otherwise, check every `self.delay` seconds until it acquires
-        lock or exceeds `self.timeout` and raises an exception.
+        Otherwise, wait until the lock is free or `self.timeout` is
+        exceeded, in which case an :class:`AcquisitionError` is raised.
 
         """
-        start = time.time()
-        while True:
-            try:
-                fd = os.open(self.lockfile, os.O_CREAT | os.O_EXCL | os.O_RDWR)
-                with os.fdopen(fd, 'w') as fd:
-                    fd.write('{0}'.format(os.getpid()))
-                break
-            except OSError as err:
-                if err.errno != errno.EEXIST:  # pragma: no cover
-                    raise
-                if self.timeout and (time.time() - start) >= self.timeout:
-                    raise AcquisitionError('Lock acquisition timed out.')
-                if not blocking:
+        if self._locked:
+            return True
+
+        if self.shared:
+            operation = fcntl.LOCK_SH
+        else:
+            operation = fcntl.LOCK_EX
+
+        lock = open(self.lockfile, 'a')
+        try:
+            if not blocking:
+                if not self._try_lock(lock, operation):
+                    lock.close()
                     return False
-                time.sleep(self.delay)
+            elif self.timeout:
+                self._wait_for_lock(lock, operation)
+            else:
+                fcntl.flock(lock, operation)
+        except Exception:
+            lock.close()
+            raise
 
+        self._lock = lock
         self._locked = True
         return True
 
     def release(self):
-        """Release the lock by deleting `self.lockfile`."""
+        """Release the lock.
+
+        The lockfile itself is not deleted: another process may
+        already be waiting on it.
+
+        """
+        if not self._locked:
+            return
         self._locked = False
-        os.unlink(self.lockfile)
+        fcntl.flock(self._lock, fcntl.LOCK_UN)
+        self._lock.close()
+        self._lock = None
+
+    def _try_lock(self, lock, operation):
+        """Try to lock ``lock`` without blocking. Return `True` if locked."""
+        try:
+            fcntl.flock(lock, operation | fcntl.LOCK_NB)
+        except IOError as err:
+            if err.errno not in (errno.EAGAIN, errno.EACCES):
+                raise
+            return False
+        return True
+
+    def _wait_for_lock(self, lock, operation):
+        """Block on ``lock`` for up to `self.timeout` seconds.
+
+        A blocking :func:`fcntl.flock` call is interrupted by a
+        ``SIGALRM`` after `self.timeout` seconds. As signal handlers
+        can only be set in the main thread (and a timer may already
+        be in use), fall back to polling every `self.delay` seconds
+        otherwise.
+
+        """
+        def timed_out(signum, frame):
+            raise AcquisitionError('Lock acquisition timed out.')
+
+        try:
+            if signal.getitimer(signal.ITIMER_REAL)[0]:
+                raise ValueError('Timer already in use')
+            old_handler = signal.signal(signal.SIGALRM, timed_out)
+        except ValueError:
+            start = time.time()
+            while not self._try_lock(lock, operation):
+                if (time.time() - start) >= self.timeout:
+                    raise AcquisitionError('Lock acquisition timed out.')
+                time.sleep(self.delay)
+            return
+
+        signal.setitimer(signal.ITIMER_REAL, self.timeout)
+        try:
+            fcntl.flock(lock, operation)
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, old_handler)
 
     def __enter__(self):
         """Acquire lock."""
@@ -853,38 +1137,69 @@ class LockFile(object):
         self.release()
 
     def __del__(self):
-        """Clear up `self.lockfile`."""
+        """Release lock if still held."""
         if self._locked:  # pragma: no cover
             self.release()
 
 
 @contextmanager
-def atomic_writer(file_path, mode):
+def atomic_writer(file_path, mode, fsync=False):
     """Atomic file writer.
 
     :param file_path: path of file to write to.
     :type file_path: ``unicode``
     :param mode: sames as for `func:open`
     :type mode: string
+    :param fsync: flush file and directory to disk before returning
+    :type fsync: ``Boolean``
 
     .. versionadded:: 1.12
 
+    .. versionchanged:: 1.14
+       Use a unique temporary file and add ``fsync`` argument.
+
     Context manager that ensures the file is only written if the write
-    succeeds. The data is first written to a temporary file.
+    succeeds. The data is first written to a uniquely-named temporary
+    file in the same directory, which is then renamed to ``file_path``,
+    so concurrent writers can't clobber one another's data.
+
+    Without ``fsync``, a system crash shortly after writing may leave
+    an empty or truncated file. With ``fsync``, the data are on disk
+    when the context manager exits, but that is a great deal slower.
 
     """
 
-    temp_suffix = '.aw.temp'
-    temp_file_path = file_path + temp_suffix
-    with open(temp_file_path, mode) as file_obj:
-        try:
+    import tempfile
+    dirpath, filename = os.path.split(os.path.abspath(file_path))
+    fd, temp_file_path = tempfile.mkstemp(prefix=filename + '.',
+                                          suffix='.aw.temp',
+                                          dir=dirpath)
+    # `mkstemp` creates files readable only by the user
+    umask = os.umask(0)
+    os.umask(umask)
+    os.chmod(temp_file_path, 0o666 & ~umask)
+
+    try:
+        with os.fdopen(fd, mode) as file_obj:
             yield file_obj
-            os.rename(temp_file_path, file_path)
-        finally:
+            if fsync:
+                file_obj.flush()
+                os.fsync(file_obj.fileno())
+
+        os.rename(temp_file_path, file_path)
+
+        if fsync:  # Ensure rename is on disk, too
+            dir_fd = os.open(dirpath, os.O_RDONLY)
             try:
-                os.remove(temp_file_path)
-            except (OSError, IOError):
-                pass
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+
+    finally:
+        try:
+            os.remove(temp_file_path)
+        except (OSError, IOError):
+            pass
 
 
 class uninterruptible(object):
@@ -994,7 +1309,7 @@ class Settings(dict):
         for key, value in self.items():
             data[key] = value
         with LockFile(self._filepath):
-            with atomic_writer(self._filepath, 'wb') as file_obj:
+            with atomic_writer(self._filepath, 'wb', fsync=True) as file_obj:
                 json.dump(data, file_obj, sort_keys=True, indent=2,
                           encoding='utf-8')
 
@@ -1050,6 +1365,13 @@ class Workflow(object):
             also be opened directly in a web browser with the ``workflow:help``
             :ref:`magic argument <magic-arguments>`.
         :type help_url: :class:`unicode` or :class:`str`
+        :param feedback_format: format :meth:`send_feedback` sends
+            results to Alfred in. Either ``xml`` or ``json`` (Alfred 3+
+            only).
+        :type feedback_format: :class:`unicode`
+
+        .. versionchanged:: 1.14
+            Added ``feedback_format`` argument.
 
     """
 
@@ -1060,7 +1382,7 @@ class Workflow(object):
     def __init__(self, default_settings=None, update_settings=None,
                  input_encoding='utf-8', normalization='NFC',
                  capture_args=True, libraries=None,
-                 help_url=None):
+                 help_url=None, feedback_format='xml'):
 
         self._default_settings = default_settings or {}
         self._update_settings = update_settings or {}
@@ -1068,7 +1390,12 @@ class Workflow(object):
         self._normalizsation = normalization
         self._capture_args = capture_args
         self.help_url = help_url
+        if feedback_format not in ('xml', 'json'):
+            raise ValueError(
+                'Unknown feedback format : {0!r}'.format(feedback_format))
+        self.feedback_format = feedback_format
         self._workflowdir = None
+        self._cachedir = None
         self._settings_path = None
         self._settings = None
         self._bundleid = None
@@ -1326,6 +1653,9 @@ class Workflow(object):
 
         """
 
+        if self._cachedir:
+            return self._cachedir
+
         if self.alfred_env.get('workflow_cache'):
             dirpath = self.alfred_env.get('workflow_cache')
 
@@ -1336,7 +1666,8 @@ class Workflow(object):
                     'Workflow Data/'),
                 self.bundleid)
 
-        return self._create(dirpath)
+        self._cachedir = self._create(dirpath)
+        return self._cachedir
 
     @property
     def datadir(self):
@@ -1741,10 +2072,10 @@ class Workflow(object):
         @uninterruptible
         def _store():
             # Save file extension
-            with atomic_writer(metadata_path, 'wb') as file_obj:
+            with atomic_writer(metadata_path, 'wb', fsync=True) as file_obj:
                 file_obj.write(serializer_name)
 
-            with atomic_writer(data_path, 'wb') as file_obj:
+            with atomic_writer(data_path, 'wb', fsync=True) as file_obj:
                 serializer.dump(data, file_obj)
 
         _store()
@@ -2247,14 +2578,43 @@ class Workflow(object):
         return item
 
     def send_feedback(self):
-        """Print stored items to console/Alfred as XML."""
-        root = ET.Element('items')
-        for item in self._items:
-            root.append(item.elem)
-        sys.stdout.write('<?xml version="1.0" encoding="utf-8"?>\n')
-        sys.stdout.write(ET.tostring(root).encode('utf-8'))
+        """Print stored items to console/Alfred.
+
+        .. versionchanged:: 1.14
+            Items are serialised one by one (see :attr:`Item.xml` and
+            :attr:`Item.json`) instead of via an
+            :class:`~xml.etree.ElementTree.Element` tree, and output as
+            JSON if :attr:`feedback_format` is ``json``.
+
+        """
+
+        # Write output in one go
+        sys.stdout.write(self.render_feedback())
         sys.stdout.flush()
 
+    def render_feedback(self):
+        """Return the output :meth:`send_feedback` would send to Alfred.
+
+        .. versionadded:: 1.14
+
+        Use this to cache feedback for reuse.
+
+        :returns: feedback in :attr:`feedback_format`
+        :rtype: ``str``
+
+        """
+
+        if self.feedback_format == 'json':
+            parts = [b'{"items":[']
+            parts.append(b','.join([item.json for item in self._items]))
+            parts.append(b']}')
+        else:
+            parts = [b'<?xml version="1.0" encoding="utf-8"?>\n<items>']
+            parts.extend([item.xml for item in self._items])
+            parts.append(b'</items>')
+
+        return b''.join(parts)
+
     ####################################################################
     # Updating methods
     ####################################################################
@@ -2326,9 +2686,10 @@ class Workflow(object):
             from update import Version
             version = Version(version)
 
-        self.settings['__workflow_last_version'] = str(version)
-
-        self.logger.debug('Set last run version : {0}'.format(version))
+        # Called after every run, so don't rewrite settings unnecessarily
+        if self.settings.get('__workflow_last_version') != str(version):
+            self.settings['__workflow_last_version'] = str(version)
+            self.logger.debug('Set last run version : {0}'.format(version))
 
         return True
 
@@ -2345,6 +2706,11 @@ class Workflow(object):
 
         """
 
+        try:
+            return os.stat(self._update_stamp_path).st_size > 0
+        except OSError:  # No check since before update stamps
+            pass
+
         update_data = self.cached_data('__workflow_update_status', max_age=0)
         self.logger.debug('update_data : {0}'.format(update_data))
 
@@ -2372,33 +2738,44 @@ class Workflow(object):
         frequency = self._update_settings.get('frequency',
                                               DEFAULT_UPDATE_FREQUENCY)
 
-        if not force and not self.settings.get('__workflow_autoupdate', True):
-            self.logger.debug('Auto update turned off by user')
-            return
+        if not force:
+            # This is called on every run, so only `stat` the update
+            # stamp unless a check is due
+            try:
+                due = os.stat(self._update_stamp_path).st_mtime <= time.time()
+            except OSError:  # Never checked
+                due = True
 
-        # Check for new version if it's time
-        if (force or not self.cached_data_fresh(
-                '__workflow_update_status', frequency * 86400)):
+            if not due:
+                self.logger.debug('Update check not due')
+                return
 
-            github_slug = self._update_settings['github_slug']
-            # version = self._update_settings['version']
-            version = str(self.version)
+            if not self.settings.get('__workflow_autoupdate', True):
+                self.logger.debug('Auto update turned off by user')
+                self._write_update_stamp(next_check=UPDATE_NEVER)
+                return
 
-            from background import run_in_background
+        # Check for new version. Set the next check time now, so
+        # the check isn't started again while it's running (or on
+        # every run if it fails)
+        self._write_update_stamp(next_check=time.time() + frequency * 86400)
 
-            # update.py is adjacent to this file
-            update_script = os.path.join(os.path.dirname(__file__),
-                                         b'update.py')
+        github_slug = self._update_settings['github_slug']
+        # version = self._update_settings['version']
+        version = str(self.version)
 
-            cmd = ['/usr/bin/python', update_script, 'check', github_slug,
-                   version]
+        from background import run_in_background
+
+        # update.py is adjacent to this file
+        update_script = os.path.join(os.path.dirname(__file__),
+                                     b'update.py')
 
-            self.logger.info('Checking for update ...')
+        cmd = ['/usr/bin/python', update_script, 'check', github_slug,
+               version]
 
-            run_in_background('__workflow_update_check', cmd)
+        self.logger.info('Checking for update ...')
 
-        else:
-            self.logger.debug('Update check not due')
+        run_in_background('__workflow_update_check', cmd)
 
     def start_update(self):
         """Check for update and download and install new workflow file
@@ -2436,6 +2813,48 @@ class Workflow(object):
 
         return True
 
+    @property
+    def _update_stamp_path(self):
+        """Path to update stamp file.
+
+        The stamp's mtime is the time of the next update check and it
+        is non-empty if an update is available, so the update status
+        can be determined with a single :func:`os.stat`.
+
+        """
+
+        return os.path.join(self.cachedir, '__workflow_update.stamp')
+
+    def _write_update_stamp(self, available=None, next_check=None):
+        """Update stamp file (see :attr:`_update_stamp_path`).
+
+        :param available: whether an update is available. ``None``
+            means unchanged.
+        :type available: ``Boolean``
+        :param next_check: timestamp of next update check. ``None``
+            means unchanged.
+        :type next_check: ``float``
+
+        """
+
+        path = self._update_stamp_path
+        try:
+            st = os.stat(path)
+        except OSError:
+            st = None
+
+        if available is None:
+            available = st is not None and st.st_size > 0
+
+        if next_check is None:
+            next_check = st.st_mtime if st else 0
+
+        with open(path, 'wb') as file_obj:
+            if available:
+                file_obj.write(b'1')
+
+        os.utime(path, (next_check, next_check))
+
     ####################################################################
     # Keychain password storage methods
     ####################################################################
@@ -2595,10 +3014,12 @@ class Workflow(object):
         # Updates
         def update_on():
             self.settings['__workflow_autoupdate'] = True
+            self._write_update_stamp(next_check=0)
             return 'Auto update turned on'
 
         def update_off():
             self.settings['__workflow_autoupdate'] = False
+            self._write_update_stamp(next_check=UPDATE_NEVER)
             return 'Auto update turned off'
 
         def do_update():
@@ -2690,28 +3111,34 @@ class Workflow(object):
 
         """
 
+        import subprocess
         subprocess.call(['open', self.logfile])
 
     def open_cachedir(self):
         """Open the workflow's :attr:`cachedir` in Finder."""
+        import subprocess
         subprocess.call(['open', self.cachedir])
 
     def open_datadir(self):
         """Open the workflow's :attr:`datadir` in Finder."""
+        import subprocess
         subprocess.call(['open', self.datadir])
 
     def open_workflowdir(self):
         """Open the workflow's :attr:`workflowdir` in Finder."""
+        import subprocess
         subprocess.call(['open', self.workflowdir])
 
     def open_terminal(self):
         """Open a Terminal window at workflow's :attr:`workflowdir`."""
 
+        import subprocess
         subprocess.call(['open', '-a', 'Terminal',
                         self.workflowdir])
 
     def open_help(self):
         """Open :attr:`help_url` in default browser"""
+        import subprocess
         subprocess.call(['open', self.help_url])
 
         return 'Opening workflow help URL in browser'
@@ -2805,6 +3232,7 @@ class Workflow(object):
         :type filter_func ``callable``
         """
 
+        import shutil
         if os.path.exists(dirpath):
             for filename in os.listdir(dirpath):
                 if not filter_func(filename):
@@ -2821,6 +3249,7 @@ class Workflow(object):
 
         """
 
+        import plistlib
         self._info = plistlib.readPlist(self._info_plist)
         self._info_loaded = True
 
@@ -2864,6 +3293,7 @@ class Workflow(object):
 
         """
 
+        import subprocess
         cmd = ['security', action, '-s', service, '-a', account] + list(args)
         p = subprocess.Popen(cmd, stdout=subprocess.PIPE,
                              stderr=subprocess.STDOUT)
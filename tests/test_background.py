@@ -0,0 +1,359 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright © 2015 deanishe@deanishe.net
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2015-10-04
+#
+
+"""Tests for `workflow.background` task slots and worker."""
+
+from __future__ import print_function, unicode_literals, absolute_import
+
+import fcntl
+import os
+import pickle
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+mydir = os.path.abspath(os.path.dirname(__file__))
+wfdir = os.path.abspath(os.path.join(mydir, '../src'))
+
+sys.path.insert(0, wfdir)
+
+# Keep test cache and data away from Alfred's
+TEMPDIR = tempfile.mkdtemp()
+os.environ[b'alfred_workflow_cache'] = os.path.join(TEMPDIR, b'cache')
+os.environ[b'alfred_workflow_data'] = os.path.join(TEMPDIR, b'data')
+
+from workflow import background
+
+NAME = 'test-task'
+
+
+def probe_concurrently(name, count=4, repeat=200):
+    """Run ``count`` threads calling `is_running` ``repeat`` times.
+
+    Returns the set of results.
+    """
+    results = set()
+    start = threading.Event()
+
+    def probe():
+        start.wait()
+        for i in range(repeat):
+            results.add(background.is_running(name))
+
+    threads = [threading.Thread(target=probe) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    start.set()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class SlotTests(unittest.TestCase):
+    """Task slots and `is_running` probes."""
+
+    def setUp(self):
+        background.wf().clear_cache()
+
+    def test_not_running(self):
+        """No PID file, or unlocked PID file: task isn't running"""
+        self.assertFalse(background.is_running(NAME))
+        slot = background._acquire_slot(NAME)
+        slot.close()
+        self.assertFalse(background.is_running(NAME))
+
+    def test_running(self):
+        """Task is running while its slot is held"""
+        slot = background._acquire_slot(NAME)
+        try:
+            self.assertTrue(background.is_running(NAME))
+            self.assertIsNone(background._acquire_slot(NAME))
+            self.assertEqual(background.running_tasks([NAME, 'other']),
+                             set([NAME]))
+        finally:
+            slot.close()
+
+    def test_concurrent_probes_of_running_task(self):
+        """Concurrent probes all see a running task"""
+        slot = background._acquire_slot(NAME)
+        try:
+            self.assertEqual(probe_concurrently(NAME), set([True]))
+        finally:
+            slot.close()
+
+    def test_concurrent_probes_of_stopped_task(self):
+        """Concurrent probes don't mistake each other for the task"""
+        background._acquire_slot(NAME).close()
+        self.assertEqual(probe_concurrently(NAME), set([False]))
+
+    def test_probe_does_not_block_start(self):
+        """A probe in progress doesn't stop the task being started"""
+        background._acquire_slot(NAME).close()
+        probe = open(background._pid_file(NAME), 'a')
+        fcntl.flock(probe, fcntl.LOCK_SH)
+        timer = threading.Timer(0.05, probe.close)
+        timer.start()
+        try:
+            slot = background._acquire_slot(NAME)
+            self.assertIsNotNone(slot)
+            slot.close()
+        finally:
+            timer.join()
+
+
+def wait_for(predicate, timeout=5):
+    """Return ``True`` once ``predicate()`` is true or ``False`` on timeout."""
+    end = time.time() + timeout
+    while time.time() < end:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def touch_command(path):
+    """Return command that creates file ``path``."""
+    return [sys.executable, '-c', 'open({0!r}, "w").close()'.format(path)]
+
+
+def python_command(code):
+    """Return command that runs Python ``code``."""
+    return [sys.executable, '-c', code]
+
+
+def write_job(name, args, priority=background.PRIORITY_NORMAL):
+    """Add job to queue without notifying the worker."""
+    job = {'name': name, 'args': args, 'kwargs': {},
+           'priority': priority, 'queued': time.time()}
+    with open(background._job_file(name, 'job'), 'wb') as file_obj:
+        pickle.dump(job, file_obj, protocol=-1)
+
+
+class ProcessTests(unittest.TestCase):
+    """Tasks started by the worker."""
+
+    def setUp(self):
+        background.wf().clear_cache()
+
+    def test_task_holds_slot(self):
+        """Task keeps its slot, but no other locks, when worker lets go"""
+        lockpath = background.wf().cachefile('lock')
+        lock = open(lockpath, 'a')
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        path = background.wf().cachefile('stop')
+        proc, slot = background._start_process(NAME, python_command(
+            'import os, time\n'
+            'while not os.path.exists({0!r}): time.sleep(0.01)'.format(path)),
+            {})
+        slot.close()
+        lock.close()
+        try:
+            self.assertTrue(background.is_running(NAME))
+            with open(lockpath, 'a') as file_obj:
+                self.assertTrue(background._try_lock(file_obj,
+                                                     fcntl.LOCK_EX))
+        finally:
+            open(path, 'w').close()
+            proc.wait()
+        self.assertFalse(background.is_running(NAME))
+
+    def test_task_keeps_stdout(self):
+        """Files passed to the task aren't closed"""
+        path = background.wf().cachefile('output')
+        with open(path, 'wb') as file_obj:
+            proc, slot = background._start_process(
+                NAME, python_command('print("hello")'), {'stdout': file_obj})
+        proc.wait()
+        slot.close()
+        self.assertEqual(proc.returncode, 0)
+        with open(path, 'rb') as file_obj:
+            self.assertEqual(file_obj.read(), b'hello\n')
+
+    def test_failed_start_keeps_new_job(self):
+        """A job that can't start doesn't replace one queued meanwhile"""
+        write_job(NAME, ['/nonexistent'])
+        start_process = background._start_process
+
+        def requeue_and_fail(name, args, kwargs):
+            write_job(NAME, ['new'])
+            return start_process(name, args, kwargs)
+
+        background._start_process = requeue_and_fail
+        try:
+            running = {}
+            background._start_queued_jobs(running)
+        finally:
+            background._start_process = start_process
+
+        self.assertEqual(running, {})
+        self.assertEqual(background.job_status(NAME), 'pending')
+        self.assertEqual(background._load(
+            background._job_file(NAME, 'job'))['args'], ['new'])
+        self.assertFalse(os.path.exists(background._job_file(NAME,
+                                                             'running')))
+
+    def test_failed_start_requeues_job(self):
+        """A job that can't start goes back in the queue"""
+        write_job(NAME, ['/nonexistent'])
+        running = {}
+        background._start_queued_jobs(running)
+        self.assertEqual(running, {})
+        self.assertEqual(background.job_status(NAME), 'pending')
+        self.assertEqual(background._load(
+            background._job_file(NAME, 'job'))['args'], ['/nonexistent'])
+
+    def test_requeue_jobs(self):
+        """Jobs left running are re-queued, unless queued again"""
+        for name in ('old', 'both'):
+            write_job(name, [name])
+            os.rename(background._job_file(name, 'job'),
+                      background._job_file(name, 'running'))
+        write_job('both', ['new'])
+        background._requeue_jobs()
+        self.assertEqual([job['args'] for job in background._pending_jobs()],
+                         [['old'], ['new']])
+        self.assertIsNone(background.job_status('none'))
+
+
+class WorkerLoopTests(unittest.TestCase):
+    """The worker loop, run in a thread."""
+
+    def setUp(self):
+        background.wf().clear_cache()
+        self.idle_timeout = background.WORKER_IDLE_TIMEOUT
+        background.WORKER_IDLE_TIMEOUT = 0.5
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        with background._in_cachedir():
+            self.server.bind(background._WORKER_SOCKET)
+        self.server.listen(16)
+        self.thread = threading.Thread(target=background._worker_loop,
+                                       args=(self.server,))
+        self.thread.start()
+
+    def tearDown(self):
+        self.thread.join(10)
+        background.WORKER_IDLE_TIMEOUT = self.idle_timeout
+        self.server.close()
+        os.unlink(background.wf().cachefile(background._WORKER_SOCKET))
+
+    def test_run_task_then_idle_exit(self):
+        """Worker runs tasks sent to it, then exits when idle"""
+        path = background.wf().cachefile('ran')
+        self.assertTrue(background.worker_running())
+        self.assertEqual(background.run_in_worker(NAME, touch_command(path)),
+                         0)
+        self.assertTrue(wait_for(lambda: os.path.exists(path)))
+        self.assertTrue(wait_for(lambda: not background.is_running(NAME)))
+        self.thread.join(10)
+        self.assertFalse(self.thread.is_alive())
+
+    def test_queue_job_result(self):
+        """Queued job runs and its result is recorded"""
+        args = python_command('print("hello")')
+        self.assertIsNone(background.job_result(NAME))
+        self.assertTrue(background.queue_job(NAME, args, cwd=TEMPDIR))
+        self.assertTrue(wait_for(
+            lambda: background.job_status(NAME) == 'done'))
+        result = background.job_result(NAME)
+        self.assertEqual(result['name'], NAME)
+        self.assertEqual(result['args'], args)
+        self.assertEqual(result['kwargs'], {'cwd': TEMPDIR})
+        self.assertEqual(result['priority'], background.PRIORITY_NORMAL)
+        self.assertEqual(result['retcode'], 0)
+        self.assertEqual(result['output'], b'hello\n')
+        self.assertTrue(result['queued'] <= result['started'] <=
+                        result['finished'])
+
+    def test_failed_job_result(self):
+        """Exit code of failed job is recorded"""
+        background.queue_job(NAME, python_command('raise SystemExit(3)'))
+        self.assertTrue(wait_for(
+            lambda: background.job_status(NAME) == 'done'))
+        self.assertEqual(background.job_result(NAME)['retcode'], 3)
+
+    def test_priority(self):
+        """Queued jobs run highest priority first"""
+        max_jobs = background.WORKER_MAX_JOBS
+        background.WORKER_MAX_JOBS = 1
+        try:
+            # Hold jobs in the queue till they're all there
+            slots = [background._acquire_slot(name) for name in 'abc']
+            for name, priority in (('a', background.PRIORITY_LOW),
+                                   ('b', background.PRIORITY_HIGH),
+                                   ('c', background.PRIORITY_NORMAL)):
+                background.queue_job(name, python_command('pass'), priority)
+            self.assertEqual(background.job_status('a'), 'pending')
+
+            # Identical job isn't queued again, but may raise priority
+            self.assertFalse(background.queue_job(
+                'a', python_command('pass'), background.PRIORITY_LOW))
+            self.assertTrue(background.queue_job(
+                'c', python_command('pass'), background.PRIORITY_HIGH))
+            self.assertEqual([job['name'] for job in
+                              background._pending_jobs()], ['b', 'c', 'a'])
+
+            for slot in slots:
+                slot.close()
+            self.assertTrue(wait_for(lambda: all(
+                background.job_status(name) == 'done' for name in 'abc')))
+        finally:
+            background.WORKER_MAX_JOBS = max_jobs
+
+        results = [background.job_result(name) for name in 'bca']
+        self.assertEqual(results[1]['priority'], background.PRIORITY_HIGH)
+        self.assertTrue(results[0]['finished'] <= results[1]['started'])
+        self.assertTrue(results[1]['finished'] <= results[2]['started'])
+
+
+class StartWorkerTests(unittest.TestCase):
+    """Starting the worker process."""
+
+    def setUp(self):
+        background.wf().clear_cache()
+
+    def tearDown(self):
+        path = background.wf().cachefile(background._WORKER_PID)
+        if os.path.exists(path):
+            with open(path) as file_obj:
+                os.kill(int(file_obj.read()), signal.SIGTERM)
+            wait_for(lambda: not background.worker_running())
+
+    def test_start_worker(self):
+        """Worker starts, runs tasks and doesn't keep caller's files"""
+        lockpath = background.wf().cachefile('lock')
+        lock = open(lockpath, 'a')
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        sock = background._start_worker()
+        lock.close()
+        self.assertIsNotNone(sock)
+        sock.close()
+        self.assertTrue(background.worker_running())
+
+        # Lock would still be held if the worker had inherited it
+        with open(lockpath, 'a') as file_obj:
+            self.assertTrue(background._try_lock(file_obj, fcntl.LOCK_EX))
+
+        path = background.wf().cachefile('ran')
+        self.assertEqual(background.run_in_worker(NAME, touch_command(path)),
+                         0)
+        self.assertTrue(wait_for(lambda: os.path.exists(path)))
+
+
+def tearDownModule():
+    shutil.rmtree(TEMPDIR)
+
+
+if __name__ == '__main__':
+    unittest.main()
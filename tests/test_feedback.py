@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright © 2015 deanishe@deanishe.net
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2015-10-04
+#
+
+"""Tests for `Workflow.send_feedback` output."""
+
+from __future__ import print_function, unicode_literals, absolute_import
+
+import copy
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from xml.etree import cElementTree as ET
+
+mydir = os.path.abspath(os.path.dirname(__file__))
+wfdir = os.path.abspath(os.path.join(mydir, '../src'))
+
+sys.path.insert(0, wfdir)
+
+# Keep test cache and data away from Alfred's
+TEMPDIR = tempfile.mkdtemp()
+os.environ[b'alfred_workflow_cache'] = os.path.join(TEMPDIR, b'cache')
+os.environ[b'alfred_workflow_data'] = os.path.join(TEMPDIR, b'data')
+
+from cStringIO import StringIO
+
+from workflow import Workflow
+
+ITEMS = [
+    dict(title='Title', subtitle='Subtitle'),
+    dict(title='Ünïcödé <&> "quotes"', subtitle='Line 1\nLine 2',
+         arg='a & b', autocomplete='', valid=True, uid='uid "1"',
+         icon='icon.png', icontype='filetype', type='file',
+         largetext='large <text>', copytext='copy & paste',
+         modifier_subtitles={'cmd': 'Cmd <sub>', 'alt': 'Alt'}),
+    dict(title='', subtitle=''),
+]
+
+
+class FeedbackTests(unittest.TestCase):
+    """XML and JSON feedback."""
+
+    def feedback(self, feedback_format):
+        """Return output of `send_feedback` for `ITEMS`."""
+        wf = Workflow(feedback_format=feedback_format)
+        for kwargs in ITEMS:
+            wf.add_item(**copy.deepcopy(kwargs))
+
+        stdout = sys.stdout
+        sys.stdout = StringIO()
+        try:
+            wf.send_feedback()
+            return wf, sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+
+    def test_xml(self):
+        """XML feedback is the same as ElementTree's"""
+        wf, output = self.feedback('xml')
+        self.assertTrue(output.startswith(
+            b'<?xml version="1.0" encoding="utf-8"?>\n'))
+        root = ET.Element('items')
+        for item in wf._items:
+            root.append(item.elem)
+        self.assertEqual(ET.tostring(ET.fromstring(output)),
+                         ET.tostring(root))
+
+    def test_json(self):
+        """JSON feedback"""
+        wf, output = self.feedback('json')
+        items = json.loads(output)['items']
+        self.assertEqual(len(items), len(ITEMS))
+        self.assertEqual(items[0], {'title': 'Title', 'subtitle': 'Subtitle',
+                                    'valid': False})
+        item = items[1]
+        self.assertEqual(item['title'], ITEMS[1]['title'])
+        self.assertEqual(item['autocomplete'], '')
+        self.assertEqual(item['valid'], True)
+        self.assertEqual(item['icon'], {'path': 'icon.png',
+                                        'type': 'filetype'})
+        self.assertEqual(item['mods']['cmd'], {'subtitle': 'Cmd <sub>'})
+        self.assertEqual(item['text'], {'largetype': 'large <text>',
+                                        'copy': 'copy & paste'})
+
+    def test_cached(self):
+        """Serialised items are cached until changed"""
+        wf, _ = self.feedback('xml')
+        item = wf._items[1]
+        xml = item.xml
+        self.assertIs(item.xml, xml)
+        self.assertIs(item.json, item.json)
+
+        item.title = 'New title'
+        self.assertIn(b'<title>New title</title>', item.xml)
+        item.modifier_subtitles['cmd'] = 'New cmd'
+        self.assertIn(b'<subtitle mod="cmd">New cmd</subtitle>', item.xml)
+        self.assertIn(b'New cmd', item.json)
+
+    def test_slots(self):
+        """Items have no instance dict"""
+        wf, _ = self.feedback('xml')
+        with self.assertRaises(AttributeError):
+            wf._items[0].tilte = 'Typo'
+
+    def test_bad_format(self):
+        """Unknown feedback format"""
+        with self.assertRaises(ValueError):
+            Workflow(feedback_format='yaml')
+
+
+def tearDownModule():
+    shutil.rmtree(TEMPDIR)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,344 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright © 2015 deanishe@deanishe.net
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2015-10-04
+#
+
+"""Tests for `workflow.update` against a local stand-in GitHub API."""
+
+from __future__ import print_function, unicode_literals, absolute_import
+
+import BaseHTTPServer
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+mydir = os.path.abspath(os.path.dirname(__file__))
+wfdir = os.path.abspath(os.path.join(mydir, '../src'))
+
+sys.path.insert(0, wfdir)
+
+# Keep test cache and data away from Alfred's
+TEMPDIR = tempfile.mkdtemp()
+os.environ[b'alfred_workflow_cache'] = os.path.join(TEMPDIR, b'cache')
+os.environ[b'alfred_workflow_data'] = os.path.join(TEMPDIR, b'data')
+
+from workflow import update
+
+SLUG = 'deanishe/alfred-flixsearch'
+
+
+def release(version, files=('FlixSearch.alfredworkflow',),
+            prerelease=False):
+    """Return GitHub API release for ``version``."""
+    url = 'https://github.com/{0}/releases/download/{1}/{{0}}'.format(
+        SLUG, version)
+    return {
+        'tag_name': version,
+        'prerelease': prerelease,
+        'assets': [{'browser_download_url': url.format(name), 'size': 10}
+                   for name in files],
+    }
+
+
+class StandInAPI(BaseHTTPServer.HTTPServer):
+    """Serves releases like GitHub's API, including ETags."""
+
+    def __init__(self):
+        BaseHTTPServer.HTTPServer.__init__(self, (b'127.0.0.1', 0),
+                                           StandInHandler)
+        self.releases = []
+        self.etag = b'"v1"'
+        # Request paths and If-None-Match headers received
+        self.requests = []
+        # Downloadable files: {name: data}
+        self.files = {}
+        # ETag of downloadable files
+        self.file_etag = b'"f1"'
+        # Range headers received
+        self.ranges = []
+
+
+class StandInHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Handler for `StandInAPI`."""
+
+    def do_GET(self):
+        api = self.server
+        api.requests.append((self.path, self.headers.get('if-none-match')))
+
+        if self.path.startswith(b'/download/'):
+            self.send_file(self.path[len(b'/download/'):])
+            return
+
+        if not self.path.startswith(b'/repos/{0}/releases'.format(SLUG)):
+            self.send_error(404)
+            return
+
+        if self.headers.get('if-none-match') == api.etag:
+            self.send_response(304)
+            self.send_header(b'ETag', api.etag)
+            self.end_headers()
+            return
+
+        body = json.dumps(api.releases)
+        self.send_response(200)
+        self.send_header(b'Content-Type', b'application/json')
+        self.send_header(b'Content-Length', str(len(body)))
+        self.send_header(b'ETag', api.etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_file(self, name):
+        """Send file ``name``, honouring Range header."""
+        data = self.server.files[name]
+        start = 0
+        range_ = self.headers.get('range')
+        self.server.ranges.append(range_)
+        if self.headers.get('if-range') not in (None, self.server.file_etag):
+            range_ = None  # File has changed: send all of it
+
+        if range_:
+            start = int(range_[len('bytes='):].rstrip('-'))
+            if start >= len(data):
+                self.send_error(416)
+                return
+            self.send_response(206)
+            self.send_header(b'Content-Range', b'bytes {0}-{1}/{2}'.format(
+                             start, len(data) - 1, len(data)))
+        else:
+            self.send_response(200)
+
+        self.send_header(b'Content-Type', b'application/octet-stream')
+        self.send_header(b'Content-Length', str(len(data) - start))
+        self.send_header(b'ETag', self.server.file_etag)
+        self.end_headers()
+        self.wfile.write(data[start:])
+
+    def log_message(self, *args):
+        pass
+
+
+class UpdateTests(unittest.TestCase):
+    """Release checks against `StandInAPI`."""
+
+    def setUp(self):
+        self.api = StandInAPI()
+        self.api.releases = [
+            release('v2.0', prerelease=True),
+            release('v1.3', files=('a.alfredworkflow', 'b.alfredworkflow')),
+            release('v1.2'),
+            release('v1.1', files=('README.md',)),
+            release('v1.0'),
+        ]
+        self.thread = threading.Thread(target=self.api.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self._releases_base = update.RELEASES_BASE
+        update.RELEASES_BASE = ('http://127.0.0.1:{0}/repos/{{0}}/releases'
+                                .format(self.api.server_port))
+        update.wf().clear_cache()
+
+    def tearDown(self):
+        update.RELEASES_BASE = self._releases_base
+        self.api.shutdown()
+        self.api.server_close()
+
+    def test_valid_releases(self):
+        """Invalid releases are skipped"""
+        releases = update.get_valid_releases(SLUG)
+        self.assertEqual([r['version'] for r in releases], ['v1.2', 'v1.0'])
+        self.assertTrue(releases[0]['download_url'].endswith(
+                        'FlixSearch.alfredworkflow'))
+
+    def test_first_page_only(self):
+        """Only the first page of releases is requested"""
+        update.get_valid_releases(SLUG)
+        path = self.api.requests[0][0]
+        self.assertIn(b'per_page={0}'.format(update.RELEASES_PER_PAGE), path)
+
+    def test_not_modified(self):
+        """Cached releases are used if API returns 304"""
+        first = update.get_valid_releases(SLUG)
+        self.assertEqual(self.api.requests[0][1], None)
+
+        # Changes the server doesn't report are invisible
+        self.api.releases = []
+        second = update.get_valid_releases(SLUG)
+        self.assertEqual(self.api.requests[1][1], self.api.etag)
+        self.assertEqual(first, second)
+
+    def test_modified(self):
+        """New releases are fetched when ETag changes"""
+        update.get_valid_releases(SLUG)
+        self.api.releases.insert(0, release('v1.4'))
+        self.api.etag = b'"v2"'
+        releases = update.get_valid_releases(SLUG)
+        self.assertEqual(releases[0]['version'], 'v1.4')
+
+    def test_old_cache_format(self):
+        """Raw API responses cached by old versions are ignored"""
+        update.wf().cache_data('gh-releases-deanishe-alfred-flixsearch',
+                               self.api.releases)
+        releases = update.get_valid_releases(SLUG)
+        self.assertEqual(self.api.requests[0][1], None)
+        self.assertEqual(len(releases), 2)
+
+    def test_check_update(self):
+        """Update available if newer valid release exists"""
+        self.assertTrue(update.check_update(SLUG, '1.1'))
+        self.assertFalse(update.check_update(SLUG, '1.2'))
+
+    def test_update_stamp(self):
+        """Update status is read from stamp file"""
+        wf = update.wf()
+        update.check_update(SLUG, '1.1')
+        self.assertTrue(wf.update_available)
+        # Cached status isn't read if stamp exists
+        wf.clear_cache(lambda name: name.endswith('.cpickle'))
+        self.assertTrue(wf.update_available)
+        update.check_update(SLUG, '1.2')
+        self.assertFalse(wf.update_available)
+
+    def test_update_not_due(self):
+        """Update check isn't started before stamp mtime"""
+        wf = update.wf()
+        wf._update_settings = {'github_slug': SLUG}
+        wf._write_update_stamp(next_check=time.time() + 3600)
+        wf.check_update()
+        self.assertEqual(self.api.requests, [])
+
+
+class DownloadTests(unittest.TestCase):
+    """Workflow downloads from `StandInAPI`."""
+
+    def setUp(self):
+        self.api = StandInAPI()
+        self.data = os.urandom(300000)
+        self.api.files[b'Test.alfredworkflow'] = self.data
+        self.digest = 'sha256:' + hashlib.sha256(self.data).hexdigest()
+        self.thread = threading.Thread(target=self.api.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.url = 'http://127.0.0.1:{0}/download/Test.alfredworkflow'.format(
+            self.api.server_port)
+        update.wf().clear_cache()
+        self.part_path = self.partial(self.url)
+
+    def partial(self, url, data=None, validator=None):
+        """Return path of partial download of ``url``.
+
+        If ``data`` is given, write it to the file, and ``validator``
+        (default: the file's current ETag) alongside it.
+        """
+        part_path = update.wf().cachefile('Test.alfredworkflow.{0}.part'.format(
+            hashlib.sha1(url).hexdigest()))
+        if data is not None:
+            with open(part_path, 'wb') as fp:
+                fp.write(data)
+            with open(part_path + '.validator', 'wb') as fp:
+                fp.write(validator or self.api.file_etag)
+        return part_path
+
+    def tearDown(self):
+        self.api.shutdown()
+        self.api.server_close()
+
+    def test_download(self):
+        """Download is streamed to disk and verified"""
+        calls = []
+        path = update.download_workflow(
+            self.url, len(self.data), self.digest,
+            progress=lambda done, total: calls.append((done, total)))
+
+        with open(path, 'rb') as fp:
+            self.assertEqual(fp.read(), self.data)
+        self.assertFalse(os.path.exists(self.part_path))
+        self.assertEqual(self.api.ranges, [None])
+        self.assertTrue(len(calls) > 1)
+        self.assertEqual(calls[-1], (len(self.data), len(self.data)))
+
+    def test_resume(self):
+        """Interrupted download is resumed"""
+        self.partial(self.url, self.data[:100000])
+
+        path = update.download_workflow(self.url, len(self.data),
+                                        self.digest)
+
+        with open(path, 'rb') as fp:
+            self.assertEqual(fp.read(), self.data)
+        self.assertEqual(self.api.ranges, ['bytes=100000-'])
+        self.assertEqual(os.listdir(update.wf().cachedir),
+                         ['Test.alfredworkflow'])
+
+    def test_resume_changed_file(self):
+        """Download restarts if file has changed since it was started"""
+        self.partial(self.url, b'x' * 100000, validator=b'"f0"')
+
+        path = update.download_workflow(self.url, len(self.data),
+                                        self.digest)
+
+        with open(path, 'rb') as fp:
+            self.assertEqual(fp.read(), self.data)
+        self.assertEqual(self.api.ranges, ['bytes=100000-'])
+
+    def test_other_release_not_resumed(self):
+        """Partial download of another URL isn't resumed"""
+        other = self.partial(self.url.replace('download', 'download/v0'),
+                             b'x' * 100000)
+
+        update.download_workflow(self.url)
+
+        self.assertEqual(self.api.ranges, [None])
+        self.assertTrue(os.path.exists(other))
+
+    def test_no_validator_not_resumed(self):
+        """Partial download without a validator isn't resumed"""
+        with open(self.part_path, 'wb') as fp:
+            fp.write(b'x' * 100000)
+
+        path = update.download_workflow(self.url)
+
+        with open(path, 'rb') as fp:
+            self.assertEqual(fp.read(), self.data)
+        self.assertEqual(self.api.ranges, [None])
+
+    def test_resume_complete(self):
+        """Completely downloaded file is not downloaded again"""
+        self.partial(self.url, self.data)
+
+        path = update.download_workflow(self.url, len(self.data),
+                                        self.digest)
+
+        with open(path, 'rb') as fp:
+            self.assertEqual(fp.read(), self.data)
+
+    def test_bad_checksum(self):
+        """Corrupt download is rejected and deleted"""
+        self.partial(self.url, b'x' * 100000)
+
+        with self.assertRaises(ValueError):
+            update.download_workflow(self.url, len(self.data), self.digest)
+        self.assertFalse(os.path.exists(self.part_path))
+
+    def test_bad_size(self):
+        """Download of wrong size is rejected"""
+        with self.assertRaises(ValueError):
+            update.download_workflow(self.url, len(self.data) + 1)
+
+
+def tearDownModule():
+    shutil.rmtree(TEMPDIR)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright © 2015 deanishe@deanishe.net
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2015-10-04
+#
+
+"""Tests for `workflow.web` record/replay transport."""
+
+from __future__ import print_function, unicode_literals, absolute_import
+
+import BaseHTTPServer
+import os
+import shutil
+import StringIO
+import sys
+import tempfile
+import threading
+import time
+import unittest
+import urllib2
+
+mydir = os.path.abspath(os.path.dirname(__file__))
+wfdir = os.path.abspath(os.path.join(mydir, '../src'))
+
+sys.path.insert(0, wfdir)
+
+# Keep test cache and data away from Alfred's
+TEMPDIR = tempfile.mkdtemp()
+os.environ[b'alfred_workflow_cache'] = os.path.join(TEMPDIR, b'cache')
+os.environ[b'alfred_workflow_data'] = os.path.join(TEMPDIR, b'data')
+
+from workflow import web
+
+# Header values that aren't UTF-8
+TITLE = b'Am\xe9lie \x96 2001'
+
+# Pages served by `StandInServer`: {path: (status, body)}
+PAGES = {
+    b'/film': (200, b'<html><title>Am\xc3\xa9lie</title></html>'),
+    b'/missing': (404, b'No such film'),
+}
+
+
+class StandInServer(BaseHTTPServer.HTTPServer):
+    """Serves `PAGES` and counts requests."""
+
+    def __init__(self):
+        BaseHTTPServer.HTTPServer.__init__(self, (b'127.0.0.1', 0),
+                                           StandInHandler)
+        self.requests = 0
+
+
+class StandInHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Handler for `StandInServer`."""
+
+    def do_GET(self):
+        self.server.requests += 1
+        status, body = PAGES[self.path]
+        self.send_response(status)
+        self.send_header(b'Content-Type', b'text/html; charset=utf-8')
+        self.send_header(b'X-Title', TITLE)
+        self.send_header(b'Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class RecordReplayTests(unittest.TestCase):
+    """Record responses from a local server and replay them."""
+
+    def setUp(self):
+        self.fixtures = os.path.join(TEMPDIR, 'fixtures')
+        self.server = StandInServer()
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.url = 'http://127.0.0.1:{0}'.format(self.server.server_port)
+
+    def tearDown(self):
+        web.transport = None
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        if os.path.exists(self.fixtures):
+            shutil.rmtree(self.fixtures)
+
+    def test_round_trip(self):
+        """Recorded response is replayed without network"""
+        web.transport = web.RecordReplayTransport(self.fixtures, 'record')
+        recorded = web.get(self.url + '/film')
+        self.assertEqual(self.server.requests, 1)
+
+        web.transport = web.RecordReplayTransport(self.fixtures, 'replay')
+        replayed = web.get(self.url + '/film')
+        self.assertEqual(self.server.requests, 1)
+
+        self.assertEqual(replayed.status_code, 200)
+        self.assertEqual(replayed.url, recorded.url)
+        self.assertEqual(replayed.headers, recorded.headers)
+        self.assertEqual(replayed.headers['x-title'], TITLE)
+        self.assertEqual(replayed.encoding, 'utf-8')
+        self.assertEqual(replayed.text, '<html><title>Amélie</title>'
+                                        '</html>')
+
+    def test_replay_error(self):
+        """Recorded error is raised again on replay"""
+        web.transport = web.RecordReplayTransport(self.fixtures, 'record')
+        web.get(self.url + '/missing')
+
+        transport = web.RecordReplayTransport(self.fixtures, 'replay')
+        request = urllib2.Request(self.url + '/missing')
+        with self.assertRaises(urllib2.HTTPError) as cm:
+            transport.open(request)
+        err = cm.exception
+        self.assertEqual(err.code, 404)
+        self.assertEqual(err.geturl(), self.url + '/missing')
+        self.assertEqual(err.info()['x-title'], TITLE)
+        self.assertEqual(err.read(), b'No such film')
+        err.close()
+
+        web.transport = transport
+        r = web.get(self.url + '/missing')
+        self.assertEqual(r.status_code, 404)
+        self.assertRaises(urllib2.HTTPError, r.raise_for_status)
+        self.assertEqual(self.server.requests, 1)
+
+    def test_replay_unknown(self):
+        """Unknown request raises `URLError` on replay"""
+        web.transport = web.RecordReplayTransport(self.fixtures, 'replay')
+        self.assertRaises(urllib2.URLError, web.get, self.url + '/film')
+        self.assertEqual(self.server.requests, 0)
+
+    def test_auto(self):
+        """Auto mode records only unknown requests"""
+        web.transport = web.RecordReplayTransport(self.fixtures, 'auto')
+        for i in range(3):
+            self.assertEqual(web.get(self.url + '/film').status_code, 200)
+        self.assertEqual(self.server.requests, 1)
+
+    def test_latency(self):
+        """Replayed responses are delayed by the profile's latency"""
+        web.transport = web.RecordReplayTransport(self.fixtures, 'record')
+        web.get(self.url + '/film')
+        web.transport = web.RecordReplayTransport(self.fixtures, 'replay',
+                                                  latency=0.2)
+        start = time.time()
+        web.get(self.url + '/film')
+        self.assertTrue(time.time() - start >= 0.2)
+
+
+class ProfileTests(unittest.TestCase):
+    """Network profiles and throttling."""
+
+    def test_profile(self):
+        """Profile sets latency and bandwidth"""
+        transport = web.RecordReplayTransport(TEMPDIR, latency=5,
+                                              bandwidth=5, profile='3g')
+        self.assertEqual((transport.latency, transport.bandwidth),
+                         web.PROFILES['3g'])
+        for latency, bandwidth in web.PROFILES.values():
+            self.assertTrue(latency >= 0)
+            self.assertTrue(bandwidth >= 0)
+
+    def test_invalid(self):
+        """Unknown profiles and modes are rejected"""
+        self.assertRaises(ValueError, web.RecordReplayTransport, TEMPDIR,
+                          profile='dialup')
+        self.assertRaises(ValueError, web.RecordReplayTransport, TEMPDIR,
+                          mode='rewind')
+
+    def test_throttle(self):
+        """Reads take as long as the bandwidth allows"""
+        data = b'x' * 20000
+        reader = web._ThrottledReader(StringIO.StringIO(data), 100000)
+        start = time.time()
+        chunks = [reader.read(5000) for i in range(5)]
+        elapsed = time.time() - start
+        reader.close()
+        self.assertEqual(b''.join(chunks), data)
+        self.assertEqual(chunks[-1], b'')
+        self.assertTrue(elapsed >= 0.2)
+        self.assertTrue(elapsed < 1)
+
+    def test_unthrottled(self):
+        """Bandwidth of 0 doesn't limit reads"""
+        reader = web._ThrottledReader(StringIO.StringIO(b'x' * 10), 0)
+        start = time.time()
+        self.assertEqual(reader.read(), b'x' * 10)
+        self.assertTrue(time.time() - start < 0.1)
+
+
+def tearDownModule():
+    shutil.rmtree(TEMPDIR)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright © 2015 deanishe@deanishe.net
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2015-10-04
+#
+
+"""
+Benchmark the durability/speed tradeoff of `workflow.atomic_writer`.
+
+Compares a plain `open()` with `atomic_writer` with and without
+`fsync` for payloads the size of typical settings and cache files.
+"""
+
+from __future__ import print_function, unicode_literals, absolute_import
+
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+mydir = os.path.abspath(os.path.dirname(__file__))
+wfdir = os.path.abspath(os.path.join(mydir, '../src'))
+
+sys.path.insert(0, wfdir)
+
+from workflow.workflow import atomic_writer
+
+# Payload sizes in bytes
+SIZES = [256, 64 * 1024, 1024 * 1024]
+NUMBER = 50
+
+
+def plain(path, data):
+    """Write ``data`` to ``path`` with `open()`."""
+    with open(path, 'wb') as fp:
+        fp.write(data)
+
+
+def atomic(path, data):
+    """Write ``data`` to ``path`` with `atomic_writer`."""
+    with atomic_writer(path, 'wb') as fp:
+        fp.write(data)
+
+
+def durable(path, data):
+    """Write ``data`` to ``path`` with `atomic_writer` and `fsync`."""
+    with atomic_writer(path, 'wb', fsync=True) as fp:
+        fp.write(data)
+
+
+def main():
+    """Run benchmarks."""
+    tempdir = tempfile.mkdtemp(dir=mydir)
+    path = os.path.join(tempdir, 'test.dat')
+    try:
+        for size in SIZES:
+            data = os.urandom(size)
+            results = []
+            for func in (plain, atomic, durable):
+                t = timeit.timeit(lambda: func(path, data), number=NUMBER)
+                results.append(t / NUMBER * 1000)
+
+            print('{0:8d} bytes : plain {1:7.3f}ms  atomic {2:7.3f}ms  '
+                  'atomic+fsync {3:7.3f}ms'.format(size, *results))
+    finally:
+        shutil.rmtree(tempdir)
+
+
+if __name__ == '__main__':
+    main()
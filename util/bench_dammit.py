@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright © 2015 deanishe@deanishe.net
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2015-10-04
+#
+
+"""
+Benchmark `bs4.dammit.UnicodeDammit` encoding detection on large pages.
+
+Each document is converted with the default prescan and trial chunk
+sizes, and with both set larger than the document, which is how
+`UnicodeDammit` used to search and decode.
+"""
+
+from __future__ import print_function, unicode_literals, absolute_import
+
+import os
+import sys
+import timeit
+
+mydir = os.path.abspath(os.path.dirname(__file__))
+wfdir = os.path.abspath(os.path.join(mydir, '../src'))
+
+sys.path.insert(0, wfdir)
+
+from bs4.dammit import UnicodeDammit
+
+# Page size in KB
+SIZE = 4096
+NUMBER = 5
+
+CARD = ('<div class="card"><span class="card-title">Amélie – {0}</span>'
+        '<meta itemprop="name" content="Amélie"></div>')
+
+
+def make_page(encoding, meta=True, bad=b''):
+    """Return page of ``SIZE`` KB encoded with ``encoding``.
+
+    ``bad`` is inserted near the top of the body.
+    """
+    head = '<!DOCTYPE html><html><head><title>Test</title>'
+    if meta:
+        head += '<meta charset="{0}">'.format(encoding)
+    head += '</head><body>'
+    cards = ''.join(CARD.format(i) for i in range(SIZE * 1024 // len(CARD)))
+    return (head.encode(encoding) + bad + cards.encode(encoding) +
+            b'</body></html>')
+
+
+class OldDammit(UnicodeDammit):
+    """Searches and decodes whole documents."""
+
+    TRIAL_CHUNK_BYTES = sys.maxint
+
+
+# (description, document)
+DOCUMENTS = [
+    ('utf-8, declared', make_page('utf-8')),
+    ('cp1252, declared', make_page('windows-1252')),
+    ('cp1252, undeclared', make_page('windows-1252', meta=False)),
+    ('utf-8, bad byte', make_page('utf-8', meta=False, bad=b'\x97')),
+]
+
+
+def main():
+    """Run benchmarks."""
+    for desc, doc in DOCUMENTS:
+        results = []
+        for cls, prescan in ((OldDammit, len(doc)), (UnicodeDammit, None)):
+            t = timeit.timeit(
+                lambda: cls(doc, is_html=True, prescan_bytes=prescan),
+                number=NUMBER)
+            results.append(t / NUMBER * 1000)
+        encoding = UnicodeDammit(doc, is_html=True).original_encoding
+        print('{0:20s} : {1:14s} whole {2:7.2f}ms  bounded {3:7.2f}ms'
+              .format(desc, encoding, *results))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright © 2015 deanishe@deanishe.net
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2015-10-04
+#
+
+"""
+Benchmark `docopt` argument parsing of `flix.py`'s usage.
+
+Compares parsing the usage on every call with loading the compiled
+grammar from the cache, and the generic matcher with the fast path
+for flat subcommand grammars.
+"""
+
+from __future__ import print_function, unicode_literals, absolute_import
+
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+mydir = os.path.abspath(os.path.dirname(__file__))
+wfdir = os.path.abspath(os.path.join(mydir, '../src'))
+
+sys.path.insert(0, wfdir)
+
+import docopt
+import flix
+
+ARGVS = [
+    ['search', 'star trek'],
+    ['countries'],
+    ['activate', 'UK'],
+]
+NUMBER = 200
+
+
+def timed(func):
+    """Return time in ms taken by ``func``."""
+    return min(timeit.repeat(func, number=NUMBER, repeat=5)) / NUMBER * 1000
+
+
+def main():
+    """Run benchmarks."""
+    doc = flix.__doc__
+    tempdir = tempfile.mkdtemp()
+    try:
+        def cached():
+            docopt._grammars.clear()
+            return docopt.compile_doc(doc, tempdir)
+
+        t_parse = timed(lambda: docopt.Grammar(doc))
+        t_cached = timed(cached)
+        print('compile : parse {0:6.3f}ms  from cache {1:6.3f}ms'.format(
+              t_parse, t_cached))
+
+        grammar = docopt.compile_doc(doc)
+        generic = docopt.Grammar(doc)
+        generic.commands = None
+        for argv in ARGVS:
+            print('{0:20s} : generic {1:6.3f}ms  flat {2:6.3f}ms'.format(
+                  ' '.join(argv), timed(lambda: generic.match(argv)),
+                  timed(lambda: grammar.match(argv))))
+    finally:
+        shutil.rmtree(tempdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright © 2015 deanishe@deanishe.net
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2015-10-04
+#
+
+"""
+Benchmark `workflow.web.Response` encoding detection on large pages.
+
+Compares the old whole-document regex search with the bounded
+prescan used by `Response._get_encoding`.
+"""
+
+from __future__ import print_function, unicode_literals, absolute_import
+
+import os
+import re
+import shutil
+import sys
+import tempfile
+import timeit
+
+mydir = os.path.abspath(os.path.dirname(__file__))
+wfdir = os.path.abspath(os.path.join(mydir, '../src'))
+
+sys.path.insert(0, wfdir)
+
+from workflow import web
+
+# Page sizes to test (in KB). The pages are minified, contain
+# microdata <meta> tags and have no charset declaration (i.e. the
+# encoding is only specified in the HTTP headers), which is the
+# worst case for the old regex.
+SIZES = [64, 256, 512, 2048, 8192]
+# The old regex is quadratic on such pages, so skip it on big ones
+OLD_MAX_SIZE = 512
+REPEAT = 3
+
+CARD = (b'<div class="card"><div class="card-image">'
+        b'<a href="/title/some-film-2015"><img src="/img.jpg"></a>'
+        b'<span class="card-title">Some Film</span>'
+        b'<meta itemprop="name" content="Some Film"></div></div>')
+
+
+def make_page(kilobytes):
+    """Return minified HTML page of roughly ``kilobytes`` KB."""
+    head = b'<!DOCTYPE html><html><head><title>Test</title></head><body>'
+    count = (kilobytes * 1024) // len(CARD)
+    return head + CARD * count + b'</body></html>'
+
+
+def old_sniff(content):
+    """Encoding detection as it was before bounded prescan."""
+    m = re.search(b"""<meta.+charset=["']{0,1}(.+?)["'].*>""", content)
+    if m:
+        return m.group(1)
+
+
+def main():
+    """Run benchmarks."""
+    tempdir = tempfile.mkdtemp()
+    try:
+        for size in SIZES:
+            path = os.path.join(tempdir, 'page-{0}.html'.format(size))
+            with open(path, 'wb') as fp:
+                fp.write(make_page(size))
+
+            r = web.get('file://' + path)
+            content = r.content
+            r.encoding  # populate cache
+
+            if size <= OLD_MAX_SIZE:
+                t_old = '{0:8.4f}s'.format(min(timeit.repeat(
+                    lambda: old_sniff(content), number=1, repeat=REPEAT)))
+            else:
+                t_old = '     n/a '
+
+            t_new = min(timeit.repeat(lambda: r._get_encoding(),
+                                      number=1, repeat=REPEAT))
+            t_memo = min(timeit.repeat(lambda: r.encoding,
+                                       number=1, repeat=REPEAT))
+
+            print('{0:5d} KB : old regex {1}  prescan {2:8.4f}s  '
+                  'memoised {3:8.6f}s'.format(size, t_old, t_new, t_memo))
+    finally:
+        shutil.rmtree(tempdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright © 2015 deanishe@deanishe.net
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2015-10-04
+#
+
+"""
+Benchmark HTML entity decoding on entity-dense markup.
+
+Compares a regex callback per entity (the old `flix.unescape`), bs4's
+HTML 4 fallback and html5lib's shared tables for decoding strings, and
+the trie lookups the html5lib tokenizer used to make against the
+precomputed prefix table it uses now. Finally the whole page is
+tokenized.
+"""
+
+from __future__ import print_function, unicode_literals, absolute_import
+
+import htmlentitydefs
+import os
+import random
+import re
+import sys
+import timeit
+
+mydir = os.path.abspath(os.path.dirname(__file__))
+wfdir = os.path.abspath(os.path.join(mydir, '../src'))
+
+sys.path.insert(0, wfdir)
+
+from bs4.dammit import EntitySubstitution
+from html5lib.constants import entities
+from html5lib.entities import entitiesTrie, entityPrefixes, unescape
+from html5lib.tokenizer import HTMLTokenizer
+
+# Number of titles on the page
+TITLES = 2000
+NUMBER = 10
+
+# Common entities in titles, and some that aren't entities
+REFERENCES = ['&amp;', '&#39;', '&quot;', '&eacute;', '&#x2013;', '&hellip;',
+              '&ouml;', '&nbsp;', '&#8217;', '&bogus;', '&amp']
+
+
+def page():
+    """Return text of ``TITLES`` titles full of entities."""
+    rand = random.Random(42)
+    titles = []
+    for i in range(TITLES):
+        words = []
+        for j in range(6):
+            words.append('Word{0}'.format(j))
+            words.append(rand.choice(REFERENCES))
+        titles.append(' '.join(words))
+    return '\n'.join(titles)
+
+
+def callback(text):
+    """Decode ``text`` with a regex callback per entity."""
+    def fixup(m):
+        text = m.group(0)
+        if text[:2] == '&#':
+            try:
+                if text[:3] == '&#x':
+                    return unichr(int(text[3:-1], 16))
+                else:
+                    return unichr(int(text[2:-1]))
+            except ValueError:
+                pass
+        else:
+            try:
+                text = unichr(htmlentitydefs.name2codepoint[text[1:-1]])
+            except KeyError:
+                pass
+        return text
+
+    return re.sub('&#?\w+;', fixup, text)
+
+
+def html4(text):
+    """Decode ``text`` with bs4's HTML 4 fallback."""
+    return EntitySubstitution.HTML_ENTITY_RE.sub(
+        EntitySubstitution._decode_html_entity, text)
+
+
+def match_trie(names):
+    """Find longest entities at the start of ``names`` with the trie."""
+    for name in names:
+        stack = [name[0]]
+        i = 1
+        while entitiesTrie.has_keys_with_prefix(''.join(stack)):
+            stack.append(name[i:i + 1])
+            i += 1
+        try:
+            entitiesTrie.longest_prefix(''.join(stack[:-1]))
+        except KeyError:
+            pass
+
+
+def match_table(names):
+    """Find longest entities at the start of ``names`` with the table."""
+    for name in names:
+        prefix = ''
+        for char in name:
+            if prefix + char not in entityPrefixes:
+                break
+            prefix += char
+        entityPrefixes[prefix]
+
+
+def main():
+    """Run benchmarks."""
+    text = page()
+    print('{0} titles, {1} characters, {2} references'.format(
+        TITLES, len(text), text.count('&')))
+
+    for name, func in (('callback', callback), ('html4', html4),
+                       ('tables', unescape)):
+        t = timeit.timeit(lambda: func(text), number=NUMBER)
+        print('{0:15s} : {1:7.2f}ms'.format(name, t / NUMBER * 1000))
+
+    names = [part.split(' ')[0] + ' ' for part in text.split('&')[1:]]
+    names += [name + ' ' for name in entities]
+    for desc, func in (('tokenizer trie', match_trie),
+                       ('tokenizer table', match_table)):
+        t = timeit.timeit(lambda: func(names), number=NUMBER)
+        print('{0:15s} : {1:7.2f}ms  ({2} names)'.format(
+            desc, t / NUMBER * 1000, len(names)))
+
+    markup = '<p>{0}</p>'.format(text.replace('\n', '</p><p>'))
+    t = timeit.timeit(lambda: list(HTMLTokenizer(markup)), number=1)
+    print('{0:15s} : {1:7.2f}ms'.format('tokenize page', t * 1000))
+
+
+if __name__ == '__main__':
+    main()
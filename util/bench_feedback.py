@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright © 2015 deanishe@deanishe.net
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2015-10-04
+#
+
+"""
+Benchmark serialisation of `workflow.Item` feedback.
+
+Compares building an ElementTree from `Item.elem` with the
+template-based `Item.xml`, both fresh and cached.
+"""
+
+from __future__ import print_function, unicode_literals, absolute_import
+
+import os
+import sys
+import timeit
+
+mydir = os.path.abspath(os.path.dirname(__file__))
+wfdir = os.path.abspath(os.path.join(mydir, '../src'))
+
+sys.path.insert(0, wfdir)
+
+from workflow.workflow import Item
+
+try:
+    import xml.etree.cElementTree as ET
+except ImportError:  # pragma: no cover
+    import xml.etree.ElementTree as ET
+
+COUNTS = [10, 100, 1000]
+REPEAT = 5
+
+
+def make_items(count):
+    """Return ``count`` typical search results."""
+    return [Item('Film & Series {0}'.format(i),
+                 'Netflix <US> · 2015 · {0} min'.format(i),
+                 modifier_subtitles={'cmd': 'Open on IMDb'},
+                 arg='http://www.netflix.com/title/{0}'.format(i),
+                 valid=True, uid='film-{0}'.format(i), icon='icon.png')
+            for i in range(count)]
+
+
+def tree(items):
+    """Serialise ``items`` via ElementTree."""
+    root = ET.Element('items')
+    for item in items:
+        root.append(item.elem)
+    return ET.tostring(root).encode('utf-8')
+
+
+def fragments(items):
+    """Serialise ``items`` via `Item.xml`."""
+    return b''.join([item.xml for item in items])
+
+
+def main():
+    """Run benchmarks."""
+    for count in COUNTS:
+        t_tree = min(timeit.repeat(lambda: tree(make_items(count)),
+                                   number=1, repeat=REPEAT))
+        t_fresh = min(timeit.repeat(lambda: fragments(make_items(count)),
+                                    number=1, repeat=REPEAT))
+        items = make_items(count)
+        t_cached = min(timeit.repeat(lambda: fragments(items),
+                                     number=1, repeat=REPEAT))
+
+        print('{0:5d} items : ElementTree {1:8.5f}s  templates {2:8.5f}s  '
+              'cached {3:8.5f}s'.format(count, t_tree, t_fresh, t_cached))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright © 2015 deanishe@deanishe.net
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2015-10-04
+#
+
+"""
+Benchmark `find_all` and `select` on a large page of search results.
+
+The page is generated in the same shape as flixsearch.io's results.
+Each query is run against a plain soup and one built with
+``build_index=True``.
+"""
+
+from __future__ import print_function, unicode_literals, absolute_import
+
+import os
+import re
+import sys
+import timeit
+
+mydir = os.path.abspath(os.path.dirname(__file__))
+wfdir = os.path.abspath(os.path.join(mydir, '../src'))
+
+sys.path.insert(0, wfdir)
+
+from bs4 import BeautifulSoup
+
+# Number of results on the page
+CARDS = 500
+NUMBER = 20
+
+CARD = """
+<div class="col s12 m6 l4">
+ <div class="card">
+  <div class="card-image">
+   <a href="/title/{0}"><img src="/img/{0}.jpg" alt="Title {0}"></a>
+   <span class="card-title">Title {0}</span>
+  </div>
+  <div class="card-content">
+   <p>Year: 19{1:02d}</p>
+   <p>A film about <b>{0}</b> things.</p>
+  </div>
+  <div class="flags">
+   <img class="flag-post" title="UK" src="/flags/uk.png">
+   <img class="flag-post" title="USA" src="/flags/us.png">
+  </div>
+ </div>
+</div>
+"""
+
+# (description, function of soup)
+QUERIES = [
+    ('name', lambda soup: soup.find_all('img')),
+    ('class', lambda soup: soup.find_all('div', 'card')),
+    ('class list', lambda soup: soup.find_all(
+        class_=['card-title', 'flag-post'])),
+    ('attr regex', lambda soup: soup.find_all(
+        'a', href=re.compile(r'/title/1'))),
+    ('attr + limit', lambda soup: soup.find_all(
+        'img', title='USA', limit=50)),
+    ('text', lambda soup: soup.find_all(text='Title 250')),
+    ('card children', lambda soup: [
+        card.find('span', 'card-title') for card in soup.find_all(
+            'div', 'card')]),
+    ('select', lambda soup: soup.select('div.flags img.flag-post')),
+    ('select 3 steps', lambda soup: soup.select(
+        'div.card div.flags img.flag-post')),
+    ('select child', lambda soup: soup.select(
+        'div.card > div.card-image > a[href^="/title/"]')),
+]
+
+
+def page():
+    """Return HTML of a results page."""
+    cards = ''.join(CARD.format(i, i % 100) for i in range(CARDS))
+    return '<html><body><div class="row">{0}</div></body></html>'.format(
+        cards)
+
+
+def main():
+    """Run benchmarks."""
+    html = page()
+    plain = BeautifulSoup(html, 'html.parser')
+    indexed = BeautifulSoup(html, 'html.parser', build_index=True)
+
+    print('{0} results, {1} elements'.format(
+        CARDS, sum(1 for e in plain.descendants)))
+    for desc, query in QUERIES:
+        results = []
+        for soup in (plain, indexed):
+            t = timeit.timeit(lambda: query(soup), number=NUMBER)
+            results.append(t / NUMBER * 1000)
+        print('{0:15s} : {1:4d} found  scan {2:7.2f}ms  index {3:7.2f}ms'
+              .format(desc, len(query(plain)), *results))
+
+
+if __name__ == '__main__':
+    main()
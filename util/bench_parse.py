@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright © 2015 deanishe@deanishe.net
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2015-10-04
+#
+
+"""
+Benchmark parsing a large page of search results with html5lib.
+
+Compares building the whole document with building only the result
+cards via ``parse_only``, as `flix.py` does, each with ordinary and
+compact (``compact=True``) nodes. Reports parse time, the number of
+objects the finished soup keeps alive, the time a full garbage
+collection takes while it's alive, and how much peak RSS grew.
+
+Each variant is run in a fresh interpreter, so peak RSS isn't
+inherited from the previous one.
+"""
+
+from __future__ import print_function, unicode_literals, absolute_import
+
+import gc
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+mydir = os.path.abspath(os.path.dirname(__file__))
+wfdir = os.path.abspath(os.path.join(mydir, '../src'))
+
+sys.path.insert(0, wfdir)
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+from bench_find import page
+
+NUMBER = 5
+
+# Navigation, filters and footer around the results
+CHROME = """
+<nav class="top">{0}</nav>
+<aside><form><select name="country">{1}</select></form>
+<ul class="genres">{2}</ul></aside>
+"""
+FOOTER = """<footer><p>{0}</p><script>var x = 1;</script></footer>"""
+
+
+def full_page():
+    """Return HTML of a results page with navigation etc."""
+    chrome = CHROME.format(
+        ''.join('<a href="/nav/{0}">Link {0}</a>'.format(i)
+                for i in range(200)),
+        ''.join('<option value="{0}">Country {0}</option>'.format(i)
+                for i in range(250)),
+        ''.join('<li><a href="/genre/{0}"><span>Genre</span> {0}</a></li>'
+                .format(i) for i in range(400)))
+    footer = FOOTER.format('Small print. ' * 500)
+    return page().replace('<body>', '<body>' + chrome).replace(
+        '</body>', footer + '</body>')
+
+
+# Description and `BeautifulSoup` arguments of each variant
+VARIANTS = [
+    ('whole document', {}),
+    ('whole, compact', {'compact': True}),
+    ('cards only', {'parse_only': 'cards'}),
+    ('cards, compact', {'parse_only': 'cards', 'compact': True}),
+]
+
+
+def parse(html, **kwargs):
+    """Parse ``html`` and return (seconds, objects kept alive, GC seconds).
+
+    GC seconds is the time a full collection takes while the soup
+    is alive.
+    """
+    gc.collect()
+    before = len(gc.get_objects())
+    start = time.time()
+    soup = BeautifulSoup(html, 'html5lib', **kwargs)
+    elapsed = time.time() - start
+    start = time.time()
+    gc.collect()
+    collection = time.time() - start
+    objects = len(gc.get_objects()) - before
+    soup.decompose()
+    return elapsed, objects, collection
+
+
+def child(desc):
+    """Run variant ``desc`` and print results as JSON.
+
+    Called in a subprocess with ``--child``.
+
+    """
+    kwargs = dict(dict(VARIANTS)[desc])
+    if kwargs.get('parse_only') == 'cards':
+        kwargs['parse_only'] = SoupStrainer('div', 'card')
+
+    html = full_page()
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results = [parse(html, **kwargs) for i in range(NUMBER)]
+    print(json.dumps({
+        'elapsed': min(r[0] for r in results),
+        'objects': results[-1][1],
+        'collection': min(r[2] for r in results),
+        # Kilobytes on Linux
+        'rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss,
+    }))
+
+
+def main():
+    """Run benchmarks."""
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        return child(sys.argv[2].decode('utf-8'))
+
+    for desc, kwargs in VARIANTS:
+        output = subprocess.check_output(
+            [sys.executable, __file__, '--child', desc])
+        r = json.loads(output.splitlines()[-1])
+        print('{0:15s} : {1:7.1f}ms  {2:7d} objects  GC {3:6.1f}ms  '
+              'peak RSS +{4:6.1f}MB'.format(
+                  desc, r['elapsed'] * 1000, r['objects'],
+                  r['collection'] * 1000, r['rss'] / 1024.0))
+
+
+if __name__ == '__main__':
+    main()
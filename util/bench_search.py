@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright © 2015 deanishe@deanishe.net
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2015-10-04
+#
+
+"""bench_search.py [options] [<query>...]
+
+Benchmark the fetch, parse and cache pipeline of `flix.py` offline.
+
+Responses from flixsearch.io are recorded once with `--record`, then
+replayed from the fixture directory with the given network profile.
+
+Usage:
+    bench_search.py [-r] [-p <profile>] [-n <count>] [-d <dir>] [<query>...]
+    bench_search.py -h
+
+Options:
+    -r, --record                Record responses from flixsearch.io
+    -p, --profile <profile>     Network profile [default: none]
+    -n, --number <count>        Number of runs per query [default: 5]
+    -d, --fixtures <dir>        Fixture directory [default: fixtures]
+    -h, --help                  Show this message and exit.
+
+"""
+
+from __future__ import print_function, unicode_literals, absolute_import
+
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+mydir = os.path.abspath(os.path.dirname(__file__))
+wfdir = os.path.abspath(os.path.join(mydir, '../src'))
+
+sys.path.insert(0, wfdir)
+
+from docopt import docopt
+import flix
+from workflow import Workflow, web
+
+logging.basicConfig(level=logging.WARNING)
+log = logging.getLogger('')
+flix.log = log
+
+QUERIES = [
+    'house of cards',
+    'star trek',
+    'the',
+]
+
+
+def timed(func, *args):
+    """Return time in seconds taken to call ``func``."""
+    start = time.time()
+    func(*args)
+    return time.time() - start
+
+
+def main():
+    """Benchmark `flix.flixsearch`."""
+    args = docopt(__doc__)
+    queries = [q.decode('utf-8') for q in args['<query>']] or QUERIES
+    number = int(args['--number'])
+    fixtures = os.path.join(mydir, args['--fixtures'])
+
+    mode = 'replay'
+    if args['--record']:
+        mode = 'record'
+        number = 1
+
+    web.transport = web.RecordReplayTransport(fixtures, mode,
+                                              profile=args['--profile'])
+
+    # Keep the benchmark's cache and settings away from Alfred's
+    tempdir = tempfile.mkdtemp()
+    os.environ[b'alfred_workflow_cache'] = os.path.join(tempdir, b'cache')
+    os.environ[b'alfred_workflow_data'] = os.path.join(tempdir, b'data')
+
+    try:
+        wf = flix.wf = Workflow()
+        for query in queries:
+            fresh = []
+            cached = []
+            for i in range(number):
+                wf.clear_cache()
+                fresh.append(timed(flix.flixsearch, query))
+                cached.append(timed(flix.flixsearch, query))
+
+            print('{0:20s} : fresh {1:0.4f}s  cached {2:0.4f}s  '
+                  '({3} results)'.format(query, min(fresh), min(cached),
+                                         len(flix.flixsearch(query))))
+    finally:
+        shutil.rmtree(tempdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright © 2015 deanishe@deanishe.net
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2015-10-04
+#
+
+"""bench_startup.py [options] [<command>...]
+
+Benchmark cold-start time and imports of `flix.py` per command.
+
+Each command is run in a fresh interpreter that times every import
+(like Python 3's `-X importtime`). Searches are run against a
+pre-populated cache, so no HTML is fetched.
+
+Usage:
+    bench_startup.py [-n <count>] [-t <top>] [<command>...]
+    bench_startup.py -h
+
+Options:
+    -n, --number <count>    Number of runs per command [default: 10]
+    -t, --top <top>         Show <top> slowest imports [default: 10]
+    -h, --help              Show this message and exit.
+
+"""
+
+from __future__ import print_function, unicode_literals, absolute_import
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+mydir = os.path.abspath(os.path.dirname(__file__))
+wfdir = os.path.abspath(os.path.join(mydir, '../src'))
+
+sys.path.insert(0, wfdir)
+
+# Commands to run. `search` hits the cache.
+COMMANDS = [
+    'countries',
+    'countries ger',
+    'config',
+    'search star trek',
+]
+QUERY = 'star trek'
+
+
+def child(argv):
+    """Run `flix.py` with ``argv`` and print import times as JSON.
+
+    Called in a subprocess with ``--child``.
+
+    """
+    import __builtin__
+
+    # Cumulative and self time of each module's first import
+    times = {}
+    stack = []
+    real_import = __builtin__.__import__
+
+    def timed_import(name, *args, **kwargs):
+        before = set(sys.modules)
+        stack.append(0.0)
+        start = time.time()
+        try:
+            return real_import(name, *args, **kwargs)
+        finally:
+            elapsed = time.time() - start
+            nested = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            # Ignore failed implicit relative imports (`None`)
+            new = [m for m in set(sys.modules) - before
+                   if sys.modules[m] is not None]
+            if new:
+                if name not in new:  # relative import
+                    name = min(new, key=len)
+                times[name] = (elapsed - nested, elapsed)
+
+    start = time.time()
+    __builtin__.__import__ = timed_import
+    import flix
+    from workflow import Workflow
+    __builtin__.__import__ = real_import
+
+    wf = flix.wf = Workflow(default_settings=flix.DEFAULT_SETTINGS,
+                            help_url=flix.HELP_URL)
+    flix.log = wf.logger
+    wf._args = argv
+
+    __builtin__.__import__ = timed_import
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'wb')
+    try:
+        wf.run(flix.FlixSearch().run)
+    except SystemExit:
+        pass
+    sys.stdout = stdout
+    __builtin__.__import__ = real_import
+
+    print(json.dumps({'total': time.time() - start, 'imports': times,
+                      'modules': len(sys.modules)}))
+
+
+def setup(tempdir):
+    """Create cache and settings for `flix.py` in ``tempdir``."""
+    import flix
+    from workflow import Workflow
+
+    wf = Workflow()
+    wf.settings['countries'] = ['UK', 'USA']
+    wf.cache_data(flix.results_cache_key(QUERY), [
+        dict(title='Star Trek {0}'.format(i), url='/title/{0}'.format(i),
+             image='', countries=['UK']) for i in range(20)])
+
+
+def run(command):
+    """Run ``command`` in a new interpreter and return results."""
+    cmd = [sys.executable, __file__, '--child'] + command.split(' ', 1)
+    output = subprocess.check_output(cmd, stderr=open(os.devnull, 'wb'))
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    """Run benchmarks."""
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        return child([s.decode('utf-8') for s in sys.argv[2:]])
+
+    # Imported here, so it isn't already loaded in the child
+    from docopt import docopt
+
+    args = docopt(__doc__)
+    commands = [c.decode('utf-8') for c in args['<command>']] or COMMANDS
+    number = int(args['--number'])
+    top = int(args['--top'])
+
+    # Keep the benchmark's cache and settings away from Alfred's
+    tempdir = tempfile.mkdtemp()
+    os.environ[b'alfred_workflow_cache'] = os.path.join(tempdir, b'cache')
+    os.environ[b'alfred_workflow_data'] = os.path.join(tempdir, b'data')
+
+    try:
+        setup(tempdir)
+        for command in commands:
+            results = [run(command) for i in range(number)]
+            best = min(results, key=lambda r: r['total'])
+            print('{0:20s} : {1:6.1f}ms  {2:3d} modules'.format(
+                  command, best['total'] * 1000, best['modules']))
+
+            imports = sorted(best['imports'].items(),
+                             key=lambda t: t[1][1], reverse=True)
+            for name, (self_time, cumulative) in imports[:top]:
+                print('    {0:30s} self {1:6.2f}ms  cumulative {2:6.2f}ms'
+                      .format(name, self_time * 1000, cumulative * 1000))
+    finally:
+        shutil.rmtree(tempdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright © 2015 deanishe@deanishe.net
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2015-10-04
+#
+
+"""
+Benchmark parsing many pages in one process, as prefetching does.
+
+Compares dropping each soup and leaving its reference cycles to the
+garbage collector with ``decompose()``-ing it and with building it
+with ``weak_links=True``. Reports the time per page, how much peak RSS
+grew and how long collecting the garbage left at the end takes.
+
+Each variant is run in a fresh interpreter, so peak RSS isn't
+inherited from the previous one.
+"""
+
+from __future__ import print_function, unicode_literals, absolute_import
+
+import gc
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+mydir = os.path.abspath(os.path.dirname(__file__))
+wfdir = os.path.abspath(os.path.join(mydir, '../src'))
+
+sys.path.insert(0, wfdir)
+
+from bs4 import BeautifulSoup
+
+from bench_parse import full_page
+
+PAGES = 8
+
+# Description, `BeautifulSoup` arguments and whether to decompose
+VARIANTS = [
+    ('drop', {}, False),
+    ('decompose', {}, True),
+    ('weak links', {'weak_links': True}, False),
+]
+
+
+def child(desc):
+    """Run variant ``desc`` and print results as JSON.
+
+    Called in a subprocess with ``--child``.
+
+    """
+    kwargs, decompose = dict((d, (k, c)) for d, k, c in VARIANTS)[desc]
+    html = full_page()
+    gc.collect()
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.time()
+    for i in range(PAGES):
+        soup = BeautifulSoup(html, 'html5lib', compact=True, **kwargs)
+        soup.find_all('div', 'card')
+        if decompose:
+            soup.decompose()
+        del soup
+    elapsed = time.time() - start
+    start = time.time()
+    gc.collect()
+    print(json.dumps({
+        'elapsed': elapsed,
+        'collection': time.time() - start,
+        # Kilobytes on Linux
+        'rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss,
+    }))
+
+
+def main():
+    """Run benchmarks."""
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        return child(sys.argv[2].decode('utf-8'))
+
+    for desc, kwargs, decompose in VARIANTS:
+        output = subprocess.check_output(
+            [sys.executable, __file__, '--child', desc])
+        r = json.loads(output.splitlines()[-1])
+        print('{0:10s} : {1:7.1f}ms per page  peak RSS +{2:6.1f}MB  '
+              'final GC {3:6.1f}ms'.format(
+                  desc, r['elapsed'] / PAGES * 1000, r['rss'] / 1024.0,
+                  r['collection'] * 1000))
+
+
+if __name__ == '__main__':
+    main()